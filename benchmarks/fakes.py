@@ -0,0 +1,86 @@
+import datetime
+
+import discord
+
+
+# Stand-ins for discord objects that record what would have been sent instead of sending it
+
+
+class FakeMessage():
+    def __init__(self, content: str = "", embed: discord.Embed = None, view: discord.ui.View = None):
+        self.id = discord.utils.time_snowflake(discord.utils.utcnow())
+        self.content = content
+        self.embed = embed
+        self.view = view
+        self.edits = []         # keyword arguments of every edit
+        self.deleted = False
+
+    async def edit(self, **kwargs) -> "FakeMessage":
+        self.edits.append(kwargs)
+        self.embed = kwargs.get("embed", self.embed)
+        self.view = kwargs.get("view", self.view)
+        return self
+
+    async def delete(self) -> None:
+        self.deleted = True
+
+
+class FakeChannel():
+    def __init__(self, id: int = 2):
+        self.id = id
+        self.sent: list[FakeMessage] = []
+
+    async def send(self, content: str = "", *, embed: discord.Embed = None, view: discord.ui.View = None, **kwargs) -> FakeMessage:
+        message = FakeMessage(content, embed, view)
+        self.sent.append(message)
+        return message
+
+
+# enough of commands.Context for paginators, help pages and command checks
+class FakeContext():
+    def __init__(self, bot, author_id: int = 1, channel: FakeChannel = None):
+        self.bot = bot
+        self.author = discord.Object(author_id)
+        self.guild = None
+        self.channel = channel or FakeChannel()
+        self.message = None
+        self.command = None
+        self.invoked_with = None
+        self.prefix = "!"
+
+    @property
+    def sent(self) -> list[FakeMessage]:
+        return self.channel.sent
+
+    async def send(self, content: str = "", **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+    async def reply(self, content: str = "", **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeResponse():
+    def __init__(self, interaction: "FakeInteraction"):
+        self.interaction = interaction
+        self.calls = []         # (method, keyword arguments) of every response
+
+    async def defer(self, **kwargs) -> None:
+        self.calls.append(("defer", kwargs))
+
+    async def send_message(self, content: str = "", **kwargs) -> None:
+        self.calls.append(("send_message", kwargs))
+        self.interaction.message = FakeMessage(content, kwargs.get("embed"), kwargs.get("view"))
+
+    async def edit_message(self, **kwargs) -> None:
+        self.calls.append(("edit_message", kwargs))
+
+
+# enough of discord.Interaction for button callbacks and app command handlers
+class FakeInteraction():
+    def __init__(self, user_id: int = 1, channel: FakeChannel = None):
+        self.user = discord.Object(user_id)
+        self.channel = channel or FakeChannel()
+        self.guild = None
+        self.message = None
+        self.created_at = discord.utils.utcnow() - datetime.timedelta(milliseconds=50)
+        self.response = FakeResponse(self)
@@ -0,0 +1,425 @@
+import argparse
+import asyncio
+import contextvars
+import glob
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import discord
+
+try:
+    import resource
+except ImportError:        # unix only
+    resource = None
+
+
+# End to end load test. The real bot is started against a local stub of discord's REST API (benchmarks/stub.py)
+# and synthetic MESSAGE_CREATE and INTERACTION_CREATE events are fed to the same parsers the gateway feeds
+# Operations are fired at a fixed rate per stage, stages get faster until latency falls apart
+# Latency of an operation is the time from feeding its event to the end of the last REST request handling it made
+
+EVAL_CODE = 'return "\\n".join(f"line {number}: " + "x" * 40 for number in range(400))'    # output of about 6 pages
+DEFAULT_MIX = "help=3,ping=3,eval=2,click=2"
+
+# operation whose event is being handled. set while an event is parsed, so every task and request it causes sees it
+_operation = contextvars.ContextVar("load_operation", default=None)
+
+
+# One synthetic event and what the bot did about it
+class Operation():
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.sent = time.perf_counter()
+        self.done = None            # end of the last successful REST request made while handling the event
+        self.requests = 0
+        self.limited = 0            # 429 responses, each one retried by discord.py after waiting
+        self.failed = False         # any other error response
+        self.paginator = None       # paginator clicked on, for clicks
+
+    # answered or failed. clicks on a paginator closed in the meantime are ignored by the bot and never answered
+    @property
+    def settled(self) -> bool:
+        if self.done is not None or self.failed:
+            return True
+        return self.paginator is not None and self.paginator.closed and self.requests == 0
+
+    @property
+    def latency(self) -> float | None:
+        return None if self.done is None else self.done - self.sent
+
+
+# nearest rank percentile, None without values
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("help", "ping", "eval", "click"):
+            raise argparse.ArgumentTypeError(f"Unknown operation {kind}, use help, ping, eval or click")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def user_payload(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "global_name": None, "avatar": None}
+
+
+# ---------- stub server ----------
+
+# start the REST stub in its own process and return it with the port it listens on
+async def start_stub(latency: float, limits: bool) -> tuple[asyncio.subprocess.Process, int]:
+    command = [sys.executable, "-m", "benchmarks.stub", "--latency", str(latency)]
+    if not limits:
+        command.append("--no-limits")
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, cwd=os.getcwd())
+    line = await asyncio.wait_for(process.stdout.readline(), timeout=30)
+    if not line:
+        raise RuntimeError("REST stub exited before listening")
+    return process, int(line)
+
+
+# ---------- load generator ----------
+
+class LoadGenerator():
+    def __init__(self, client, mix: dict[str, float], users: int = 20, channels: int = 200, seed: int = 0):
+        self.client = client
+        self.kinds = list(mix)
+        self.weights = list(mix.values())
+        self.users = [2000 + number for number in range(users)]
+        self.channels = [900000 + number for number in range(channels)]
+        self.random = random.Random(seed)
+        self.ids = itertools.count(discord.utils.time_snowflake(discord.utils.utcnow()))
+        self.parsers = client._connection.parsers
+        self.last_activity = time.perf_counter()
+
+    # every response to a request made while handling an operation's event is recorded on the operation
+    def trace_requests(self) -> None:
+        async def on_request_end(session, context, params) -> None:
+            operation = _operation.get()
+            if operation is None:
+                return
+            self.last_activity = time.perf_counter()
+            operation.requests += 1
+            if params.response.status == 429:
+                operation.limited += 1
+            elif params.response.status >= 400:
+                operation.failed = True
+            else:
+                operation.done = time.perf_counter()
+
+        # connection errors never get a response
+        async def on_request_exception(session, context, params) -> None:
+            operation = _operation.get()
+            if operation is not None:
+                operation.failed = True
+
+        self.client.http.http_trace.on_request_end.append(on_request_end)
+        self.client.http.http_trace.on_request_exception.append(on_request_exception)
+
+    # ---------- payloads ----------
+
+    def message_payload(self, content: str, author_id: int, channel_id: int) -> dict:
+        return {
+            "id": str(next(self.ids)),
+            "channel_id": str(channel_id),
+            "author": user_payload(author_id),
+            "content": content,
+            "timestamp": discord.utils.utcnow().isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "pinned": False,
+            "type": 0,
+        }
+
+    def interaction_payload(self, kind: int, data: dict, user_id: int, channel_id: int, message: dict = None) -> dict:
+        interaction_id = next(self.ids)
+        payload = {
+            "id": str(interaction_id),
+            "application_id": str(self.client.application_id),
+            "type": kind,
+            "token": f"token-{interaction_id}",
+            "version": 1,
+            "channel_id": str(channel_id),
+            "user": user_payload(user_id),
+            "data": data,
+            "locale": "en-US",
+            "app_permissions": "0",
+        }
+        if message is not None:
+            payload["message"] = message
+        return payload
+
+    # ---------- operations ----------
+
+    # feed one event to the parser the gateway would use, with the operation set for everything it starts
+    def dispatch(self, kind: str, event: str, payload: dict) -> Operation:
+        operation = Operation(kind)
+        token = _operation.set(operation)
+        try:
+            self.parsers[event](payload)
+        finally:
+            _operation.reset(token)
+        return operation
+
+    def fire(self, kind: str) -> Operation:
+        user, channel = self.random.choice(self.users), self.random.choice(self.channels)
+        if kind == "help":
+            return self.dispatch(kind, "MESSAGE_CREATE", self.message_payload("!help", user, channel))
+        if kind == "ping":
+            data = {"id": "1", "name": "ping", "type": 1, "options": []}
+            return self.dispatch(kind, "INTERACTION_CREATE", self.interaction_payload(2, data, user, channel))
+        if kind == "click":
+            operation = self.click()
+            if operation is not None:
+                return operation
+        # eval, and clicks while there is no paginator to click on. eval output opens a paginator
+        return self.dispatch("eval", "MESSAGE_CREATE", self.message_payload(f"!eval {EVAL_CODE}", user, channel))
+
+    # next on a random live paginator, back to the first page once at the end
+    def click(self) -> Operation | None:
+        from modules.paginator import Paginator
+
+        paginators = [
+            paginator for paginator in Paginator.manager.active.values()
+            if not paginator.closed and paginator.view is not None and paginator.current is not None
+        ]
+        if not paginators:
+            return None
+        paginator = self.random.choice(paginators)
+        at_end = paginator.total_pages is not None and paginator.current_page >= paginator.total_pages
+        button = paginator.view.children[1 if at_end else 3]
+
+        message = self.message_payload("", self.client.user.id, paginator.current.channel.id)
+        message["id"] = str(paginator.current.id)
+        data = {"custom_id": button.custom_id, "component_type": 2}
+        payload = self.interaction_payload(3, data, paginator.user, paginator.current.channel.id, message)
+        operation = self.dispatch("click", "INTERACTION_CREATE", payload)
+        operation.paginator = paginator
+        return operation
+
+    # ---------- stages ----------
+
+    # fire rate operations a second for duration seconds, evenly spaced, then wait for the bot to finish them
+    async def stage(self, rate: float, duration: float, settle: float = 1.0, timeout: float = 30.0) -> list[Operation]:
+        operations = []
+        start = time.perf_counter()
+        for number in range(max(1, int(rate * duration))):
+            delay = start + number / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            operations.append(self.fire(self.random.choices(self.kinds, self.weights)[0]))
+
+        # requests held back by the ratelimiter show no activity while they wait, so a quiet period alone is not enough
+        # done once every operation has answered and nothing else was requested for settle seconds
+        deadline = time.perf_counter() + timeout
+        self.last_activity = time.perf_counter()
+        while time.perf_counter() < deadline:
+            if all(operation.settled for operation in operations) and time.perf_counter() - self.last_activity >= settle:
+                break
+            await asyncio.sleep(settle / 4)
+        return operations
+
+
+# ---------- memory ----------
+
+# resident memory of this process in bytes, read from /proc. None where there is no /proc (macos, windows)
+def current_rss() -> int | None:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, AttributeError, ValueError):
+        return None
+
+
+# Highest resident memory while a stage runs. ru_maxrss is the peak over the whole life of the process, so it
+# never goes down after an expensive stage. current rss is sampled from a thread instead, which keeps sampling
+# while the event loop is busy. without /proc this falls back to ru_maxrss, and to None without resource either
+class RssSampler():
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak: int | None = None
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def update(self) -> None:
+        rss = current_rss()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.update()
+
+    def start(self) -> None:
+        self.peak = None
+        self.update()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="rss-sampler", daemon=True)
+        self.thread.start()
+
+    # stop sampling and return the peak of the stage in bytes
+    def stop(self) -> int | None:
+        self.stopped.set()
+        self.thread.join()
+        self.update()
+        if self.peak is None and resource is not None:
+            # kilobytes on linux, bytes on macos
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        return self.peak
+
+
+# throughput, latency percentiles and memory of one stage
+def summarise(rate: float, operations: list[Operation], lag: list[float], rss_peak: int | None, heap_peak: int | None) -> dict:
+    completed = [operation for operation in operations if operation.done is not None and not operation.failed]
+    latencies = [operation.latency for operation in completed]
+    start = min(operation.sent for operation in operations)
+    end = max((operation.done for operation in completed), default=start)
+    report = {
+        "rate": rate,
+        "sent": len(operations),
+        "completed": len(completed),
+        "failed": sum(operation.failed for operation in operations),
+        "ignored": sum(operation.settled and operation.done is None and not operation.failed for operation in operations),
+        "unfinished": sum(not operation.settled for operation in operations),
+        "limited": sum(operation.limited for operation in operations),
+        "throughput": len(completed) / (end - start) if end > start else 0.0,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "loop_lag_p99": percentile(lag, 99),
+        "peak_rss": rss_peak,
+        "heap_peak": heap_peak,
+        "kinds": {},
+    }
+    for kind in sorted({operation.kind for operation in operations}):
+        kind_latencies = [operation.latency for operation in completed if operation.kind == kind]
+        report["kinds"][kind] = {
+            "completed": len(kind_latencies),
+            "p50": percentile(kind_latencies, 50),
+            "p99": percentile(kind_latencies, 99),
+        }
+    return report
+
+
+def milliseconds(value: float | None) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def print_stage(report: dict) -> None:
+    print(
+        f"{report['rate']:>7.0f}/s  sent {report['sent']:>6}  done {report['completed']:>6}  "
+        f"failed {report['failed']:>4}  ignored {report['ignored']:>4}  unfinished {report['unfinished']:>4}  429s {report['limited']:>5}  "
+        f"throughput {report['throughput']:>7.1f}/s  p50 {milliseconds(report['p50']):>8} ms  "
+        f"p99 {milliseconds(report['p99']):>8} ms  loop lag p99 {milliseconds(report['loop_lag_p99']):>7} ms  "
+        + (f"peak rss {report['peak_rss'] / 2**20:.0f} MiB" if report["peak_rss"] is not None else "peak rss n/a")
+        + (f"  heap peak {report['heap_peak'] / 2**20:.1f} MiB" if report["heap_peak"] is not None else "")
+    )
+    for kind, stats in report["kinds"].items():
+        print(f"{'':>12}{kind:<6} done {stats['completed']:>6}  p50 {milliseconds(stats['p50']):>8} ms  p99 {milliseconds(stats['p99']):>8} ms")
+
+
+# ---------- runner ----------
+
+# environment for the bot: REST goes to the stub, data files are copies, optional features stay off
+def prepare_environment(port: int, directory: str) -> None:
+    for path in glob.glob(os.path.join("data", "*.json")):
+        shutil.copy(path, directory)
+    os.environ.update({
+        "DISCORD_API_BASE": f"http://127.0.0.1:{port}/api/v10",
+        "STORAGE_ENGINE": "json",
+        "STORAGE_DIR": directory,
+        "LAZY_COGS": "0",
+        "SHARD_COUNT": "",
+        "CLUSTER_COUNT": "1",
+        "METRICS_PORT": "",
+        "HOT_RELOAD": "0",
+        "LOOP_WATCHDOG": "0",
+    })
+
+
+async def run(arguments: argparse.Namespace) -> list[dict]:
+    stub, port = await start_stub(arguments.latency, not arguments.no_limits)
+    directory = tempfile.mkdtemp(prefix="load-")
+    client = None
+    try:
+        prepare_environment(port, directory)
+        # bot builds its client on import, so it is imported once the environment points at the stub
+        import bot
+        client = bot.client
+
+        generator = LoadGenerator(client, arguments.mix, arguments.users, arguments.channels, arguments.seed)
+        client.owner_ids = set(generator.users)
+        generator.trace_requests()
+        await client.login("load-test-token")
+
+        # warm up every path once before measuring
+        await generator.stage(len(arguments.mix) * 2, 1)
+        if arguments.tracemalloc:
+            tracemalloc.start()
+
+        reports = []
+        sampler = RssSampler()
+        for rate in arguments.rates:
+            if arguments.tracemalloc:
+                tracemalloc.reset_peak()
+            sampler.start()
+            operations = await generator.stage(rate, arguments.duration)
+            rss_peak = sampler.stop()
+            heap_peak = tracemalloc.get_traced_memory()[1] if arguments.tracemalloc else None
+            samples = max(1, int(arguments.duration / client.loop_lag.interval))
+            report = summarise(rate, operations, client.loop_lag.history.recent(samples), rss_peak, heap_peak)
+            reports.append(report)
+            print_stage(report)
+
+            # past saturation every further stage is only slower
+            if report["p99"] is None or report["p99"] > arguments.max_p99 or report["unfinished"] > report["sent"] / 2:
+                print(f"Stopping: p99 above {arguments.max_p99}s or most operations unfinished")
+                break
+        return reports
+    finally:
+        if client is not None:
+            await client.close()
+        stub.terminate()
+        await stub.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay synthetic gateway traffic through the bot against a local REST stub")
+    parser.add_argument("--rates", type=lambda text: [float(rate) for rate in text.split(",")], default=[10, 25, 50, 100, 200],
+                        help="operations per second of each stage, comma separated")
+    parser.add_argument("--duration", type=float, default=5, help="seconds each stage fires operations for")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"weights of help, ping, eval and click, default {DEFAULT_MIX}")
+    parser.add_argument("--users", type=int, default=20, help="synthetic users, each may keep 5 paginators open")
+    parser.add_argument("--channels", type=int, default=200, help="channels the messages are spread over")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the stub adds to every response")
+    parser.add_argument("--no-limits", action="store_true", help="stub never answers with 429")
+    parser.add_argument("--max-p99", type=float, default=5.0, help="stop ramping once p99 latency passes this many seconds")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report peak python heap per stage. slows the bot down")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write stage reports to this json file")
+    arguments = parser.parse_args()
+
+    reports = asyncio.run(run(arguments))
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump({"arguments": {key: value for key, value in vars(arguments).items() if key != "output"}, "stages": reports}, file, indent=4)
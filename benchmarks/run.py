@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import discord
+from discord.ext import commands
+
+from benchmarks.fakes import FakeContext, FakeInteraction
+from modules import helpcmd
+from modules.paginator import Paginator
+from modules.storage import JsonEngine, SQLiteEngine
+
+
+BUDGET = 1.0        # seconds spent repeating each case, every case runs at least once
+MAX_RUNS = 20
+
+SIZES = {
+    "full": {"pages": [10**2, 10**3, 10**4, 10**5, 10**6], "cogs": [10, 100, 300], "keys": [10**2, 10**3, 10**4, 10**5]},
+    "quick": {"pages": [10**2, 10**3, 10**4], "cogs": [10, 50], "keys": [10**2, 10**3, 10**4]},
+}
+
+
+# run a coroutine function repeatedly and return its timings in seconds
+async def measure(run) -> dict:
+    timings = []
+    deadline = time.perf_counter() + BUDGET
+    while not timings or (len(timings) < MAX_RUNS and time.perf_counter() < deadline):
+        start = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - start)
+    return {"runs": len(timings), "min": min(timings), "median": statistics.median(timings)}
+
+
+# ---------- paginator ----------
+
+def page_entries(count: int) -> list[str]:
+    return [f"Entry {number}: " + "lorem ipsum " * (number % 7) for number in range(count)]
+
+
+async def bench_pages(size: int) -> dict:
+    entries = page_entries(size)
+    ctx = FakeContext(None)
+
+    # only the first page is built when a paginator is shown
+    async def first_page():
+        pager = Paginator(ctx=ctx, entries=entries, length=10)
+        await pager.start()
+        await pager.close()
+
+    # every page built and rendered, as when a user clicks through to the end
+    async def all_pages():
+        pager = Paginator(ctx=ctx, entries=entries, length=10)
+        await pager.start()
+        for number in range(1, await pager.source.exhaust() + 1):
+            await pager.render(number)
+        await pager.close()
+
+    # pages packed by size from a generator
+    async def packed():
+        pager = Paginator(ctx=ctx, entries=(entry for entry in entries), pack=True)
+        await pager.start()
+        await pager.source.exhaust()
+        await pager.close()
+
+    return {
+        "paginator.first_page": await measure(first_page),
+        "paginator.all_pages": await measure(all_pages),
+        "paginator.packed": await measure(packed),
+    }
+
+
+# 100 clicks on the next button, going through the view like a real click
+async def bench_clicks(size: int) -> dict:
+    entries = page_entries(size)
+    ctx = FakeContext(None)
+
+    async def clicks():
+        pager = Paginator(ctx=ctx, entries=entries, length=10)
+        await pager.start()
+        if pager.view is not None:
+            next_button = pager.view.children[3]
+            for _ in range(100):
+                await next_button.callback(FakeInteraction())
+        await pager.close()
+
+    return {"paginator.clicks": await measure(clicks)}
+
+
+# ---------- help ----------
+
+# bot with cog_count synthetic cogs, each with 8 commands and a group of 3 subcommands
+async def help_bot(cog_count: int) -> commands.Bot:
+    from bot import Bot
+    client = Bot(intents=discord.Intents.none())
+    client.owner_id = 1
+
+    async def callback(self, ctx, member: discord.Member = None, *, text: str = None):
+        pass
+
+    for number in range(cog_count):
+        attributes = {}
+        for index in range(8):
+            attributes[f"command_{index}"] = commands.command(
+                name=f"command_{number}_{index}", help=f"Synthetic command {index} of cog {number}", aliases=[f"c{number}_{index}"]
+            )(callback)
+        group = commands.group(name=f"group_{number}", help="Synthetic group")(callback)
+        for index in range(3):
+            group.command(name=f"sub_{index}", help="Synthetic subcommand")(callback)
+        attributes["group"] = group
+        cls = commands.CogMeta(f"Cog{number}", (commands.Cog,), attributes, name=f"Cog{number}")
+        await client.add_cog(cls())
+    return client
+
+
+async def bench_help(cog_count: int) -> dict:
+    client = await help_bot(cog_count)
+    ctx = FakeContext(client)
+
+    async def rebuild():
+        await client.help_index.rebuild(client)
+
+    async def page_cold():
+        helpcmd.invalidate_checks()
+        await helpcmd.initiate_helpcmd(client, ctx, None)
+
+    async def page_warm():
+        await helpcmd.initiate_helpcmd(client, ctx, None)
+
+    async def cog_page():
+        await helpcmd.initiate_helpcmd(client, ctx, f"Cog{cog_count // 2}")
+
+    async def typo():
+        await helpcmd.initiate_helpcmd(client, ctx, f"comand_{cog_count // 2}_3x")
+
+    results = {"help.rebuild": await measure(rebuild)}
+    results |= {
+        "help.page_cold": await measure(page_cold),
+        "help.page_warm": await measure(page_warm),
+        "help.cog_page": await measure(cog_page),
+        "help.typo": await measure(typo),
+    }
+    for paginator in list(Paginator.manager.active.values()):
+        await paginator.close()
+    return results
+
+
+# ---------- storage ----------
+
+async def bench_storage(key_count: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        data = {str(number): {"name": f"user {number}", "points": number} for number in range(key_count)}
+
+        engine = JsonEngine(directory)
+        engine.overwrite("bench", data)
+        engine.flush()
+        counter = iter(range(10**9))
+
+        # one key written and flushed to disk straight away
+        async def json_append():
+            engine.upsert("bench", {f"new {next(counter)}": 1})
+            engine.flush()
+
+        # 10 keys written close together share one flush
+        async def json_append_coalesced():
+            for _ in range(10):
+                engine.upsert("bench", {f"new {next(counter)}": 1})
+            engine.flush()
+
+        async def json_read_cached():
+            engine.read("bench")
+
+        async def json_read_cold():
+            engine._cache.clear()
+            engine.read("bench")
+
+        results["json.append"] = await measure(json_append)
+        results["json.append_coalesced"] = await measure(json_append_coalesced)
+        results["json.read_cached"] = await measure(json_read_cached)
+        results["json.read_cold"] = await measure(json_read_cold)
+        engine.close()
+
+        sqlite = SQLiteEngine(os.path.join(directory, "bench.db"))
+        sqlite.overwrite("bench", data)
+
+        async def sqlite_append():
+            sqlite.upsert("bench", {f"new {next(counter)}": 1})
+
+        async def sqlite_get():
+            sqlite.get("bench", str(key_count // 2))
+
+        async def sqlite_read():
+            sqlite.read("bench")
+
+        results["sqlite.append"] = await measure(sqlite_append)
+        results["sqlite.get"] = await measure(sqlite_get)
+        results["sqlite.read"] = await measure(sqlite_read)
+        sqlite.close()
+    return results
+
+
+# ---------- runner ----------
+
+async def run(mode: str, only: str = None) -> dict:
+    sizes = SIZES[mode]
+    groups = [
+        ("paginator", bench_pages, sizes["pages"]),
+        ("paginator.clicks", bench_clicks, sizes["pages"][:3]),
+        ("help", bench_help, sizes["cogs"]),
+        ("storage", bench_storage, sizes["keys"]),
+    ]
+    results = {}
+    for group, bench, group_sizes in groups:
+        if only and not group.startswith(only):
+            continue
+        for size in group_sizes:
+            for name, timing in (await bench(size)).items():
+                key = f"{name}[{size}]"
+                results[key] = timing
+                print(f"{key:<36} median {timing['median']*1000:10.3f} ms   min {timing['min']*1000:10.3f} ms   ({timing['runs']} runs)")
+    return results
+
+
+# compare medians against a baseline file. returns names of cases slower than threshold times the baseline
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    print(f"\nCompared with baseline ({baseline['meta'].get('created', 'unknown date')}):")
+    for key, timing in results.items():
+        if key not in baseline["results"]:
+            continue
+        ratio = timing["median"] / baseline["results"][key]["median"]
+        flag = ""
+        if ratio > threshold:
+            flag = "  SLOWER"
+            regressions.append(key)
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        print(f"{key:<36} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline micro benchmarks for the paginator, help and storage")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for a fast check")
+    parser.add_argument("--only", help="only run groups starting with this name, e.g. help or paginator")
+    parser.add_argument("--output", help="write results to this json file, usable as a baseline later")
+    parser.add_argument("--baseline", help="json file written by --output to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    arguments = parser.parse_args()
+
+    mode = "quick" if arguments.quick else "full"
+    results = asyncio.run(run(mode, arguments.only))
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "mode": mode,
+            "python": platform.python_version(),
+            "discord.py": discord.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results
+    }
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(report, file, indent=4)
+    if arguments.baseline:
+        with open(arguments.baseline, "r") as file:
+            regressions = compare(results, json.load(file), arguments.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import re
+import time
+import zlib
+
+import discord
+from aiohttp import WSMsgType, web
+
+
+# Local stand-in for discord's REST API, used by the load generator. Run as its own process so it does not
+# compete with the bot for the event loop. Answers the requests the bot's commands make with plausible payloads,
+# enforces per route and global rate limits and sends the same rate limit headers discord does
+# also serves a minimal gateway on /gateway so sharded and clustered bots can connect: identify, ready,
+# a guild create per guild of the shard, heartbeats and member requests
+
+API_PREFIX = "/api/v10"
+GLOBAL_LIMIT = (50, 1.0)        # requests per second over all routes with a bot token
+HEARTBEAT_INTERVAL = 41250      # ms, as discord sends in hello
+
+BOT_USER = {
+    "id": "1000", "username": "LoadBot", "discriminator": "0", "global_name": None,
+    "avatar": None, "bot": True, "flags": 0, "verified": True, "mfa_enabled": False
+}
+
+
+# Fixed window counter, as discord's buckets behave from the outside
+class Bucket():
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset = 0.0
+
+    # take a request from the bucket. False when it is empty until reset
+    def take(self, now: float) -> bool:
+        if now >= self.reset:
+            self.remaining = self.limit
+            self.reset = now + self.window
+        if self.remaining == 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    def headers(self, now: float, name: str) -> dict:
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": f"{self.reset:.3f}",
+            "X-RateLimit-Reset-After": f"{max(0.0, self.reset - now):.3f}",
+            "X-RateLimit-Bucket": hashlib.md5(name.encode()).hexdigest()[:16],
+        }
+
+
+# discord.py only decodes bodies whose content type is exactly application/json, as discord sends it
+def json_response(body, status: int = 200, headers: dict = None) -> web.Response:
+    return web.Response(body=json.dumps(body).encode(), status=status, headers=(headers or {}) | {"Content-Type": "application/json"})
+
+
+# guild ids whose shard is shard_id, as discord assigns guilds: (guild_id >> 22) % shard_count
+def shard_guilds(guild_count: int, shard_id: int, shard_count: int) -> list[int]:
+    return [guild_id for guild_id in ((number + 1) << 22 for number in range(guild_count)) if (guild_id >> 22) % shard_count == shard_id]
+
+
+# One gateway connection. discord.py asks for zlib-stream, every payload is then a flushed chunk of one stream
+class GatewaySession():
+    def __init__(self, socket: web.WebSocketResponse, compress: bool):
+        self.socket = socket
+        self.compressor = zlib.compressobj() if compress else None
+        self.sequence = 0
+
+    async def send(self, op: int, data, event: str = None) -> None:
+        payload = {"op": op, "d": data, "s": None, "t": event}
+        if op == 0:
+            self.sequence += 1
+            payload["s"] = self.sequence
+        raw = json.dumps(payload).encode()
+        if self.compressor is None:
+            await self.socket.send_str(raw.decode())
+        else:
+            await self.socket.send_bytes(self.compressor.compress(raw) + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    async def dispatch(self, event: str, data) -> None:
+        await self.send(0, data, event)
+
+
+class StubServer():
+    def __init__(self, latency: float = 0.05, limits: bool = True, shards: int = 1, guilds: int = 10):
+        self.latency = latency          # seconds added to every response, as a network round trip
+        self.limits = limits
+        self.shards = shards            # shard count /gateway/bot recommends
+        self.guilds = guilds            # guilds the bot is in, spread over the shards it identifies with
+        self.identified: list[list[int]] = []       # [shard_id, shard_count] of every identify, in order
+        self.ids = itertools.count(discord.utils.time_snowflake(discord.utils.utcnow()))
+        self.buckets: dict[tuple, Bucket] = {}
+        self.global_bucket = Bucket(*GLOBAL_LIMIT)
+
+        # method, path, (limit, window) per major parameter or None for routes without limits, handler
+        # message routes get the 5 per 5 seconds per channel discord answers with, other routes a generous default
+        self.routes = [
+            ("POST", r"/interactions/(\d+)/([^/]+)/callback", None, self.empty),
+            ("POST", r"/webhooks/(\d+)/([^/]+)", None, self.create_message),
+            ("PATCH", r"/webhooks/(\d+)/([^/]+)/messages/[^/]+", None, self.create_message),
+            ("DELETE", r"/webhooks/(\d+)/([^/]+)/messages/[^/]+", None, self.empty),
+            ("GET", r"/gateway", None, self.gateway_url),
+            ("GET", r"/gateway/bot", (5, 1.0), self.gateway_bot),
+            ("GET", r"/users/@me", (5, 1.0), self.user),
+            ("GET", r"/oauth2/applications/@me", (5, 1.0), self.application),
+            ("PUT", r"/applications/(\d+)/commands", (2, 1.0), self.commands),
+            ("PUT", r"/applications/\d+/guilds/(\d+)/commands", (2, 1.0), self.commands),
+            ("POST", r"/channels/(\d+)/messages", (5, 5.0), self.create_message),
+            ("PATCH", r"/channels/(\d+)/messages/(\d+)", (5, 5.0), self.create_message),
+            ("DELETE", r"/channels/(\d+)/messages/(\d+)", (5, 1.0), self.empty),
+            ("POST", r"/channels/(\d+)/typing", (5, 5.0), self.empty),
+            ("GET", r"/channels/(\d+)/webhooks", (5, 1.0), self.no_items),
+            ("GET", r"/guilds/(\d+)/webhooks", (5, 1.0), self.no_items),
+        ]
+
+    def match(self, method: str, path: str):
+        for route_method, pattern, limits, handler in self.routes:
+            if route_method == method:
+                found = re.fullmatch(pattern, path)
+                if found:
+                    return pattern, found, limits, handler
+        return None
+
+    # ---------- rate limits ----------
+
+    def limited(self, status: dict, retry_after: float, scope: str) -> web.Response:
+        headers = status | {"Via": "1.1 google", "Retry-After": str(int(retry_after) + 1), "X-RateLimit-Scope": scope}
+        if scope == "global":
+            headers["X-RateLimit-Global"] = "true"
+        body = {"message": "You are being rate limited.", "retry_after": round(retry_after, 3), "global": scope == "global"}
+        return json_response(body, status=429, headers=headers)
+
+    # rate limit headers of the request, or a 429 response once a bucket is empty
+    def check_limits(self, pattern: str, found: re.Match, limits: tuple) -> tuple[dict, web.Response | None]:
+        now = time.time()
+        if not self.global_bucket.take(now):
+            return {}, self.limited({}, self.global_bucket.reset - now, "global")
+        major = found.group(1) if found.groups() else ""
+        bucket = self.buckets.get((pattern, major))
+        if bucket is None:
+            bucket = self.buckets[(pattern, major)] = Bucket(*limits)
+        allowed = bucket.take(now)
+        headers = bucket.headers(now, pattern)
+        if not allowed:
+            return headers, self.limited(headers, bucket.reset - now, "user")
+        return headers, None
+
+    # ---------- handlers ----------
+
+    async def handle(self, request: web.Request) -> web.Response:
+        path = request.path.removeprefix(API_PREFIX)
+        route = self.match(request.method, path)
+        await asyncio.sleep(self.latency)
+        if route is None:
+            return json_response({"message": "404: Not Found", "code": 0}, status=404)
+
+        pattern, found, limits, handler = route
+        headers = {}
+        if self.limits and limits is not None:
+            headers, refused = self.check_limits(pattern, found, limits)
+            if refused is not None:
+                return refused
+
+        status, body = await handler(request, found)
+        if body is None:
+            return web.Response(status=status, headers=headers)
+        return json_response(body, status=status, headers=headers)
+
+    async def empty(self, request: web.Request, found: re.Match) -> tuple[int, None]:
+        return 204, None
+
+    async def no_items(self, request: web.Request, found: re.Match) -> tuple[int, list]:
+        return 200, []
+
+    async def user(self, request: web.Request, found: re.Match) -> tuple[int, dict]:
+        return 200, BOT_USER
+
+    async def application(self, request: web.Request, found: re.Match) -> tuple[int, dict]:
+        return 200, {
+            "id": BOT_USER["id"], "name": BOT_USER["username"], "description": "", "icon": None,
+            "bot_public": False, "bot_require_code_grant": False, "verify_key": "0" * 64,
+            "owner": BOT_USER | {"bot": False}, "flags": 0
+        }
+
+    async def gateway_url(self, request: web.Request, found: re.Match) -> tuple[int, dict]:
+        return 200, {"url": f"ws://{request.host}/gateway"}
+
+    async def gateway_bot(self, request: web.Request, found: re.Match) -> tuple[int, dict]:
+        return 200, {
+            "url": f"ws://{request.host}/gateway", "shards": self.shards,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1}
+        }
+
+    # commands are echoed back with ids, as after a real sync
+    async def commands(self, request: web.Request, found: re.Match) -> tuple[int, list]:
+        synced = []
+        for command in await request.json():
+            synced.append(command | {"id": str(next(self.ids)), "application_id": BOT_USER["id"], "version": "1"})
+        return 200, synced
+
+    # messages are echoed back the way discord would store them. multipart bodies carry the json in payload_json
+    async def create_message(self, request: web.Request, found: re.Match) -> tuple[int, dict]:
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            body = json.loads(form.get("payload_json") or "{}")
+        else:
+            body = await request.json() if request.can_read_body else {}
+
+        path = request.path.removeprefix(API_PREFIX)
+        channel_id = found.group(1) if path.startswith("/channels/") else "0"
+        message_id = found.group(2) if request.method == "PATCH" and path.startswith("/channels/") else str(next(self.ids))
+        return 200, {
+            "id": message_id,
+            "channel_id": channel_id,
+            "author": BOT_USER,
+            "content": body.get("content") or "",
+            "timestamp": discord.utils.utcnow().isoformat(),
+            "edited_timestamp": discord.utils.utcnow().isoformat() if request.method == "PATCH" else None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": body.get("embeds") or [],
+            "components": body.get("components") or [],
+            "pinned": False,
+            "type": 0,
+            "flags": body.get("flags", 0),
+        }
+
+
+    # ---------- gateway ----------
+
+    def guild_payload(self, guild_id: int) -> dict:
+        joined = discord.utils.utcnow().isoformat()
+        return {
+            "id": str(guild_id), "name": f"Guild {guild_id >> 22}", "icon": None, "owner_id": BOT_USER["id"],
+            "unavailable": False, "large": False, "member_count": 1, "joined_at": joined,
+            "roles": [{
+                "id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                "hoist": False, "managed": False, "mentionable": False
+            }],
+            "channels": [{"id": str(guild_id + 1), "type": 0, "name": "general", "position": 0, "permission_overwrites": []}],
+            "members": [{"user": BOT_USER, "roles": [], "joined_at": joined, "deaf": False, "mute": False, "flags": 0}],
+            "emojis": [], "stickers": [], "features": [], "threads": [], "presences": [], "voice_states": [],
+        }
+
+    async def gateway(self, request: web.Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        session = GatewaySession(socket, request.query.get("compress") == "zlib-stream")
+        await session.send(10, {"heartbeat_interval": HEARTBEAT_INTERVAL})
+
+        async for message in socket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(message.data)
+            op, data = payload["op"], payload.get("d")
+
+            if op == 1:         # heartbeat
+                await session.send(11, None)
+            elif op == 2:       # identify
+                shard_id, shard_count = data.get("shard") or [0, 1]
+                self.identified.append([shard_id, shard_count])
+                guild_ids = shard_guilds(self.guilds, shard_id, shard_count)
+                await session.dispatch("READY", {
+                    "v": 10, "user": BOT_USER, "session_id": hashlib.md5(f"{shard_id}{time.time()}".encode()).hexdigest(),
+                    "resume_gateway_url": f"ws://{request.host}/gateway", "shard": [shard_id, shard_count],
+                    "guilds": [{"id": str(guild_id), "unavailable": True} for guild_id in guild_ids],
+                    "application": {"id": BOT_USER["id"], "flags": 0},
+                })
+                for guild_id in guild_ids:
+                    await session.dispatch("GUILD_CREATE", self.guild_payload(guild_id))
+            elif op == 6:       # resume
+                await session.dispatch("RESUMED", {})
+            elif op == 8:       # request guild members, answered with the bot as the only member
+                guild_ids = data["guild_id"] if isinstance(data["guild_id"], list) else [data["guild_id"]]
+                for guild_id in guild_ids:
+                    await session.dispatch("GUILD_MEMBERS_CHUNK", {
+                        "guild_id": str(guild_id), "members": self.guild_payload(int(guild_id))["members"],
+                        "chunk_index": 0, "chunk_count": 1, "nonce": data.get("nonce")
+                    })
+            # presence and voice state updates are accepted and ignored
+        return socket
+
+
+def create_app(server: StubServer) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_get("/gateway", server.gateway)
+    app.router.add_route("*", "/{path:.*}", server.handle)
+    return app
+
+
+async def serve(host: str, port: int, latency: float, limits: bool, shards: int = 1, guilds: int = 10) -> None:
+    runner = web.AppRunner(create_app(StubServer(latency, limits, shards, guilds)), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    # the chosen port is the first line printed, the load generator waits for it
+    print(runner.addresses[0][1], flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub of discord's REST API and gateway for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--no-limits", action="store_true", help="never answer with 429")
+    parser.add_argument("--shards", type=int, default=1, help="shard count /gateway/bot recommends")
+    parser.add_argument("--guilds", type=int, default=10, help="guilds spread over the shards that connect")
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.latency, not arguments.no_limits, arguments.shards, arguments.guilds))
+    except KeyboardInterrupt:
+        pass
@@ -1,14 +1,32 @@
+import importlib.util
 import os
+import time
 
 import discord
+import yarl
 from discord.ext import commands
 from dotenv import load_dotenv
 
-from modules import jsonhandler
-from modules.helpcmd import initiate_helpcmd
+from modules import helpcmd, jsonhandler
+from modules.cluster import ClusterState
+from modules.commandsync import sync_changed
+from modules.diagnostics import LoopLagSampler, RestProbe
+from modules.hotreload import HotReloader
+from modules.lazyload import LazyCogs
+from modules.loader import ExtensionLoader
+from modules.metrics import InstrumentedTree, Metrics, start_exporter
+from modules.watchdog import LoopWatchdog
 
 load_dotenv()
 
+# point REST at a local server, e.g. benchmarks/stub.py for testing
+if os.getenv("DISCORD_API_BASE"):
+    discord.http.Route.BASE = os.getenv("DISCORD_API_BASE")
+
+# gateway url used when the shard count is known. without a shard count it comes from DISCORD_API_BASE/gateway/bot
+if os.getenv("DISCORD_GATEWAY"):
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(os.getenv("DISCORD_GATEWAY"))
+
 # main bot object
 class Bot(commands.Bot):
     def __init__(
@@ -19,41 +37,116 @@ class Bot(commands.Bot):
         *args,
         **kwargs
         ):
+        # command counts and latencies. outbound requests are timed through the http trace
+        self.metrics = Metrics()
+        self.metrics_runner = None
+        
         super().__init__(
             intents = intents,
             case_insensitive = case_insensitive,
             command_prefix = command_prefix,
+            tree_cls = InstrumentedTree,
+            http_trace = self.metrics.trace_config(),
             *args,
             **kwargs
         )
+        self.before_invoke(self.mark_checks_done)
+        
+        # help strings for all loaded commands, rebuilt whenever cogs are loaded or unloaded
+        self.help_index = helpcmd.HelpIndex()
+        
+        # finds cogs in ./cogs and loads them in dependency order
+        # with LAZY_COGS=1 in .env, cogs in cogs/manifest.json are only imported when first used
+        self.lazy_cogs = LazyCogs(self)
+        self.extension_loader = ExtensionLoader(self, lazy=os.getenv("LAZY_COGS") == "1")
+        
+        # history for /ping diagnostics
+        self.loop_lag = LoopLagSampler()
+        self.rest_probe = RestProbe()
+        
+        # with LOOP_WATCHDOG=1 in .env, stalls of the event loop are logged with the command that caused them
+        self.watchdog = LoopWatchdog(self)
+        
+        # with HOT_RELOAD=1 in .env, changed cogs and modules are reloaded on save
+        self.hot_reload = HotReloader(self)
         
-        # set to True if giving frequent reboots to avoid ratelimiting
-        self.synced = True
+        # stats shared with other clusters when started from launcher.py
+        self.cluster = ClusterState(int(os.getenv("CLUSTER_ID") or 0))
         
-    async def sync_commands(self) -> None:
-        """Sync Command Tree"""
-        await self.tree.sync()
-        print("Slash commands synced successfully")
+    async def sync_commands(self, force: bool = False) -> list[str]:
+        """Sync Command Tree, only for scopes whose commands changed since the last sync"""
+        report = await sync_changed(self, force=force)
+        print("\n".join(report))
+        return report
+        
+    async def invoke(self, ctx: commands.Context) -> None:
+        """Invoke a prefix command, recording its latency and outcome"""
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        with self.metrics.measure("prefix", ctx.command.qualified_name) as measurement:
+            await super().invoke(ctx)
+            measurement.failed = ctx.command_failed
+            
+    # before invoke hooks run once all checks passed, which ends the checks stage of the measurement
+    async def mark_checks_done(self, ctx: commands.Context) -> None:
+        measurement = self.metrics.current()
+        if measurement is not None:
+            measurement.mark_checks()
+        
+    async def load_extension(self, name: str, *, package: str = None) -> None:
+        """Load an extension, replacing its lazy stand-in commands if it has any. Import and setup are timed together for the startup report"""
+        name = importlib.util.resolve_name(name, package)
+        await self.lazy_cogs.release(name)
+        start = time.perf_counter()
+        await super().load_extension(name)
+        self.extension_loader.record(name, time.perf_counter() - start)
+        
+    async def unload_extension(self, name: str, *, package: str = None) -> None:
+        """Unload an extension. Extensions that only have lazy stand-in commands just drop them"""
+        name = importlib.util.resolve_name(name, package)
+        if name in self.lazy_cogs.stubs:
+            await self.lazy_cogs.release(name)
+            return
+        await super().unload_extension(name)
         
     async def setup_hook(self) -> None:
         """All required setups on start"""
         
-        # for all files in cogs directory, try to load as extension if it is a python file
-        for filename in os.listdir("./cogs"):
-            if filename.endswith(".py"):
-                filename = filename[:-3] # remove .py from ending
-                try:
-                    await self.load_extension(f"cogs.{filename}")
-                except commands.ExtensionFailed as error:
-                    print(error)
-                except commands.NoEntryPointError:
-                    print(f"Py file is not a cog: {filename}")
-                else:
-                    print(f"Successfully loaded {filename} cog")
+        # find all python files in cogs directory once, then load them as extensions
+        self.extension_loader.discover()
+        for line in await self.extension_loader.load_all():
+            print(line)
+        print(self.extension_loader.report())
+                    
+        await self.help_index.rebuild(self)
+        
+        self.loop_lag.start()
+        if os.getenv("LOOP_WATCHDOG") == "1":
+            self.watchdog.start()
+        
+        if os.getenv("HOT_RELOAD") == "1":
+            self.hot_reload.start()
                     
-        # sync slash commands on start, does not run if self.synced = True, use feature for testing
-        if not self.synced:
-            await self.sync_commands()
+        self.cluster.start(self)
+        
+        # prometheus metrics on http://127.0.0.1:METRICS_PORT/metrics. each cluster uses the next port
+        if os.getenv("METRICS_PORT"):
+            port = int(os.getenv("METRICS_PORT")) + self.cluster.cluster_id
+            self.metrics_runner = await start_exporter(self.metrics, os.getenv("METRICS_HOST") or "127.0.0.1", port)
+            print(f"Serving metrics on port {port}")
+        
+        # sync slash commands on start. unchanged commands are not synced again, so frequent reboots do not get ratelimited
+        # scopes that fail to sync are logged and tried again on the next sync
+        await self.sync_commands()
+            
+    async def close(self) -> None:
+        """Stop background samplers, the file watcher and the metrics exporter along with the bot"""
+        self.hot_reload.stop()
+        self.loop_lag.stop()
+        self.watchdog.stop()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await super().close()
             
     async def on_ready(self) -> None:
         """Configurations to run when bot is ready"""
@@ -67,9 +160,43 @@ class Bot(commands.Bot):
         
         print(f"{self.user} is up and running")
         
+    # cached help permission checks go stale when roles or permissions change
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        if before.roles != after.roles:
+            helpcmd.invalidate_checks(guild_id=after.guild.id, user_id=after.id)
+            
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role) -> None:
+        if before.permissions != after.permissions:
+            helpcmd.invalidate_checks(guild_id=after.guild.id)
+            
+    async def on_guild_role_delete(self, role: discord.Role) -> None:
+        helpcmd.invalidate_checks(guild_id=role.guild.id)
+        
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel) -> None:
+        if before.overwrites != after.overwrites:
+            helpcmd.invalidate_checks(guild_id=after.guild.id)
+        
         
-# create client object
-client = Bot(intents=discord.Intents.all())
+# same bot, with shards managed by discord.py. used when SHARD_COUNT is set
+class ShardedBot(Bot, commands.AutoShardedBot):
+    pass
+
+
+# create client object. SHARD_COUNT="auto" lets discord pick the shard count, SHARD_IDS limits this process to some shards
+def create_client() -> Bot:
+    shard_count = os.getenv("SHARD_COUNT")
+    if not shard_count:
+        return Bot(intents=discord.Intents.all())
+    
+    shard_ids = [int(shard_id) for shard_id in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+    return ShardedBot(
+        intents=discord.Intents.all(),
+        shard_count=None if shard_count == "auto" else int(shard_count),
+        shard_ids=shard_ids
+    )
+
+
+client = create_client()
 
 
 # backup for loading heart cog in case cog fails
@@ -84,11 +211,19 @@ async def load_heart(ctx) -> None:
     except:
         await ctx.reply("Error inside Heart cog. This needs to be fixed urgently")
     else:
+        await client.help_index.rebuild(client)
         await ctx.reply("Heart cog is now loaded and functional")
         
         
 @client.event
 async def on_command_error(ctx: commands.Context, error: Exception) -> None:
+    """Counts the error and times its handling, app command errors are counted by the command tree"""
+    client.metrics.count_error(error)
+    with client.metrics.measure("error", type(error).__name__, checks=False):
+        await handle_command_error(ctx, error)
+        
+        
+async def handle_command_error(ctx: commands.Context, error: Exception) -> None:
     """Exception Handler. Not working for app commands. Test this"""
     
     send_help = (commands.MissingRequiredArgument, commands.BadArgument, commands.TooManyArguments, commands.UserInputError)
@@ -111,7 +246,7 @@ async def on_command_error(ctx: commands.Context, error: Exception) -> None:
         
     elif isinstance(error, send_help):
         name = ctx.command.parent.name + " " + ctx.command.name if ctx.command.parent else ctx.command.name
-        await initiate_helpcmd(client=client, ctx=ctx, entity=name, is_error=True, error=error.args)
+        await helpcmd.initiate_helpcmd(client=client, ctx=ctx, entity=name, is_error=True, error=error.args)
 
     else:
         await ctx.reply(error)
@@ -1,20 +1,29 @@
-import contextlib
 import io
-import os
+import marshal
 import textwrap
 from traceback import format_exception
+from typing import Awaitable, Callable, Optional
 
 import discord
 from discord.ext import commands
 
-from modules import jsonhandler
-from modules.paginator import Paginator
+from modules import jsonhandler, profiling
+from modules.capture import CappedOutput, capture
+from modules.paginator import Paginator, StreamPaginator
+from modules.profiling import format_stats, profile, timeit
+from modules.sandbox import SandboxPool
 
 
 # Heart Cog. The heart of the bot and includes all vital commands for proper functionality. All commands in this cog are hidden
 class Heart(commands.Cog):
     def __init__(self, client: commands.Bot) -> None:
         self.client = client
+        self.stream_limit = 20000       # characters of streamed eval output shown before the rest goes to a file
+        self.sandbox = SandboxPool()    # worker processes for code that does not need the bot
+        
+    # stop idle sandbox workers along with the cog
+    async def cog_unload(self) -> None:
+        await self.sandbox.close()
     
     # remove backticks from code for eval command
     @staticmethod
@@ -24,27 +33,42 @@ class Heart(commands.Cog):
         else:
             return code
         
-    # return True if a given cog name exists within cog directory
-    @staticmethod
-    async def cog_exists(extension: str) -> bool:
-        for pyfile in os.listdir("./cogs"):
-            if pyfile == f"{extension}.py":
-                return True
-        else:
-            return False
+    # wrap code in an async function, with local variables defined for ease of use
+    def compile_code(self, ctx: commands.Context, code: str) -> Callable[[], Awaitable]:
+        local_variables = {
+        "discord": discord,
+        "commands": commands,
+        "bot": self.client,
+        "client": self.client,
+        "ctx": ctx,
+        "message": ctx.message,
+        "author": ctx.author,
+        "channel": ctx.channel,
+        "guild": ctx.guild
+        }
+        exec(f"async def function():\n{textwrap.indent(self.clean_code(code), '    ')}", local_variables)
+        return local_variables["function"]
+        
+    # return True if a given cog name exists within cog directory, as discovered on start
+    async def cog_exists(self, extension: str) -> bool:
+        return self.client.extension_loader.exists(extension)
 
     # sync command tree. only usable by bot owners
     @commands.is_owner() 
     @commands.command(name="sync", help="Sync slash commands", hidden=True)
-    async def sync(self, ctx: commands.Context) -> None:
+    async def sync(self, ctx: commands.Context, mode: str = None) -> None:
+        """
+        :param mode: "force" to sync every scope, even if its commands did not change
+        :type mode: str, optional
+        """
         await ctx.reply("Attempting to sync commands")
         try:
-            await self.client.tree.sync()
+            report = await self.client.sync_commands(force=mode == "force")
         except Exception as error:
             await ctx.reply("Error when attempting to sync commands")
             raise error
         else:
-            await ctx.reply("Slash commands synced successfully")
+            await ctx.reply("\n".join(report))
     
     # execute python code. only usable by bot owners
     @commands.is_owner()
@@ -58,54 +82,213 @@ class Heart(commands.Cog):
             await ctx.reply("No command given")
             return
         
-        code = self.clean_code(code)
-        
-        # define local variables for ease of use
-        local_variables = {
-        "discord": discord,
-        "commands": commands,
-        "bot": self.client,
-        "client": self.client,
-        "ctx": ctx,
-        "message": ctx.message,
-        "author": ctx.author,
-        "channel": ctx.channel,
-        "guild": ctx.guild
-        }
-        
         # output set to StringIO object
         stdout = io.StringIO()
         
         try:
-            # redirect output to stringIO
-            with contextlib.redirect_stdout(stdout):
+            # redirect output of this command to stringIO, other commands keep printing to the console
+            with capture(stdout):
                 
                 # execute block
-                exec(f"async def function():\n{textwrap.indent(code, '    ')}", local_variables)
+                function = self.compile_code(ctx, code)
                 
                 # format result as (printed lines \n -- returned lines), embed title is SUCCESS
-                obj = await local_variables["function"]()
+                obj = await function()
                 result = f"{stdout.getvalue()}\n-- {obj}"
                 title = "**SUCCESS**"
-                colour = jsonhandler.fetch_data("orange", "colours")
+                colour = await jsonhandler.fetch_data_async("orange", "colours")
                 
         # if error, send error as the result itself
         except Exception as error:
             result = "".join(format_exception(error, error, error.__traceback__))
             title = "**ERROR**"
-            colour = jsonhandler.fetch_data("red", "colours")
+            colour = await jsonhandler.fetch_data_async("red", "colours")
             
-        # send all output as a paged embed
+        # send all output as a paged embed, split into pages as large as discord allows
+        # long output is clicked through quickly, clicks within 0.3 seconds are sent as one edit
         pager = Paginator(
             timeout=100,
             title=title,
             ctx=ctx,
-            entries=[result[i: i + 2000] for i in range(0, len(result), 2000)],
+            entries=[result],
             colour=colour,
             length=1,
             prefix="```\n",
+            suffix="\n```",
+            pack=True,
+            coalesce=0.3
+        )
+        await pager.start()
+    
+    # execute python code, showing printed lines while it runs. only usable by bot owners
+    @commands.is_owner()
+    @commands.command(name="stream", aliases=["seval"], help="Run python code, showing output as it is printed", hidden=True)
+    async def stream_code(self, ctx: commands.Context, *, code: str) -> None:
+        """
+        :param code: Block of code to run
+        :type code: str
+        """
+        pager = StreamPaginator(
+            timeout=100,
+            title="**RUNNING**",
+            ctx=ctx,
+            colour=await jsonhandler.fetch_data_async("orange", "colours"),
+            prefix="```\n",
+            suffix="\n```"
+        )
+        # output beyond the cap is attached as a file once the code finishes
+        output = CappedOutput(pager.write, limit=self.stream_limit)
+        await pager.start()
+        
+        # shown if the command is cancelled before the code finishes
+        title = "**CANCELLED**"
+        colour = await jsonhandler.fetch_data_async("red", "colours")
+        try:
+            with capture(output):
+                function = self.compile_code(ctx, code)
+                obj = await function()
+            pager.write(f"\n-- {obj}")
+            title = "**SUCCESS**"
+            colour = await jsonhandler.fetch_data_async("orange", "colours")
+        except Exception as error:
+            pager.write("\n" + "".join(format_exception(error, error, error.__traceback__)))
+            title = "**ERROR**"
+        finally:
+            file = output.file()
+            await pager.finish(title=title, colour=colour, files=[file] if file else None)
+        
+    # execute python code in a separate process with time and resource limits. only usable by bot owners
+    # bot, ctx and other discord objects are not available there, use eval for code that needs them
+    @commands.is_owner()
+    @commands.command(name="sandbox", aliases=["peval"], help="Run python code in a separate process", hidden=True)
+    async def sandbox_code(self, ctx: commands.Context, *, code: str) -> None:
+        """
+        :param code: Block of code to run
+        :type code: str
+        """
+        pager = StreamPaginator(
+            timeout=100,
+            title="**RUNNING**",
+            ctx=ctx,
+            colour=await jsonhandler.fetch_data_async("orange", "colours"),
+            prefix="```\n",
             suffix="\n```"
         )
+        output = CappedOutput(pager.write, limit=self.stream_limit)
+        await pager.start()
+        
+        title = "**CANCELLED**"
+        colour = await jsonhandler.fetch_data_async("red", "colours")
+        try:
+            result = await self.sandbox.run(self.clean_code(code), output.write)
+            if result.status == "success":
+                pager.write(f"\n-- {result.value}")
+                title = "**SUCCESS**"
+                colour = await jsonhandler.fetch_data_async("orange", "colours")
+            elif result.status == "error":
+                pager.write(f"\n{result.value}")
+                title = "**ERROR**"
+            elif result.status == "timeout":
+                pager.write(f"\n-- stopped after {self.sandbox.timeout} seconds")
+                title = "**TIMEOUT**"
+            else:
+                pager.write(f"\n-- worker {result.reason}")
+                title = "**KILLED**"
+        finally:
+            file = output.file()
+            await pager.finish(title=title, colour=colour, files=[file] if file else None)
+        
+    # run python code under cProfile and list the functions it spent most time in. only usable by bot owners
+    @commands.is_owner()
+    @commands.command(name="profile", help="Profile python code", hidden=True)
+    async def profile_code(self, ctx: commands.Context, *, code: str) -> None:
+        """
+        :param code: Block of code to profile
+        :type code: str
+        """
+        if profiling.busy():
+            await ctx.reply("Another profile or timeit run is in progress, try again once it has finished")
+            return
+        
+        files = []
+        try:
+            # printed lines are not needed, only the profile
+            with capture(io.StringIO()):
+                obj, stats = await profile(self.compile_code(ctx, code))
+            result = f"{format_stats(stats, limit=25)}\n-- {obj}"
+            title = "**PROFILE**"
+            colour = await jsonhandler.fetch_data_async("orange", "colours")
+            # full stats, as text and in the binary format read by pstats and snakeviz
+            files = [
+                discord.File(io.BytesIO(format_stats(stats).encode()), filename="profile.txt"),
+                discord.File(io.BytesIO(marshal.dumps(stats.stats)), filename="profile.prof")
+            ]
+        except Exception as error:
+            result = "".join(format_exception(error, error, error.__traceback__))
+            title = "**ERROR**"
+            colour = await jsonhandler.fetch_data_async("red", "colours")
+            
+        pager = Paginator(
+            timeout=100,
+            title=title,
+            ctx=ctx,
+            entries=[result],
+            colour=colour,
+            length=1,
+            prefix="```\n",
+            suffix="\n```",
+            pack=True,
+            files=files
+        )
+        await pager.start()
+        
+    # run python code a number of times and report its run time and memory use. only usable by bot owners
+    @commands.is_owner()
+    @commands.command(name="timeit", help="Time python code", hidden=True)
+    async def time_code(self, ctx: commands.Context, runs: Optional[int] = 10, *, code: str) -> None:
+        """
+        :param runs: Number of times to run the code, 10 by default
+        :type runs: int, optional
+        :param code: Block of code to time
+        :type code: str
+        """
+        if runs < 1:
+            await ctx.reply("Runs must be at least 1")
+            return
+        if profiling.busy():
+            await ctx.reply("Another profile or timeit run is in progress, try again once it has finished")
+            return
+        
+        try:
+            with capture(io.StringIO()):
+                report = await timeit(self.compile_code(ctx, code), runs)
+            result = (
+                f"{report['runs']} runs\n"
+                f"min    {report['min']*1000:.3f} ms\n"
+                f"median {report['median']*1000:.3f} ms\n"
+                f"p95    {report['p95']*1000:.3f} ms\n"
+                f"max    {report['max']*1000:.3f} ms\n"
+                f"peak memory     {report['peak']/1024:.1f} KiB\n"
+                f"retained memory {report['retained']/1024:.1f} KiB"
+            )
+            title = "**TIMEIT**"
+            colour = await jsonhandler.fetch_data_async("orange", "colours")
+        except Exception as error:
+            result = "".join(format_exception(error, error, error.__traceback__))
+            title = "**ERROR**"
+            colour = await jsonhandler.fetch_data_async("red", "colours")
+            
+        pager = Paginator(
+            timeout=100,
+            title=title,
+            ctx=ctx,
+            entries=[result],
+            colour=colour,
+            length=1,
+            prefix="```\n",
+            suffix="\n```",
+            pack=True
+        )
         await pager.start()
     
     # load a cog/extension  
@@ -117,18 +300,8 @@ class Heart(commands.Cog):
         :type extension: str
         """
         if extension == "all":
-            output = ""
-            for filename in os.listdir("./cogs"):
-                if filename.endswith(".py"):
-                    filename = filename[:-3] # remove .py from ending
-                    try:
-                        await self.load_extension(f"cogs.{filename}")
-                    except commands.ExtensionFailed as error:
-                        output += f"\n{error}"
-                    except commands.NoEntryPointError as error:
-                        output += f"\nPy file is not a cog: {filename}"
-                    else:
-                        output += f"\nSuccessfully loaded {filename} cog"
+            output = "\n".join(await self.client.extension_loader.load_all())
+            await self.client.help_index.rebuild(self.client)
             await ctx.reply(output)
             return
         
@@ -143,6 +316,7 @@ class Heart(commands.Cog):
         except:
             await ctx.reply(f"Error inside Cog \"{cog_title}\". This cog needs to be fixed before it can be used")
         else:
+            await self.client.help_index.rebuild(self.client)
             await ctx.reply(f"Successfully loaded cog \"{cog_title}\"")
     
     # unload a cog/extension        
@@ -168,6 +342,7 @@ class Heart(commands.Cog):
             else:
                 await ctx.reply(f"Cog \"{cog_title}\" not found")
         else:
+            await self.client.help_index.rebuild(self.client)
             await ctx.reply(f"Successfully unloaded cog \"{cog_title}\"")
                 
     # reload an already loaded cog/extension
@@ -196,26 +371,92 @@ class Heart(commands.Cog):
             try:
                 await self.client.load_extension(f"cogs.{filename}")
             except commands.ExtensionNotFound:
+                await self.client.help_index.rebuild(self.client)
                 await ctx.reply(f"Cog \"{cog_title}\" is no longer available. Unloaded successfully")
             except Exception as error:
+                await self.client.help_index.rebuild(self.client)
                 await ctx.reply(f"Error inside Cog \"{cog_title}\". This cog needs to be fixed before it can be used again")
                 raise error
             else:
+                await self.client.help_index.rebuild(self.client)
                 await ctx.reply(f"Successfully reloaded cog \"{cog_title}\"")
                 
         
+    # cogs loaded on only some clusters are marked with the clusters that have them
     @commands.command(name="cogs", help="Display all cogs/extensions", hidden=True)
     async def display_cogs(self, ctx: commands.Context) -> None:
-        cogs = self.client.cogs
+        clusters = await self.client.cluster.collect(self.client)
+        cogs = {}
+        for cluster, stats in clusters.items():
+            for cog in stats["cogs"]:
+                cogs.setdefault(cog, []).append(cluster)
         if len(cogs) < 1:
             await ctx.reply("No loaded cogs")
             return
         embed = Paginator (
             ctx=ctx,
             title="**Cogs**",
-            entries=sorted([cog for cog in cogs]),
-            colour=jsonhandler.fetch_data("orange", "colours"),
-            length=10,
+            entries=sorted([cog if len(found) == len(clusters) else f"{cog} (clusters {', '.join(map(str, found))})" for cog, found in cogs.items()]),
+            colour=await jsonhandler.fetch_data_async("orange", "colours"),
+            pack=True
+        )
+        await embed.start()
+        
+    # most recent stalls of the event loop, newest first. only usable by bot owners
+    @commands.is_owner()
+    @commands.command(name="stalls", help="Display event loop stalls caught by the watchdog", hidden=True)
+    async def stalls(self, ctx: commands.Context) -> None:
+        watchdog = self.client.watchdog
+        if not watchdog.running and not watchdog.stalls:
+            await ctx.reply("Loop watchdog is not running. Set LOOP_WATCHDOG=\"1\" in .env to enable it")
+            return
+        if not watchdog.stalls:
+            await ctx.reply(f"No stalls longer than {watchdog.threshold*1000:.0f} ms so far")
+            return
+        entries = []
+        for stall in reversed(watchdog.stalls):
+            # the innermost frames show what was blocking
+            stack = "\n".join(stall.stack.rstrip().splitlines()[-12:])
+            entries.append(
+                f"**<t:{int(stall.time)}:T>** {stall.duration*1000:.0f} ms in {stall.command or 'no command'} ({stall.source})\n"
+                f"```\n{stack}\n```"
+            )
+        embed = Paginator (
+            ctx=ctx,
+            title="**Loop Stalls**",
+            entries=entries,
+            colour=await jsonhandler.fetch_data_async("orange", "colours"),
+            linesep="\n",
+            pack=True
+        )
+        await embed.start()
+        
+    # per command counts and latencies since start. only usable by bot owners
+    @commands.is_owner()
+    @commands.command(name="stats", help="Display command latency and usage stats", hidden=True)
+    async def stats(self, ctx: commands.Context) -> None:
+        entries = self.client.metrics.summary()
+        if len(entries) < 1:
+            await ctx.reply("No commands recorded yet")
+            return
+        errors = self.client.metrics.error_types
+        pagers = Paginator.manager.stats()
+        edits = Paginator.edit_stats
+        message = [
+            f"Paginators: {pagers['active']} open for {pagers['users']} users (at most {pagers['max_per_user']} for one), "
+            f"{pagers['evictions']} evicted, about {pagers['bytes'] / 1024:.1f} KiB of pages",
+            f"Page edits: {edits['requested']} requested, {edits['sent']} sent, {edits['requested'] - edits['sent']} saved"
+        ]
+        if errors:
+            message.insert(0, f"Errors: {', '.join(f'{name} {count}' for name, count in errors.most_common())}")
+        embed = Paginator (
+            ctx=ctx,
+            title="**Command Stats**",
+            message="\n".join(message),
+            entries=entries,
+            colour=await jsonhandler.fetch_data_async("orange", "colours"),
+            linesep="\n\n",
+            pack=True
         )
         await embed.start()
     
@@ -1,24 +1,91 @@
+import asyncio
+import time
+
 import discord
 from discord.ext import commands
 from discord import app_commands
 from modules import jsonhandler
+from modules.cluster import format_latency
+from modules.diagnostics import sparkline
+from modules.webhooks import WebhookPool
 
 
 # Cog for all miscellaneous commands 
 class Misc(commands.Cog):
     def __init__(self, client: commands.Bot) -> None:
         self.client = client
+        self.webhooks = WebhookPool(client)     # one reusable webhook per channel for impersonate
+        self.discover_task = None
+        
+    # find webhooks created before a restart once the bot is ready, without holding up loading
+    async def cog_load(self) -> None:
+        self.discover_task = asyncio.create_task(self.webhooks.discover())
+        
+    async def cog_unload(self) -> None:
+        if self.discover_task is not None:
+            self.discover_task.cancel()
         
-    # latency checker
+    # latency checker. with several shards or clusters, every shard's latency is listed as well
+    # diagnostics adds REST round trip, event loop lag and handler time, with recent history as sparklines
     @app_commands.command(name="ping", description="Return latency of the bot")
-    async def latency(self, interaction: discord.Interaction) -> None:
-        await interaction.response.send_message(
-        embed=discord.Embed(
+    async def latency(self, interaction: discord.Interaction, diagnostics: bool = False) -> None:
+        """
+        :param diagnostics: Also measure REST latency and event loop lag
+        :type diagnostics: bool, optional
+        """
+        start = time.perf_counter()
+        # diagnostics wait on a REST round trip, which may take longer than discord allows before a reply
+        if diagnostics:
+            await interaction.response.defer()
+        description = format_latency(self.client.latency)
+        
+        clusters = await self.client.cluster.collect(self.client)
+        shards = [(cluster, shard, latency) for cluster, stats in clusters.items() for shard, latency in stats["shards"].items()]
+        if len(shards) > 1 or self.client.cluster.clustered or diagnostics:
+            description += "\n"
+            for cluster, stats in clusters.items():
+                status = " (not responding)" if stats.get("stale") else ""
+                description += f"\n**Cluster {cluster}**{status}, {stats['guilds']} guilds"
+                for shard, latency in stats["shards"].items():
+                    description += f"\nShard {shard}: {format_latency(latency)}"
+                    
+        if diagnostics:
+            description += "\n\n" + await self.diagnostics()
+            # time from discord creating the interaction to now includes gateway delivery and clock skew
+            received = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+            description += f"\nHandler: {format_latency(time.perf_counter() - start)} (interaction age {format_latency(received)})"
+        
+        embed = discord.Embed(
             title = "**LATENCY**",
-            colour = jsonhandler.fetch_data("blue", "colours"),
-            description = f"{round(self.client.latency*1000)} ms"
+            colour = await jsonhandler.fetch_data_async("blue", "colours"),
+            description = description
         )
-    )
+        if diagnostics:
+            await interaction.followup.send(embed=embed)
+        else:
+            await interaction.response.send_message(embed=embed)
+        
+    # REST round trip and event loop lag of this process
+    async def diagnostics(self) -> str:
+        probe, lag = self.client.rest_probe, self.client.loop_lag.history
+        try:
+            rest = format_latency(await probe.probe(self.client))
+        except discord.HTTPException as error:
+            rest = f"failed ({error.status})"
+        lines = [f"**REST**: {rest}"]
+        if len(probe.history) > 1:
+            lines.append(f"Last {len(probe.history.recent(20))} probes: {sparkline(probe.history.recent(20))}")
+            
+        if len(lag):
+            lines.append(
+                f"**Event loop lag** (last {len(lag) * self.client.loop_lag.interval:.0f}s): "
+                f"p50 {format_latency(lag.percentile(50))}, p95 {format_latency(lag.percentile(95))}, "
+                f"p99 {format_latency(lag.percentile(99))}, max {format_latency(lag.percentile(100))}"
+            )
+            lines.append(f"Recent: {sparkline(lag.recent(30))}")
+        else:
+            lines.append("**Event loop lag**: no samples yet")
+        return "\n".join(lines)
         
     # say a certain line of text
     @app_commands.command(name="say", description="Repeat a line of text")
@@ -55,11 +122,9 @@ class Misc(commands.Cog):
         """
         if await self.client.is_owner(interaction.user):
             await interaction.response.send_message("ok", ephemeral=True, delete_after=0.5)
-        webhook = await interaction.channel.create_webhook(name=member.name + member.discriminator)
         if not message:
             message = ""
-        await webhook.send(message, username=member.display_name, avatar_url=member.avatar.url)
-        await webhook.delete()
+        await self.webhooks.send(interaction.channel, message, username=member.display_name, avatar_url=member.display_avatar.url)
         
     @commands.is_owner()
     @commands.command(name="status", description="Change my status")
@@ -0,0 +1,32 @@
+import os
+
+from dotenv import load_dotenv
+
+from modules.cluster import Supervisor, recommended_shards
+
+load_dotenv()
+
+
+# SHARD_COUNT is a number, or auto for the count discord recommends
+def get_shard_count() -> int:
+    value = os.getenv("SHARD_COUNT") or "1"
+    if value.lower() == "auto":
+        shard_count = recommended_shards(os.getenv("DISCORD"), os.getenv("DISCORD_API_BASE"))
+        print(f"Discord recommends {shard_count} shards")
+        return shard_count
+    try:
+        return int(value)
+    except ValueError:
+        raise SystemExit(f"SHARD_COUNT must be a number or auto, not {value!r}")
+
+
+# run the bot as several processes, each owning a range of shards. crashed clusters are restarted
+# SHARD_COUNT and CLUSTER_COUNT are read from .env
+def run():
+    shard_count = get_shard_count()
+    cluster_count = int(os.getenv("CLUSTER_COUNT") or 1)
+    Supervisor(shard_count, cluster_count).run()
+    
+    
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,92 @@
+import contextlib
+import contextvars
+import sys
+import tempfile
+import threading
+from typing import Callable
+
+import discord
+
+
+SPILL_LIMIT = 8 * 1024 * 1024       # characters kept in the attachment for output beyond the cap
+
+# where print() goes for the current task, None -> the real stdout
+_sink: contextvars.ContextVar = contextvars.ContextVar("stdout_sink", default=None)
+
+
+# Replaces sys.stdout once, sending writes to the sink of the task doing the writing
+# Unlike contextlib.redirect_stdout, output of other coroutines running at the same time is left alone
+# Tasks started by a capturing task copy its context, so their output is captured too
+class TaskStdout():
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        sink = _sink.get()
+        return (sink or self.stream).write(text)
+
+    def flush(self) -> None:
+        sink = _sink.get()
+        (sink or self.stream).flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+def install() -> None:
+    if not isinstance(sys.stdout, TaskStdout):
+        sys.stdout = TaskStdout(sys.stdout)
+
+
+# send print() output of the current task (and tasks it starts) to sink while inside the block
+@contextlib.contextmanager
+def capture(sink):
+    install()
+    token = _sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _sink.reset(token)
+
+
+# Output passed on to write until limit characters, everything after is spilled to a temporary file instead
+# Safe to write to from other threads, e.g. code run with asyncio.to_thread
+class CappedOutput():
+    def __init__(self, write: Callable[[str], None], limit: int = 20000):
+        self.target = write
+        self.limit = limit
+        self.shown = 0          # characters passed on to write
+        self.spilled = 0        # characters written to the spill file
+        self.dropped = 0        # characters beyond SPILL_LIMIT, not kept anywhere
+        self.spill = None
+        self.lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self.lock:
+            room = self.limit - self.shown
+            if room > 0:
+                self.target(text[:room])
+                self.shown += min(room, len(text))
+            excess = text[max(room, 0):]
+            if excess:
+                if self.spill is None:
+                    self.spill = tempfile.TemporaryFile()
+                    self.target(f"\n[output capped at {self.limit} characters, the rest is attached]")
+                kept = excess[:SPILL_LIMIT - self.spilled]
+                self.spill.write(kept.encode())
+                self.spilled += len(kept)
+                self.dropped += len(excess) - len(kept)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    # attachment holding the output beyond the cap, None if the cap was never hit
+    def file(self) -> discord.File | None:
+        if self.spill is None:
+            return None
+        with self.lock:
+            if self.dropped:
+                self.spill.write(f"\n[{self.dropped} more characters dropped]".encode())
+            self.spill.seek(0)
+        return discord.File(self.spill, filename="output.txt")
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import signal
+import time
+import urllib.request
+
+import discord
+from discord.ext import commands
+
+
+PUBLISH_INTERVAL = 10       # seconds between each cluster publishing its stats
+STALE_AFTER = 60            # stats older than this are reported as a cluster that is down
+
+
+# split shard ids 0..shard_count-1 into cluster_count contiguous ranges, sizes differ by at most one
+# a cluster needs a shard, so there are never more ranges than shards
+def shard_ranges(shard_count: int, cluster_count: int) -> list[list[int]]:
+    cluster_count = min(cluster_count, shard_count)
+    per_cluster, extra = divmod(shard_count, cluster_count)
+    ranges, start = [], 0
+    for cluster_id in range(cluster_count):
+        size = per_cluster + (cluster_id < extra)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+# shard count discord recommends for the bot, from GET /gateway/bot
+def recommended_shards(token: str, api_base: str = None) -> int:
+    request = urllib.request.Request(
+        f"{api_base or discord.http.Route.BASE}/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": f"DiscordBot (https://github.com/Rapptz/discord.py {discord.__version__})"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["shards"]
+
+
+# latency in ms for display, heartbeat latency is nan/inf until the first heartbeat
+def format_latency(latency: float) -> str:
+    if math.isnan(latency) or math.isinf(latency):
+        return "n/a"
+    return f"{round(latency*1000)} ms"
+
+
+# stats of the current process: heartbeat latency of each shard, guild count and loaded cogs
+def local_stats(client: commands.Bot, cluster_id: int) -> dict:
+    if isinstance(client, discord.AutoShardedClient):
+        latencies = dict(client.latencies)
+    else:
+        latencies = {client.shard_id or 0: client.latency}
+    return {
+        "cluster": cluster_id,
+        "shards": latencies,
+        "guilds": len(client.guilds),
+        "cogs": sorted(client.cogs),
+        "updated": time.time()
+    }
+
+
+# Shares stats between clusters through a dict owned by the launcher's multiprocessing manager
+# Without a launcher (shared is None) only the local process is reported
+class ClusterState():
+    def __init__(self, cluster_id: int = 0, shared: dict = None):
+        self.cluster_id = cluster_id
+        self.shared = shared
+        self.task = None
+
+    @property
+    def clustered(self) -> bool:
+        return self.shared is not None
+
+    # publish local stats every PUBLISH_INTERVAL seconds. manager calls go through a thread as they block
+    def start(self, client: commands.Bot) -> None:
+        if self.clustered and self.task is None:
+            self.task = asyncio.create_task(self.publish_loop(client))
+
+    async def publish_loop(self, client: commands.Bot) -> None:
+        while True:
+            await self.publish(client)
+            await asyncio.sleep(PUBLISH_INTERVAL)
+
+    async def publish(self, client: commands.Bot) -> None:
+        stats = local_stats(client, self.cluster_id)
+        await asyncio.to_thread(self.shared.__setitem__, self.cluster_id, stats)
+
+    # stats of every cluster, cluster id -> stats. the local cluster is always fresh
+    async def collect(self, client: commands.Bot) -> dict[int, dict]:
+        if not self.clustered:
+            return {self.cluster_id: local_stats(client, self.cluster_id)}
+        await self.publish(client)
+        stats = await asyncio.to_thread(self.shared.copy)
+        now = time.time()
+        for cluster in stats.values():
+            cluster["stale"] = now - cluster["updated"] > STALE_AFTER
+        return dict(sorted(stats.items()))
+
+
+# entry point of a cluster process. environment is set before bot is imported, as bot builds the client on import
+def run_cluster(cluster_id: int, shard_ids: list[int], shard_count: int, shared: dict) -> None:
+    os.environ["CLUSTER_ID"] = str(cluster_id)
+    os.environ["SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+    os.environ["SHARD_COUNT"] = str(shard_count)
+
+    import bot
+    bot.client.cluster = ClusterState(cluster_id, shared)
+    bot.run()
+
+
+# Starts one process per cluster, each owning a range of shards, and restarts clusters that crash
+# worker can be swapped for a fake to run the supervisor locally without connecting to discord
+class Supervisor():
+    def __init__(
+                self,
+                shard_count: int,
+                cluster_count: int,
+                worker = run_cluster,           # function run in each process: (cluster_id, shard_ids, shard_count, shared)
+                max_backoff: float = 60,        # longest wait before restarting a crashed cluster
+                stable_after: float = 60        # seconds a cluster must stay up for its backoff to reset
+                ):
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, cluster_count)
+        if len(self.ranges) < cluster_count:
+            print(f"Only {shard_count} shards for {cluster_count} clusters, running {len(self.ranges)} clusters")
+        self.worker = worker
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+
+        self.context = multiprocessing.get_context("spawn")
+        self.manager = None
+        self.shared = None
+        self.processes: dict[int, multiprocessing.Process] = {}
+        self.started: dict[int, float] = {}         # cluster id -> time its current process started
+        self.restarts: dict[int, int] = {}          # cluster id -> crashes in a row
+        self.restart_at: dict[int, float] = {}      # cluster id -> time a crashed cluster is due to restart
+        self.stopping = False
+
+    def start_cluster(self, cluster_id: int) -> None:
+        process = self.context.Process(
+            target=self.worker,
+            args=(cluster_id, self.ranges[cluster_id], self.shard_count, self.shared),
+            name=f"cluster-{cluster_id}"
+        )
+        process.start()
+        self.processes[cluster_id] = process
+        self.started[cluster_id] = time.monotonic()
+        print(f"Started cluster {cluster_id} with shards {self.ranges[cluster_id]} (pid {process.pid})")
+
+    # check every cluster once, scheduling and performing restarts of crashed ones
+    def check(self) -> None:
+        now = time.monotonic()
+        for cluster_id, process in list(self.processes.items()):
+            if process.is_alive():
+                if now - self.started[cluster_id] > self.stable_after:
+                    self.restarts[cluster_id] = 0
+                continue
+
+            if cluster_id in self.restart_at:
+                if now >= self.restart_at[cluster_id]:
+                    del self.restart_at[cluster_id]
+                    self.start_cluster(cluster_id)
+            elif process.exitcode == 0:
+                print(f"Cluster {cluster_id} exited cleanly, not restarting")
+                del self.processes[cluster_id]
+            else:
+                self.restarts[cluster_id] = self.restarts.get(cluster_id, 0) + 1
+                backoff = min(self.max_backoff, 2 ** (self.restarts[cluster_id] - 1))
+                self.restart_at[cluster_id] = now + backoff
+                print(f"Cluster {cluster_id} crashed with exit code {process.exitcode}, restarting in {backoff}s")
+
+    def stop(self, *args) -> None:
+        self.stopping = True
+
+    def run(self, poll: float = 1) -> None:
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.manager = self.context.Manager()
+        self.shared = self.manager.dict()
+        try:
+            for cluster_id in range(len(self.ranges)):
+                self.start_cluster(cluster_id)
+            while not self.stopping and self.processes:
+                self.check()
+                time.sleep(poll)
+        finally:
+            for process in self.processes.values():
+                process.terminate()
+            for process in self.processes.values():
+                process.join()
+            self.manager.shutdown()
@@ -0,0 +1,70 @@
+import asyncio
+import hashlib
+import json
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+from modules import jsonhandler
+
+
+HASH_FILE = "command_hashes"     # data file keeping the hash of each scope as it was last synced
+
+
+def digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+# hash of every app command in a scope, keyed by command name. guild=None is the global scope
+def command_hashes(tree: discord.app_commands.CommandTree, guild: discord.abc.Snowflake = None) -> dict[str, str]:
+    return {command.name: digest(command.to_dict()) for command in tree.get_commands(guild=guild)}
+
+
+# one line per added, removed and changed command between two syncs of a scope
+def diff(old: dict[str, str], new: dict[str, str]) -> list[str]:
+    lines = [f"+ {name}" for name in sorted(new.keys() - old.keys())]
+    lines += [f"- {name}" for name in sorted(old.keys() - new.keys())]
+    lines += [f"~ {name}" for name in sorted(old.keys() & new.keys()) if old[name] != new[name]]
+    return lines
+
+
+def load_hashes() -> dict:
+    try:
+        return jsonhandler.read_file(HASH_FILE)
+    except FileNotFoundError:
+        return {}
+
+
+# sync the command tree only for scopes whose commands changed since the last sync. force=True syncs every scope
+# scopes are the global commands, guilds listed under "sync_guilds" in config and guilds synced before
+# returns a report of what was synced and what changed
+async def sync_changed(client: commands.Bot, force: bool = False) -> list[str]:
+    stored = load_hashes()
+    guild_ids = set(jsonhandler.fetch_data("sync_guilds", "config") or [])
+    guild_ids.update(int(scope) for scope in stored if scope != "global")
+
+    scopes = {"global": None} | {str(guild_id): discord.Object(id=guild_id) for guild_id in sorted(guild_ids)}
+    report = []
+    for scope, guild in scopes.items():
+        commands_now = command_hashes(client.tree, guild)
+        scope_hash = digest(commands_now)
+        previous = stored.get(scope, {"hash": None, "commands": {}})
+        if not force and previous["hash"] == scope_hash:
+            continue
+
+        # a scope that fails (rate limited, missing access, network) keeps its old hash and is tried on the next sync
+        try:
+            await client.tree.sync(guild=guild)
+        except (discord.HTTPException, discord.app_commands.MissingApplicationID, aiohttp.ClientError, asyncio.TimeoutError) as error:
+            report.append(f"Failed to sync {scope} commands: {error!r}")
+            continue
+        changes = diff(previous["commands"], commands_now)
+        report.append(f"Synced {scope} commands" + (": " + ", ".join(changes) if changes else ""))
+        # only remember scopes after they were synced successfully
+        stored[scope] = {"hash": scope_hash, "commands": commands_now}
+        jsonhandler.overwrite_file(stored, HASH_FILE)
+
+    if not report:
+        report.append("Commands unchanged, nothing to sync")
+    return report
@@ -0,0 +1,77 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from discord.ext import commands
+from discord.http import Route
+
+
+SPARKS = "▁▂▃▄▅▆▇█"
+
+
+# Fixed size history of samples, oldest dropped first
+class RingBuffer():
+    def __init__(self, size: int):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def add(self, value: float) -> None:
+        self.samples.append(value)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    # nearest rank percentile, None without samples
+    def percentile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+    def recent(self, count: int) -> list[float]:
+        return list(self.samples)[-count:]
+
+
+# one character per value, scaled between the smallest and largest value
+def sparkline(values: list[float]) -> str:
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return "".join(SPARKS[min(len(SPARKS) - 1, int((value - low) / span * len(SPARKS)))] for value in values)
+
+
+# Measures event loop lag: how much later than asked a short sleep wakes up. A busy or blocked loop wakes late
+class LoopLagSampler():
+    def __init__(self, interval: float = 0.5, size: int = 600):
+        self.interval = interval
+        self.history = RingBuffer(size)        # lag of each sample in seconds, size * interval seconds of history
+        self.task = None
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.sample())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def sample(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.history.add(max(0, time.perf_counter() - start - self.interval))
+
+
+# Times a cheap authenticated REST request, going through the same session and ratelimiter as every other request
+class RestProbe():
+    def __init__(self, size: int = 60):
+        self.history = RingBuffer(size)        # round trip of each probe in seconds
+
+    async def probe(self, client: commands.Bot) -> float:
+        start = time.perf_counter()
+        await client.http.request(Route("GET", "/users/@me"))
+        elapsed = time.perf_counter() - start
+        self.history.add(elapsed)
+        return elapsed
@@ -1,3 +1,9 @@
+import asyncio
+import copy
+import heapq
+import math
+import time
+
 import discord
 from discord.ext import commands
 
@@ -5,6 +11,14 @@ from modules import jsonhandler
 from modules.paginator import Paginator
 
 
+CHECK_CONCURRENCY = 10      # command checks run at the same time for one help request
+CHECK_TTL = 30              # seconds a check result is reused for the same user, guild, channel and command
+CHECK_CACHE_SIZE = 5000     # stored check results before expired ones are dropped
+
+# (user id, guild id, channel id, command name, is prefix command) -> (expiry time, allowed)
+_check_cache: dict[tuple, tuple[float, bool]] = {}
+
+
 async def get_command_signature(command: commands.Command, ctx: commands.Context):
     try:
         command_invoke = f"[{command.name}|{'|'.join(command.aliases)}]" if command.aliases else command.name
@@ -34,37 +48,238 @@ async def get_command_group_signature(command: commands.HybridGroup, ctx: comman
 async def sort_commands( commandList: list) -> list:
     return sorted(commandList, key=lambda x: x.name)
 
-async def filter_commands(walkable: commands.Cog, ctx: commands.Context) -> list:
+# every command shown in help for a cog or group: app commands and all visible prefix commands, sorted by name
+async def collect_commands(walkable: commands.Cog) -> list:
     try:
-        filtered = [command for command in walkable.get_app_commands()]
+        collected = [command for command in walkable.get_app_commands()]
     except AttributeError:
-        filtered = []
-    
-    # ToDo: This does not read app commands. Fix it
+        collected = []
     
     for command in walkable.walk_commands():
         try:
-            try:
-                if command.hidden:
-                    continue
-            except AttributeError:
-                pass
-            # uncomment to exclude all subcommands from main help command
-            # if command.parent:
-            #     continue
-            try:
-                await command.can_run(ctx)
-            except AttributeError:
-                pass
-            filtered.append(command)
-            
+            if command.hidden:
+                continue
+        except AttributeError:
+            pass
+        # uncomment to exclude all subcommands from main help command
+        # if command.parent:
+        #     continue
+        collected.append(command)
+        
+    return await sort_commands(collected)
+
+# forget cached check results, for one guild and/or user or all of them. called when roles or permissions change
+def invalidate_checks(guild_id: int = None, user_id: int = None) -> None:
+    if guild_id is None and user_id is None:
+        _check_cache.clear()
+        return
+    for key in list(_check_cache):
+        if (guild_id is None or key[1] == guild_id) and (user_id is None or key[0] == user_id):
+            del _check_cache[key]
+
+# True if the invoking user may run a command. results are cached for CHECK_TTL seconds
+async def can_run_cached(command, ctx: commands.Context, semaphore: asyncio.Semaphore) -> bool:
+    key = (
+        ctx.author.id,
+        ctx.guild.id if ctx.guild else None,
+        ctx.channel.id,
+        command.qualified_name,
+        isinstance(command, commands.Command)
+    )
+    cached = _check_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    async with semaphore:
+        try:
+            # can_run swaps ctx.command while it runs, so concurrent checks each get their own copy
+            await command.can_run(copy.copy(ctx))
+        except AttributeError:
+            allowed = True
         except commands.CommandError:
-            continue
+            allowed = False
+        else:
+            allowed = True
+            
+    if len(_check_cache) >= CHECK_CACHE_SIZE:
+        now = time.monotonic()
+        for old_key in [old_key for old_key, (expiry, _) in _check_cache.items() if expiry <= now]:
+            del _check_cache[old_key]
+        if len(_check_cache) >= CHECK_CACHE_SIZE:
+            _check_cache.clear()
+    _check_cache[key] = (time.monotonic() + CHECK_TTL, allowed)
+    return allowed
+
+# remove commands the invoking user is not allowed to run. checks run concurrently, at most CHECK_CONCURRENCY at once
+async def check_commands(commandList: list, ctx: commands.Context) -> list:
+    semaphore = asyncio.Semaphore(CHECK_CONCURRENCY)
+    allowed = await asyncio.gather(*[can_run_cached(command, ctx, semaphore) for command in commandList])
+    return [command for command, is_allowed in zip(commandList, allowed) if is_allowed]
+
+async def filter_commands(walkable: commands.Cog, ctx: commands.Context) -> list:
+    return await check_commands(await collect_commands(walkable), ctx)
+
+
+# Precomputed help strings for a single command
+class HelpEntry():
+    def __init__(self, command, signature: str, group_signature: str, cog: str = None):
+        self.command = command
+        self.cog = cog
+        self.signature = signature
         
-    return await sort_commands(filtered)
+        desc = "\n" + (command.description or command.short_doc)
+        subcommand = "\nHas subcommands" if hasattr(command, "all_commands") else ""
+        name = f"{command.parent.name} {command.name}" if command.parent else command.name
+        
+        self.detailed = f"\u200b\n• **__{name}__**\n```\n{signature}\n```{desc}"        # entry when showing a command
+        self.brief = f"\u200b\n• **__{name}__**{desc}{subcommand}"                       # entry when showing a cog
+        self.header = f"\u200b\n• **__{command.name}__**\n```\n{group_signature}\n```{desc}"   # entry heading a group
+        self.invoke = f"`{command.name}` "                                                # entry when listing all cogs
+
+
+# set of 3 character slices of a name, padded so short names and name starts still match
+def trigrams(text: str) -> set[str]:
+    text = f"  {text.lower()} "
+    return {text[i: i + 3] for i in range(len(text) - 2)}
+
+# the text and every version of it with one character removed. two names share one of these when they are
+# within one edit of each other, and often within two
+def deletions(text: str) -> set[str]:
+    return {text} | {text[:i] + text[i + 1:] for i in range(len(text))}
+
+# length of the longest common prefix, comparing slices so the work is done in C
+def common_prefix(first: str, second: str) -> int:
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+# edit distance of two names sharing a deletion, which is never more than 2
+# swapped neighbouring characters count as one edit, catches typos trigrams miss ("pnig")
+def typo_distance(first: str, second: str) -> int:
+    if first == second:
+        return 0
+    if len(first) > len(second):
+        first, second = second, first
+    prefix = common_prefix(first, second)
+    suffix = common_prefix(first[prefix:][::-1], second[prefix:][::-1])
+    if len(first) + 1 == len(second) and prefix + suffix >= len(first):
+        return 1
+    if len(first) == len(second):
+        middle = len(first) - prefix - suffix
+        if middle == 1 or (middle == 2 and first[prefix] == second[prefix + 1] and first[prefix + 1] == second[prefix]):
+            return 1
+    return 2
+
+
+# Help strings for every loaded command, built once when cogs change instead of on every help call
+# Requests only run the permission checks over the stored entries
+# Also indexes every command name, alias, qualified name and cog name for exact and fuzzy lookups
+# Suggestions only score the few names the trigram and deletion indexes hand out, never every name
+class HelpIndex():
+    def __init__(self):
+        self.entries: dict[int, HelpEntry] = {}     # id(command) -> entry
+        self.cogs: dict[str, list[HelpEntry]] = {}  # cog name -> entries of its commands, sorted by name
+        self.names: dict[str, object] = {}          # lowercase name -> command or cog it refers to
+        self.grams: dict[str, set[str]] = {}        # trigram -> visible names containing it
+        self.name_grams: dict[str, set[str]] = {}   # visible name -> its trigrams
+        self.deletes: dict[str, set[str]] = {}      # visible name with at most one character removed -> names
+        
+    # walk all loaded cogs again. call whenever an extension is loaded, unloaded or reloaded
+    async def rebuild(self, client: commands.Bot) -> None:
+        self.entries = {}
+        self.cogs = {}
+        for name, cog in client.cogs.items():
+            self.cogs[name] = [await self.get(command, name) for command in await collect_commands(cog)]
+            
+        # earlier sources win for the same name: app commands, then prefix commands, then cogs
+        self.names = {}
+        self.grams = {}
+        self.name_grams = {}
+        self.deletes = {}
+        for command in client.tree.walk_commands():
+            self.add_name(command.qualified_name, command)
+        for command in client.walk_commands():
+            hidden = getattr(command, "hidden", False)
+            self.add_name(command.qualified_name, command, hidden)
+            parent = f"{command.parent.qualified_name} " if command.parent else ""
+            for alias in command.aliases:
+                self.add_name(parent + alias, command, hidden)
+        for name, cog in client.cogs.items():
+            self.add_name(name, cog)
+            
+    # hidden names can still be looked up exactly, but are never suggested
+    def add_name(self, name: str, target, hidden: bool = False) -> None:
+        name = name.lower()
+        self.names.setdefault(name, target)
+        if hidden or name in self.name_grams:
+            return
+        grams = self.name_grams[name] = trigrams(name)
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(name)
+        for deleted in deletions(name):
+            self.deletes.setdefault(deleted, set()).add(name)
+            
+    # command or cog with exactly this name, alias or qualified name. None if not found
+    def lookup(self, name: str):
+        return self.names.get(" ".join(name.lower().split()))
     
+    # closest visible names to a query, best match first
+    # scored by edit distance for names one or two typos away, or by share of trigrams in common
+    def suggest(self, query: str, limit: int = 3, cutoff: float = 0.45) -> list[str]:
+        query = " ".join(query.lower().split())
+        scores = {}
+        
+        # names sharing a deleted variant with the query
+        typos = set()
+        for deleted in deletions(query):
+            typos.update(self.deletes.get(deleted, ()))
+        for name in typos:
+            scores[name] = 1 - typo_distance(query, name) / max(len(query), len(name))
+            
+        # a name sharing at least threshold of the query's trigrams contains one of its rarest ones. lists are read
+        # rarest first and the threshold rises to the worst score still in the top results, so long lists of
+        # common trigrams are mostly never read
+        grams = trigrams(query)
+        rarest = sorted(grams, key=lambda gram: len(self.grams.get(gram, ())))
+        seen, read = set(), 0
+        while read < len(rarest):
+            top = heapq.nlargest(limit, scores.values())
+            threshold = max(cutoff, top[-1]) if len(top) == limit else cutoff
+            if read > len(grams) - math.ceil(threshold * len(grams) - 1e-9):
+                break
+            for name in self.grams.get(rarest[read], ()):
+                if name not in seen:
+                    seen.add(name)
+                    count = len(grams & self.name_grams[name])
+                    scores[name] = max(scores.get(name, 0), count / (len(grams) + len(self.name_grams[name]) - count))
+            read += 1
+                
+        ranked = sorted((item for item in scores.items() if item[1] >= cutoff), key=lambda item: (-item[1], item[0]))
+        return [name for name, _ in ranked[:limit]]
+            
+    # entry for a command, created and stored the first time a command outside the index is asked for
+    async def get(self, command, cog: str = None) -> HelpEntry:
+        if id(command) not in self.entries or self.entries[id(command)].command is not command:
+            if isinstance(command, commands.Command):
+                signature = await get_command_signature(command, None)
+            else:
+                signature = await get_app_command_signature(command, None)
+            group_signature = await get_command_group_signature(command, None)
+            self.entries[id(command)] = HelpEntry(command, signature, group_signature, cog)
+        return self.entries[id(command)]
+    
+    # entries the invoking user is allowed to see
+    async def filter(self, entries: list[HelpEntry], ctx: commands.Context) -> list[HelpEntry]:
+        allowed = await check_commands([entry.command for entry in entries], ctx)
+        return [await self.get(command) for command in allowed]
     
-async def setup_help_page(client: commands.Bot, ctx: commands.Context, entity: str = None, title: str = None, commands_per_page: int = 15, is_error=False, error: str = "") -> None:
+    
+async def setup_help_page(client: commands.Bot, ctx: commands.Context, entity: str = None, title: str = None, is_error=False, error: str = "") -> None:
     entity = entity or client
     if is_error:
         error = "\n".join(error[:3])
@@ -73,57 +288,41 @@ async def setup_help_page(client: commands.Bot, ctx: commands.Context, entity: s
     else:
         title = title or client.description
         
+    index = client.help_index
     entries = []
     
     if isinstance(entity, (commands.Command, discord.app_commands.Command)):
         # get all subcommands if the command has subcommands, otherwise empty list
         filtered_commands = list(set(entity.all_commands.values())) if hasattr(entity, "all_commands") else []
         filtered_commands.insert(0, entity) # add parent command to start of list
-    elif isinstance(entity, (commands.Cog, commands.HybridGroup, commands.Group, discord.app_commands.commands.Group)):
-        filtered_commands = await filter_commands(entity, ctx)
+        filtered_entries = [await index.get(command) for command in filtered_commands]
+    elif isinstance(entity, commands.Cog):
+        filtered_entries = await index.filter(index.cogs.get(entity.qualified_name, []), ctx)
+    elif isinstance(entity, (commands.HybridGroup, commands.Group, discord.app_commands.commands.Group)):
+        filtered_entries = await index.filter([await index.get(command) for command in await collect_commands(entity)], ctx)
     else:
-        filtered_commands = {}
-        for cog in entity.cogs:
-            filtered_commands[cog] = await filter_commands(entity.get_cog(cog), ctx)
+        # one check pass over every cog's commands, so CHECK_CONCURRENCY applies to the whole page
+        every_entry = [entry for cog_entries in index.cogs.values() for entry in cog_entries]
+        allowed = {id(entry.command) for entry in await index.filter(every_entry, ctx)}
+        filtered_entries = {}
+        for cog, cog_entries in index.cogs.items():
+            filtered_entries[cog] = [entry for entry in cog_entries if id(entry.command) in allowed]
         
     if isinstance(entity, (commands.Cog, commands.Command, discord.app_commands.Command, commands.HybridGroup, commands.Group, discord.app_commands.commands.Group)):
-        if isinstance(entity, (commands.HybridGroup, commands.Group, commands.hybrid.HybridAppCommand)) or type(filtered_commands[0]) == commands.hybrid.HybridAppCommand:
-            desc = entity.description or entity.short_doc
-            desc = "\n" + desc
-            signature = await get_command_group_signature(entity, ctx)
-            commands_entry = (f"• **__{entity.name}__**\n```\n{signature}\n```{desc}")
-            entries.append("\u200b\n" + commands_entry)
-            
-        for command in filtered_commands:
-            desc = command.description or command.short_doc
-            desc = "\n" + desc
-            if isinstance(command, (commands.Command)):
-                signature = await get_command_signature(command, ctx)
-            else:
-                signature = await get_app_command_signature(command, ctx)
-            subcommand = "\nHas subcommands" if hasattr(command, "all_commands") else ""
-            
-            if not command.parent:
-                commands_entry = (
-                    f"• **__{command.name}__**\n```\n{signature}\n```{desc}"
-                    if isinstance(entity, (commands.Command, commands.HybridCommand, discord.app_commands.Command, commands.HybridCommand, commands.HybridGroup, commands.Group, discord.app_commands.commands.Group))
-                    else f"• **__{command.name}__**{desc}{subcommand}"
-                    )
-            else:
-                commands_entry = (
-                    f"• **__{command.parent.name} {command.name}__**\n```\n{signature}\n```{desc}"
-                    if isinstance(entity, (commands.Command, commands.HybridCommand, discord.app_commands.Command, commands.HybridCommand, commands.HybridGroup, commands.Group, discord.app_commands.commands.Group))
-                    else f"• **__{command.parent.name} {command.name}__**{desc}{subcommand}"
-                    )
+        if isinstance(entity, (commands.HybridGroup, commands.Group, commands.hybrid.HybridAppCommand)) or (filtered_entries and type(filtered_entries[0].command) == commands.hybrid.HybridAppCommand):
+            entries.append((await index.get(entity)).header)
             
-            entries.append("\u200b\n" + commands_entry)
+        # commands are shown with their signature, except when listing a cog
+        detailed = isinstance(entity, (commands.Command, commands.HybridCommand, discord.app_commands.Command, commands.HybridGroup, commands.Group, discord.app_commands.commands.Group))
+        for entry in filtered_entries:
+            entries.append(entry.detailed if detailed else entry.brief)
         
     else:
-        for cog, commands_page in filtered_commands.items():
+        for cog, commands_page in filtered_entries.items():
             if not commands_page:
                 continue
-            entries.append(f"\u200b\n**{cog}**:\n{''.join([f'`{command.name}` ' for command in commands_page])}")
-            entries.sort()
+            entries.append(f"\u200b\n**{cog}**:\n{''.join([entry.invoke for entry in commands_page])}")
+        entries.sort()
             
     try:
         avatar = client.user.avatar.url
@@ -134,30 +333,26 @@ async def setup_help_page(client: commands.Bot, ctx: commands.Context, entity: s
         ctx=ctx,
         entries=entries,
         title=title,
-        colour=jsonhandler.fetch_data("orange", "colours"),
-        length=commands_per_page,
+        colour=await jsonhandler.fetch_data_async("orange", "colours"),
         timeout=30,
         message=error,
-        thumbnail=avatar
+        thumbnail=avatar,
+        pack=True,
+        coalesce=0.3        # clicks within 0.3 seconds are sent as one edit
     ).start()
 
 async def initiate_helpcmd(client: commands.Bot, ctx: commands.Context, entity: str, is_error=False, error: str = None) -> None:
     if not entity:
-        await setup_help_page(client, ctx, is_error=is_error, error=error, commands_per_page=10)
+        await setup_help_page(client, ctx, is_error=is_error, error=error)
     else:
-        command = client.tree.get_command(entity)
-        if not command:
-            command = client.get_command(entity)
-        if not command:
-            entitylist = entity.split()
-            command = client.tree.get_command(entitylist[0])
-            if command:
-                command = command.get_command(entitylist[1])
-        if command:
-            await setup_help_page(client, ctx, command, command.name, is_error=is_error, error=error, commands_per_page=10)
+        found = client.help_index.lookup(entity)
+        if isinstance(found, commands.Cog):
+            await setup_help_page(client, ctx, found, f"{found.qualified_name} commands", is_error=is_error, error=error)
+        elif found:
+            await setup_help_page(client, ctx, found, found.name, is_error=is_error, error=error)
         else:
-            cog = client.get_cog(entity)
-            if cog:
-                await setup_help_page(client, ctx, cog, f"{cog.qualified_name} commands", is_error=is_error, error=error, commands_per_page=10)
+            suggestions = client.help_index.suggest(entity)
+            if suggestions:
+                await ctx.reply(f"Entity Not Found. Did you mean: {', '.join(f'`{name}`' for name in suggestions)}?")
             else:
                 await ctx.reply("Entity Not Found")
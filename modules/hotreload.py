@@ -0,0 +1,285 @@
+import ast
+import asyncio
+import ctypes
+import ctypes.util
+import importlib
+import os
+import struct
+import sys
+
+from discord.ext import commands
+
+
+# modules that are never reloaded, restart to pick up changes to them:
+# - modules holding process wide state: open storage, the stdout proxy, the watcher itself. the paginator module
+#   is reloaded, it carries its registry over to the new version itself
+# - modules bot.py imports names from. bot.py and the objects it built at start keep using the old classes and
+#   functions, so a reload would only change the cogs using them and leave the bot half old, half new
+KEEP = {
+    "modules.jsonhandler", "modules.storage", "modules.capture", "modules.hotreload",
+    "modules.cluster", "modules.commandsync", "modules.diagnostics", "modules.lazyload", "modules.loader",
+    "modules.metrics", "modules.watchdog",
+}
+
+# inotify flags, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_NONBLOCK = 0x800
+IN_CLOEXEC = 0x80000
+EVENT = struct.Struct("iIII")       # wd, mask, cookie, length of the name that follows
+
+
+# Watches directories through inotify (linux). Calls callback with the path of every file written or moved in
+class InotifyWatcher():
+    def __init__(self, directories: list[str], callback):
+        self.directories = directories
+        self.callback = callback
+        self.fd = None
+        self.watches: dict[int, str] = {}       # watch descriptor -> directory
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux") and ctypes.util.find_library("c") is not None
+
+    def start(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for directory in self.directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.watches[wd] = directory
+        asyncio.get_running_loop().add_reader(self.fd, self.read)
+
+    def read(self) -> None:
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size: offset + EVENT.size + length].rstrip(b"\0")
+            offset += EVENT.size + length
+            if name and wd in self.watches:
+                self.callback(os.path.join(self.watches[wd], os.fsdecode(name)))
+
+    def stop(self) -> None:
+        if self.fd is not None:
+            asyncio.get_running_loop().remove_reader(self.fd)
+            os.close(self.fd)
+            self.fd = None
+
+
+# Fallback watcher comparing modification times of python files every interval seconds
+class PollWatcher():
+    def __init__(self, directories: list[str], callback, interval: float = 1):
+        self.directories = directories
+        self.callback = callback
+        self.interval = interval
+        self.mtimes = {}
+        self.task = None
+
+    def scan(self) -> dict[str, float]:
+        mtimes = {}
+        for directory in self.directories:
+            for filename in os.listdir(directory):
+                if filename.endswith(".py"):
+                    path = os.path.join(directory, filename)
+                    try:
+                        mtimes[path] = os.stat(path).st_mtime_ns
+                    except FileNotFoundError:
+                        pass
+        return mtimes
+
+    def start(self) -> None:
+        self.mtimes = self.scan()
+        self.task = asyncio.create_task(self.poll())
+
+    async def poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            mtimes = self.scan()
+            for path, mtime in mtimes.items():
+                if self.mtimes.get(path) != mtime:
+                    self.callback(path)
+            self.mtimes = mtimes
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+# project modules each python file in directories imports, read from the source. module name -> imported names
+def import_graph(directories: list[str]) -> dict[str, set[str]]:
+    paths = {}
+    for directory in directories:
+        for filename in os.listdir(directory):
+            if filename.endswith(".py"):
+                paths[f"{directory.replace(os.sep, '.')}.{filename[:-3]}"] = os.path.join(directory, filename)
+
+    graph = {}
+    for name, path in paths.items():
+        try:
+            with open(path, "r") as file:
+                tree = ast.parse(file.read(), filename=path)
+        except (SyntaxError, FileNotFoundError):
+            graph[name] = set()
+            continue
+        package = name.rsplit(".", 1)[0]
+        imported = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imported.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                base = package if node.level else node.module
+                if node.level and node.module:
+                    base = f"{package}.{node.module}"
+                imported.add(base)
+                # from modules import paginator imports the module, not a name
+                imported.update(f"{base}.{alias.name}" for alias in node.names)
+        graph[name] = imported & paths.keys()
+    return graph
+
+
+# changed modules and every module importing them, directly or through other modules
+def dependants(changed: set[str], graph: dict[str, set[str]]) -> set[str]:
+    affected = set(changed)
+    while True:
+        more = {name for name, imported in graph.items() if imported & affected} - affected
+        if not more:
+            return affected
+        affected |= more
+
+
+# modules ordered so every module comes after the modules it imports
+def import_order(names: set[str], graph: dict[str, set[str]]) -> list[str]:
+    ordered, seen = [], set()
+
+    def visit(name: str) -> None:
+        if name in seen:
+            return
+        seen.add(name)
+        for imported in sorted(graph.get(name, ())):
+            if imported in names:
+                visit(imported)
+        ordered.append(name)
+
+    for name in sorted(names):
+        visit(name)
+    return ordered
+
+
+# Reloads cogs and the modules they import when their files change. A burst of saves within quiet seconds is
+# reloaded once. Saves made while a reload runs never interrupt it, they are reloaded right after. Changed modules are reloaded first, then every loaded extension importing them, in dependency order
+# A module that fails to reload is restored, along with every module reloaded before it, and no extension is touched
+# An extension that fails to reload keeps its previous version and extensions depending on it are skipped
+class HotReloader():
+    def __init__(self, client: commands.Bot, directories: tuple[str] = ("cogs", "modules"), quiet: float = 0.5):
+        self.client = client
+        self.directories = list(directories)
+        self.quiet = quiet
+        self.pending: set[str] = set()      # paths changed since the last reload
+        self.timer = None                   # task waiting for saves to stop before reloading, None once it reloads
+        self.lock = asyncio.Lock()
+        self.watcher = None
+
+    def start(self) -> None:
+        if InotifyWatcher.available():
+            self.watcher = InotifyWatcher(self.directories, self.changed)
+        else:
+            self.watcher = PollWatcher(self.directories, self.changed)
+        self.watcher.start()
+        print(f"Watching {', '.join(self.directories)} for changes ({type(self.watcher).__name__})")
+
+    def stop(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.timer is not None:
+            self.timer.cancel()
+
+    def changed(self, path: str) -> None:
+        if not path.endswith(".py"):
+            return
+        self.pending.add(os.path.normpath(path))
+        # only a timer still waiting is restarted. cancelling one that is reloading would leave modules half reloaded
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = asyncio.create_task(self.settle())
+
+    async def settle(self) -> None:
+        await asyncio.sleep(self.quiet)
+        self.timer = None
+        # paths are taken once the previous reload is done, so changes saved during it are reloaded now
+        async with self.lock:
+            paths, self.pending = self.pending, set()
+            if paths:
+                for line in await self.reload(paths):
+                    print(line)
+
+    # reload everything affected by changes to paths. returns a line per module and extension
+    async def reload(self, paths: set[str]) -> list[str]:
+        for path in paths:
+            try:
+                with open(path, "r") as file:
+                    compile(file.read(), path, "exec")
+            except FileNotFoundError:
+                continue
+            except SyntaxError as error:
+                return [f"Not reloading, syntax error in {path} line {error.lineno}: {error.msg}"]
+
+        graph = import_graph(self.directories)
+        changed = {os.path.splitext(path)[0].replace(os.sep, ".") for path in paths} & graph.keys()
+        output = [f"Not reloading {name}, restart to pick up changes to it" for name in sorted(changed & KEEP)]
+        affected = dependants(changed - KEEP, graph)
+        extensions = {name for name in affected if name in self.client.extensions}
+        modules = [name for name in import_order(affected - extensions, graph) if name in sys.modules and name not in KEEP]
+        if not extensions and not modules:
+            return output
+
+        # reload modules in place, keeping a copy of each so a failure can put the previous version back
+        saved = {}
+        for name in modules:
+            module = sys.modules[name]
+            saved[name] = dict(module.__dict__)
+            try:
+                importlib.reload(module)
+            except Exception as error:
+                for restored, namespace in saved.items():
+                    sys.modules[restored].__dict__.clear()
+                    sys.modules[restored].__dict__.update(namespace)
+                return output + [f"Failed to reload {name}, kept previous versions: {error!r}"]
+            output.append(f"Reloaded module {name}")
+
+        # extensions in dependency order, skipping dependants of one that failed
+        loader = self.client.extension_loader
+        names = {name.rsplit(".", 1)[-1]: name for name in extensions}
+        levels, _ = loader.levels([name for name in names if loader.exists(name)])
+        failed = set()
+        for level in levels:
+            for name in level:
+                if failed.intersection(loader.available[name]):
+                    failed.add(name)
+                    output.append(f"Skipped reloading {name} cog: a dependency failed to reload")
+                    continue
+                try:
+                    await self.client.reload_extension(names[name])
+                except commands.ExtensionError as error:
+                    failed.add(name)
+                    output.append(f"Failed to reload {name} cog, kept previous version: {error}")
+                else:
+                    output.append(f"Reloaded {name} cog")
+
+        # the help index is the one long lived object built from a reloadable module
+        if "modules.helpcmd" in modules:
+            self.client.help_index = sys.modules["modules.helpcmd"].HelpIndex()
+        await self.client.help_index.rebuild(self.client)
+        try:
+            await self.client.sync_commands()
+        except Exception as error:
+            output.append(f"Reloaded, but syncing app commands failed: {error!r}")
+        return output
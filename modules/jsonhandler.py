@@ -1,4 +1,39 @@
-import json
+import asyncio
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.storage import StorageEngine, create_engine
+
+
+_engine: StorageEngine | None = None     # created on first use so .env is loaded before the engine is picked
+_engine_lock = threading.Lock()
+
+# bounded pool used by the async api so file work never runs on the event loop
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="jsonhandler")
+# per-file asyncio locks, serialising read-modify-write calls from coroutines
+_async_locks: dict[str, asyncio.Lock] = {}
+
+
+# return the storage engine all functions below work on. chosen by STORAGE_ENGINE in .env (json or sqlite)
+def get_engine() -> StorageEngine:
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine()
+            atexit.register(_engine.close)
+        return _engine
+
+
+# replace the storage engine, pending changes of the previous engine are written first
+def set_engine(engine: StorageEngine) -> None:
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            atexit.unregister(_engine.close)
+            _engine.close()
+        _engine = engine
+        atexit.register(_engine.close)
 
 
 def validate_name(filename: str) -> str:
@@ -8,28 +43,62 @@ def validate_name(filename: str) -> str:
         return filename + ".json"
 
 
+# filenames are kept as the public naming, engines work with the name without .json
+def namespace(filename: str) -> str:
+    return validate_name(filename)[:-5]
+
+
+# write all pending changes to disk now
+def flush() -> None:
+    get_engine().flush()
+
+
 # loads and returns a json file as a python dict
 def read_file(filename: str) -> dict:
-    filename = validate_name(filename)
-    with open(f"data/{filename}", "r") as file:
-        return json.load(file)
-    
-    
+    return get_engine().read(namespace(filename))
+
+
 # completely overwrite all content in a json file
 def overwrite_file(data: dict, filename: str) -> None:
-    filename = validate_name(filename)
-    with open(f"data/{filename}", "w") as file:
-        json.dump(data, file, indent=4)
+    get_engine().overwrite(namespace(filename), data)
 
 
 # fetch the value of a given key from a file, return None if key not found
 def fetch_data(key: str, filename: str) -> str | None:
-    return read_file(filename).get(key, None)
-        
+    return get_engine().get(namespace(filename), key)
+
 
 # writes a new key into a json file or replaces existing key
-# get content of file as a dict, merge both dicts and then write into file
 def append_data(data: dict, filename: str) -> None:
-    file = read_file(filename)
-    newdata = file | data
-    overwrite_file(newdata, filename)
+    get_engine().upsert(namespace(filename), data)
+
+
+# ---------- async api. same behaviour as above, file work is done on the executor ----------
+
+def _async_lock(filename: str) -> asyncio.Lock:
+    filename = validate_name(filename)
+    if filename not in _async_locks:
+        _async_locks[filename] = asyncio.Lock()
+    return _async_locks[filename]
+
+
+async def _run(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, function, *args)
+
+
+async def read_file_async(filename: str) -> dict:
+    return await _run(read_file, filename)
+
+
+async def overwrite_file_async(data: dict, filename: str) -> None:
+    async with _async_lock(filename):
+        await _run(overwrite_file, data, filename)
+
+
+async def fetch_data_async(key: str, filename: str) -> str | None:
+    return await _run(fetch_data, key, filename)
+
+
+async def append_data_async(data: dict, filename: str) -> None:
+    async with _async_lock(filename):
+        await _run(append_data, data, filename)
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import discord
+from discord.ext import commands
+
+
+MANIFEST = "cogs/manifest.json"
+
+# checks without arguments that can be rebuilt on a stub command from their name alone
+KNOWN_CHECKS = {
+    "is_owner": commands.is_owner,
+    "guild_only": commands.guild_only,
+    "dm_only": commands.dm_only,
+    "is_nsfw": commands.is_nsfw,
+}
+
+
+def source_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def check_name(check) -> str:
+    return getattr(check, "__qualname__", "").split(".")[0]
+
+
+# describe a loaded cog for the manifest. returns (entry, reason it cannot be loaded lazily or None)
+def describe_cog(cog: commands.Cog) -> tuple[dict, str | None]:
+    entry = {"cog": cog.qualified_name, "description": cog.description, "commands": []}
+    reason = None
+
+    if cog.get_app_commands():
+        reason = "has app commands"
+    elif cog.get_listeners():
+        reason = "has event listeners"
+    elif any(getattr(type(cog), method) is not getattr(commands.Cog, method) for method in ("cog_check", "bot_check", "bot_check_once")):
+        reason = "has cog level checks"
+
+    for command in cog.walk_commands():
+        checks = [check_name(check) for check in command.checks]
+        if isinstance(command, (commands.HybridCommand, commands.HybridGroup)):
+            reason = reason or f"{command.qualified_name} is a hybrid command"
+        unknown = [name for name in checks if name not in KNOWN_CHECKS]
+        if unknown:
+            reason = reason or f"{command.qualified_name} has checks that cannot be rebuilt: {', '.join(unknown)}"
+        entry["commands"].append({
+            "name": command.name,
+            "parent": command.parent.qualified_name if command.parent else None,
+            "aliases": list(command.aliases),
+            "help": command.help,
+            "brief": command.brief,
+            "description": command.description,
+            "usage": command.signature,
+            "hidden": command.hidden,
+            "group": isinstance(command, commands.Group),
+            "checks": checks,
+        })
+    return entry, reason
+
+
+# import every cog once on a bot that never connects, and write down what each one registers
+# run with `python -m modules.lazyload` after changing cogs. stale entries are detected by hash and loaded eagerly
+async def build_manifest(directory: str = "cogs", path: str = MANIFEST) -> dict:
+    client = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+    manifest = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".py"):
+            continue
+        name = filename[:-3]
+        extension = f"{directory.replace(os.sep, '.')}.{name}"
+        before = set(client.cogs)
+        try:
+            await client.load_extension(extension)
+        except commands.ExtensionError as error:
+            print(f"Could not describe {name}: {error}")
+            continue
+
+        added = [client.get_cog(cog) for cog in set(client.cogs) - before]
+        if len(added) != 1:
+            manifest[name] = {"lazy": False, "reason": f"registers {len(added)} cogs"}
+        else:
+            entry, reason = describe_cog(added[0])
+            manifest[name] = entry | {"lazy": reason is None, "reason": reason}
+        manifest[name]["hash"] = source_hash(os.path.join(directory, filename))
+        await client.unload_extension(extension)
+        print(f"{name}: {'lazy' if manifest[name]['lazy'] else 'eager, ' + manifest[name]['reason']}")
+
+    with open(path, "w") as file:
+        json.dump(manifest, file, indent=4)
+    return manifest
+
+
+# Registers lightweight stand-in cogs from the manifest. The stand-in has the same name and commands (with the same
+# signatures, descriptions and simple checks) so help stays correct. The first time one of its commands is used,
+# the stand-in is removed, the real cog is loaded and the message is processed again
+class LazyCogs():
+    def __init__(self, client: commands.Bot, directory: str = "cogs", path: str = MANIFEST):
+        self.client = client
+        self.directory = directory
+        self.path = path
+        self.manifest: dict | None = None
+        self.stubs: dict[str, commands.Cog] = {}       # extension name -> stand-in cog
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    def load_manifest(self) -> dict:
+        if self.manifest is None:
+            try:
+                with open(self.path, "r") as file:
+                    self.manifest = json.load(file)
+            except FileNotFoundError:
+                print(f"No cog manifest at {self.path}, run python -m modules.lazyload to create one")
+                self.manifest = {}
+        return self.manifest
+
+    # register stand-in commands for a cog. False if the cog has to be loaded eagerly
+    async def register(self, name: str) -> bool:
+        entry = self.load_manifest().get(name)
+        if not entry or not entry["lazy"]:
+            return False
+        if entry["hash"] != source_hash(os.path.join(self.directory, f"{name}.py")):
+            print(f"Manifest entry for {name} is out of date, loading eagerly")
+            return False
+
+        cog = self.stub_cog(name, entry)
+        await self.client.add_cog(cog)
+        self.stubs[f"{self.directory.replace(os.sep, '.')}.{name}"] = cog
+        return True
+
+    # build a cog class on the fly holding one stub per command in the manifest
+    def stub_cog(self, name: str, entry: dict) -> commands.Cog:
+        lazy = self
+        attributes = {}
+        groups = {}
+        for index, info in enumerate(entry["commands"]):
+            async def callback(self, ctx: commands.Context, *, arguments: str = None) -> None:
+                await lazy.materialize(name, ctx)
+            # named after its command so tracebacks and introspection do not all show "callback"
+            callback.__name__ = info["name"]
+            callback.__qualname__ = f"Lazy{entry['cog']}.{info['name']}"
+
+            kwargs = {key: info[key] for key in ("name", "aliases", "help", "brief", "description", "usage", "hidden")}
+            if info["group"]:
+                command = commands.group(invoke_without_command=True, **kwargs)(callback)
+            else:
+                command = commands.command(**kwargs)(callback)
+            for check in info["checks"]:
+                command = KNOWN_CHECKS[check]()(command)
+
+            parent = groups.get(info["parent"])
+            if parent:
+                parent.add_command(command)
+            if info["group"]:
+                groups[f"{info['parent']} {info['name']}" if info["parent"] else info["name"]] = command
+            attributes[f"stub_{index}"] = command
+
+        cls = commands.CogMeta(f"Lazy{entry['cog']}", (commands.Cog,), attributes, name=entry["cog"], description=entry["description"] or "")
+        return cls()
+
+    # remove the stand-in of an extension, if any. called before the real extension is loaded
+    async def release(self, extension: str) -> None:
+        cog = self.stubs.pop(extension, None)
+        if cog is not None:
+            await self.client.remove_cog(cog.qualified_name)
+
+    # load the real cog in place of its stand-in, then run the message again against the real commands
+    async def materialize(self, name: str, ctx: commands.Context) -> None:
+        extension = f"{self.directory.replace(os.sep, '.')}.{name}"
+        lock = self.locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if extension not in self.client.extensions:
+                try:
+                    await self.client.load_extension(extension)
+                except commands.ExtensionError as error:
+                    # put the stand-in back so the cog can be retried
+                    await self.register(name)
+                    await ctx.reply(f"Error inside Cog \"{name.title()}\". This cog needs to be fixed before it can be used")
+                    raise error
+                print(f"Lazily loaded {name} cog")
+                await self.client.help_index.rebuild(self.client)
+        await self.client.process_commands(ctx.message)
+
+
+if __name__ == "__main__":
+    asyncio.run(build_manifest())
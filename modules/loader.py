@@ -0,0 +1,138 @@
+import ast
+import asyncio
+import os
+import time
+
+from discord.ext import commands
+
+
+# Discovers cogs once and loads them in dependency order. Cogs whose dependencies are loaded are set up concurrently
+# A cog declares dependencies with a module level list of cog names, e.g. DEPENDENCIES = ["heart"]
+# The list is read from the source without importing the cog, so it must be a plain literal
+# With lazy set, cogs described in the lazy load manifest only get stand-in commands until first used
+class ExtensionLoader():
+    def __init__(self, client: commands.Bot, directory: str = "cogs", lazy: bool = False):
+        self.client = client
+        self.directory = directory
+        self.lazy = lazy
+        self.package = directory.replace(os.sep, ".")
+        self.available: dict[str, list[str]] = {}      # cog name -> names of cogs it depends on
+        self.unreadable: dict[str, str] = {}            # cog name -> why its dependencies could not be read
+        self.timings: dict[str, float] = {}             # cog name -> seconds to import and set up
+        self.elapsed = 0                                # wall time of the last load_all
+
+    # scan the cogs directory. only needed again if files are added or removed while running
+    # a cog with a syntax error is still loaded, so loading it reports the error. one whose DEPENDENCIES is not a
+    # plain list is skipped, loading it could not respect its dependencies
+    def discover(self) -> dict[str, list[str]]:
+        self.available = {}
+        self.unreadable = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith(".py"):
+                name = filename[:-3] # remove .py from ending
+                try:
+                    self.available[name] = self.read_dependencies(os.path.join(self.directory, filename))
+                except SyntaxError:
+                    self.available[name] = []
+                except (ValueError, TypeError) as error:
+                    self.available[name] = []
+                    self.unreadable[name] = f"DEPENDENCIES must be a plain list of cog names ({error})"
+        return self.available
+
+    @staticmethod
+    def read_dependencies(path: str) -> list[str]:
+        with open(path, "r") as file:
+            tree = ast.parse(file.read(), filename=path)
+        for node in tree.body:
+            # DEPENDENCIES = [...] or DEPENDENCIES: list[str] = [...]
+            if isinstance(node, ast.Assign):
+                targets = node.targets
+            elif isinstance(node, ast.AnnAssign) and node.value is not None:
+                targets = [node.target]
+            else:
+                continue
+            if any(isinstance(target, ast.Name) and target.id == "DEPENDENCIES" for target in targets):
+                return list(ast.literal_eval(node.value))
+        return []
+
+    def exists(self, name: str) -> bool:
+        return name in self.available
+
+    def extension(self, name: str) -> str:
+        return f"{self.package}.{name}"
+
+    # group cogs into levels. every cog only depends on cogs in earlier levels
+    def levels(self, names: list[str]) -> tuple[list[list[str]], dict[str, str]]:
+        skipped = {name: self.unreadable[name] for name in names if name in self.unreadable}
+        remaining = {name: list(self.available[name]) for name in names if name not in skipped}
+        levels = []
+        done = set()
+        while remaining:
+            for name, dependencies in list(remaining.items()):
+                missing = [dependency for dependency in dependencies if dependency not in self.available]
+                if missing:
+                    skipped[name] = f"missing dependency {', '.join(missing)}"
+                    del remaining[name]
+            level = sorted(name for name, dependencies in remaining.items() if all(dependency in done for dependency in dependencies))
+            if not level:
+                # whatever is left depends on itself through a cycle, or on a cog that was skipped
+                for name in remaining:
+                    skipped[name] = "dependency cycle or skipped dependency"
+                break
+            levels.append(level)
+            done.update(level)
+            for name in level:
+                del remaining[name]
+        return levels, skipped
+
+    # record how long an extension took to import and set up. called by Bot while loading
+    def record(self, extension: str, seconds: float) -> None:
+        self.timings[extension.rsplit(".", 1)[-1]] = seconds
+
+    # load one cog, returns a line describing the outcome
+    async def load(self, name: str, lazy: bool = False) -> str:
+        if lazy and await self.client.lazy_cogs.register(name):
+            return f"Registered {name} cog lazily"
+        try:
+            await self.client.load_extension(self.extension(name))
+        except commands.ExtensionAlreadyLoaded:
+            return f"Cog already loaded: {name}"
+        except commands.ExtensionFailed as error:
+            return str(error)
+        except commands.NoEntryPointError:
+            return f"Py file is not a cog: {name}"
+        except commands.ExtensionNotFound:
+            return f"Cog not found: {name}"
+        else:
+            return f"Successfully loaded {name} cog"
+
+    # load every discovered cog, one dependency level at a time. returns a line per cog
+    async def load_all(self) -> list[str]:
+        start = time.perf_counter()
+        levels, skipped = self.levels(list(self.available))
+        output = [f"Skipped {name} cog: {reason}" for name, reason in skipped.items()]
+        failed = set(skipped)
+        # cogs other cogs depend on are always loaded for real
+        required = {dependency for dependencies in self.available.values() for dependency in dependencies}
+        for level in levels:
+            # dependants of a cog that failed to load are not attempted
+            ready = [name for name in level if not failed.intersection(self.available[name])]
+            for name in set(level) - set(ready):
+                failed.add(name)
+                output.append(f"Skipped {name} cog: a dependency failed to load")
+            results = await asyncio.gather(*[self.load(name, self.lazy and name not in required) for name in ready])
+            for name, result in zip(ready, results):
+                if self.extension(name) not in self.client.extensions and name in required:
+                    failed.add(name)
+                output.append(result)
+        self.elapsed = time.perf_counter() - start
+        return output
+
+    # table of load times (import and setup) for every cog loaded so far, slowest first
+    def report(self) -> str:
+        lines = ["Cog load times:"]
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<16} {seconds*1000:7.1f} ms")
+        total = sum(self.timings.values())
+        lines.append(f"  {'sum':<16} {total*1000:.1f} ms, loaded in {self.elapsed*1000:.1f} ms")
+        return "\n".join(lines)
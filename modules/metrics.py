@@ -0,0 +1,263 @@
+import asyncio
+import contextvars
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+from discord import app_commands
+
+from modules import paginator
+
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)     # histogram upper bounds in seconds
+STAGES = ("total", "checks", "handler", "http")
+
+# measurement of the command running in the current task, requests made by the command add their time to it
+_current: contextvars.ContextVar["Measurement | None"] = contextvars.ContextVar("measurement", default=None)
+
+
+class Histogram():
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)     # last bucket counts everything above the largest bound
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                break
+        else:
+            index = len(BUCKETS)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    # upper bound of the bucket holding the q-th quantile. inf if it is above the largest bound
+    def quantile(self, q: float) -> float:
+        target, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and seen:
+                return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+        return 0
+
+
+class CommandMetrics():
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.histograms = {stage: Histogram() for stage in STAGES}
+
+
+# Timing of one command invocation. checks end when mark_checks is called, the rest of the time is the handler
+# if checks never end, they failed and took the whole time. with checks=False everything counts as handler
+class Measurement():
+    def __init__(self, metrics: "Metrics", kind: str, name: str, checks: bool = True):
+        self.metrics = metrics
+        self.kind = kind
+        self.name = name
+        self.failed = False
+        self.http = 0
+        self.checks = None if checks else 0
+
+    def mark_checks(self) -> None:
+        if self.checks is None:
+            self.checks = time.perf_counter() - self.start
+
+    def __enter__(self) -> "Measurement":
+        self.start = time.perf_counter()
+        self.token = _current.set(self)
+        self.task = asyncio.current_task()
+        self.outer = self.metrics.running.get(self.task)       # command this one was invoked from, if any
+        self.metrics.running[self.task] = f"{self.kind} {self.name}"
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        _current.reset(self.token)
+        if self.outer is None:
+            self.metrics.running.pop(self.task, None)
+        else:
+            self.metrics.running[self.task] = self.outer
+        total = time.perf_counter() - self.start
+        checks = self.checks if self.checks is not None else total
+        self.metrics.observe(self.kind, self.name, {
+            "total": total,
+            "checks": checks,
+            "handler": total - checks,
+            "http": self.http
+        }, self.failed or exc_type is not None)
+
+
+# Counts and latency histograms per command. kind is "prefix" or "app"
+# error handlers are measured with kind "error" and kept apart, so handling an error never shows up as a command
+class Metrics():
+    def __init__(self):
+        self.commands: dict[tuple[str, str], CommandMetrics] = {}
+        self.error_types = Counter()        # error class name -> times it reached an error handler
+        self.error_handling: dict[str, Histogram] = {}      # error class name -> time its error handler took
+        self.running: dict[asyncio.Task, str] = {}      # task -> command it is running, read by the loop watchdog
+
+    def measure(self, kind: str, name: str, checks: bool = True) -> Measurement:
+        return Measurement(self, kind, name, checks)
+
+    # measurement of the command running in the current task, if any
+    @staticmethod
+    def current() -> Measurement | None:
+        return _current.get()
+
+    def observe(self, kind: str, name: str, timings: dict[str, float], failed: bool) -> None:
+        if kind == "error":
+            self.error_handling.setdefault(name, Histogram()).observe(timings["total"])
+            return
+        command = self.commands.setdefault((kind, name), CommandMetrics())
+        command.calls += 1
+        command.errors += failed
+        for stage, value in timings.items():
+            command.histograms[stage].observe(value)
+
+    def count_error(self, error: Exception) -> None:
+        self.error_types[type(error).__name__] += 1
+
+    # aiohttp trace config timing every REST request, passed to the client as http_trace
+    def trace_config(self) -> aiohttp.TraceConfig:
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            measurement = _current.get()
+            if measurement is not None:
+                measurement.http += time.perf_counter() - context.start
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_end)
+        return trace
+
+    # all metrics in prometheus text format
+    def prometheus(self) -> str:
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        lines = [
+            "# HELP bot_command_invocations_total Commands invoked",
+            "# TYPE bot_command_invocations_total counter"
+        ]
+        for (kind, name), command in sorted(self.commands.items()):
+            lines.append(f"bot_command_invocations_total{{kind=\"{kind}\",command=\"{label(name)}\"}} {command.calls}")
+
+        lines += ["# HELP bot_command_errors_total Commands that failed", "# TYPE bot_command_errors_total counter"]
+        for (kind, name), command in sorted(self.commands.items()):
+            lines.append(f"bot_command_errors_total{{kind=\"{kind}\",command=\"{label(name)}\"}} {command.errors}")
+
+        lines += [
+            "# HELP bot_command_duration_seconds Time spent per command, split into checks, handler and outbound http",
+            "# TYPE bot_command_duration_seconds histogram"
+        ]
+        for (kind, name), command in sorted(self.commands.items()):
+            for stage, histogram in command.histograms.items():
+                labels = f"kind=\"{kind}\",command=\"{label(name)}\",stage=\"{stage}\""
+                cumulative = 0
+                for bound, count in zip(list(BUCKETS) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"bot_command_duration_seconds_bucket{{{labels},le=\"{bound}\"}} {cumulative}")
+                lines.append(f"bot_command_duration_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"bot_command_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += ["# HELP bot_errors_total Errors handled by the error handlers", "# TYPE bot_errors_total counter"]
+        for error, count in sorted(self.error_types.items()):
+            lines.append(f"bot_errors_total{{type=\"{label(error)}\"}} {count}")
+
+        lines += [
+            "# HELP bot_error_handler_duration_seconds Time spent in the prefix command error handler",
+            "# TYPE bot_error_handler_duration_seconds histogram"
+        ]
+        for error, histogram in sorted(self.error_handling.items()):
+            labels = f"type=\"{label(error)}\""
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"bot_error_handler_duration_seconds_bucket{{{labels},le=\"{bound}\"}} {cumulative}")
+            lines.append(f"bot_error_handler_duration_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"bot_error_handler_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        pagers = paginator.Paginator.manager.stats()
+        lines += [
+            "# HELP bot_paginators_active Paginators with live buttons", "# TYPE bot_paginators_active gauge",
+            f"bot_paginators_active {pagers['active']}",
+            "# HELP bot_paginator_users Users with at least one live paginator", "# TYPE bot_paginator_users gauge",
+            f"bot_paginator_users {pagers['users']}",
+            "# HELP bot_paginator_evictions_total Paginators closed to stay within the limits",
+            "# TYPE bot_paginator_evictions_total counter",
+            f"bot_paginator_evictions_total {pagers['evictions']}",
+            "# HELP bot_paginator_bytes Estimated memory held by live paginators", "# TYPE bot_paginator_bytes gauge",
+            f"bot_paginator_bytes {pagers['bytes']}",
+            "# HELP bot_paginator_edits_requested_total Page changes asked for by button clicks",
+            "# TYPE bot_paginator_edits_requested_total counter",
+            f"bot_paginator_edits_requested_total {paginator.Paginator.edit_stats['requested']}",
+            "# HELP bot_paginator_edits_sent_total Message edits sent, clicks within the coalesce delay share one",
+            "# TYPE bot_paginator_edits_sent_total counter",
+            f"bot_paginator_edits_sent_total {paginator.Paginator.edit_stats['sent']}"
+        ]
+        return "\n".join(lines) + "\n"
+
+    # one line per command for the stats command, most used first
+    def summary(self) -> list[str]:
+        entries = []
+        for (kind, name), command in sorted(self.commands.items(), key=lambda item: -item[1].calls):
+            total, checks = command.histograms["total"], command.histograms["checks"]
+            handler, http = command.histograms["handler"], command.histograms["http"]
+            entries.append(
+                f"**{name}** ({kind})\n"
+                f"calls {command.calls}, errors {command.errors}\n"
+                f"p50 ≤ {total.quantile(0.5)*1000:g} ms, p95 ≤ {total.quantile(0.95)*1000:g} ms\n"
+                f"avg checks {checks.sum/checks.count*1000:.1f} ms, handler {handler.sum/handler.count*1000:.1f} ms, "
+                f"http {http.sum/http.count*1000:.1f} ms"
+            )
+        return entries
+
+
+# serve metrics on http://host:port/metrics. returns the runner so it can be cleaned up
+async def start_exporter(metrics: Metrics, host: str = "127.0.0.1", port: int = 9100) -> web.AppRunner:
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# last check of every app command. it only runs once the tree, group, cog and command checks before it passed
+def mark_checks(interaction) -> bool:
+    measurement = _current.get()
+    if measurement is not None:
+        measurement.mark_checks()
+    return True
+
+
+# Command tree timing every app command. the checks stage covers the tree's interaction_check and the group, cog
+# and command checks, it ends in mark_checks which is appended to every command added to the tree
+class InstrumentedTree(app_commands.CommandTree):
+    def add_command(self, command, /, **kwargs) -> None:
+        super().add_command(command, **kwargs)
+        for leaf in command.walk_commands() if isinstance(command, app_commands.Group) else [command]:
+            if isinstance(leaf, (app_commands.Command, app_commands.ContextMenu)) and mark_checks not in leaf.checks:
+                leaf.checks.append(mark_checks)
+
+    # CommandTree has no public hook around running a command, so this overrides the private _call of the pinned
+    # discord.py 2.3.2. check it still exists and still runs checks and the command when upgrading discord.py
+    async def _call(self, interaction) -> None:
+        command = interaction.command
+        if command is None or interaction.type.name == "autocomplete":
+            return await super()._call(interaction)
+        with self.client.metrics.measure("app", command.qualified_name) as measurement:
+            await super()._call(interaction)
+            measurement.failed = interaction.command_failed
+
+    async def on_error(self, interaction, error: app_commands.AppCommandError) -> None:
+        self.client.metrics.count_error(error)
+        await super().on_error(interaction, error)
@@ -1,18 +1,233 @@
+import asyncio
+import itertools
 import math
+import sys
+import traceback
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterable, Iterable, Sequence
 
 import discord
 from discord.ui import Button, View
 from discord.ext import commands
 
 
+# discord embed limits. descriptions are capped on their own and as part of the whole embed
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000
+FOOTER_RESERVE = len("Page 99999 of 99999")     # space kept for the page footer
+
+_END = object()     # marks the end of entries while packing
+
+
+# done callback of background edit tasks. nothing awaits them, so their errors would otherwise go unnoticed
+def report_task_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Paginator task {task.get_name()} failed:")
+        traceback.print_exception(task.exception())
+
+
+# Builds pages of entries on demand. Sequences are sliced in place, any other iterable (including generators and
+# async generators) is consumed one page at a time. Built pages are kept so going back does not rebuild them
+# With a limit set, pages are packed by size instead: each page holds as many entries as fit within the limit
+# whatever length is, and entries too large for a page are split on line boundaries
+class PageSource():
+    def __init__(
+                self,
+                entries: Iterable | AsyncIterable,
+                length: int,
+                linesep: str = "\n",
+                limit: int = None,      # max characters per page, None -> pages are split by entry count only
+                prefix: str = "",       # added around each entry when rendered, counted against the limit
+                suffix: str = ""
+                ):
+        self.length = length
+        self.linesep = linesep
+        self.limit = limit
+        self.overhead = len(prefix) + len(linesep) + len(suffix)     # characters each entry adds on top of itself
+        self.pages: dict[int, list[str]] = {}      # page number -> entries of that page, only pages already built
+        self.carry: list[str] = []                  # entries held back for the next page while packing
+
+        if isinstance(entries, Sequence) and not isinstance(entries, str) and limit is None:
+            self.entries = entries
+            self.iterator = None
+            # an empty sequence still gets one (empty) page
+            self.total_pages = max(1, math.ceil(len(entries) / length))
+        else:
+            # packed page boundaries depend on entry sizes, so sequences are walked like any other iterable
+            self.entries = None
+            self.iterator = aiter(entries) if isinstance(entries, AsyncIterable) else iter(entries)
+            self.total_pages = None                 # unknown until the iterator runs out
+        self.built = 0                              # pages pulled from the iterator so far
+        
+        if limit is not None and limit <= self.overhead:
+            raise ValueError("Limit leaves no room for entries")
+
+    # next entry for packing, held back entries first
+    async def _next(self):
+        if self.carry:
+            return self.carry.pop(0)
+        if isinstance(self.iterator, Iterable):
+            return next(self.iterator, _END)
+        return await anext(self.iterator, _END)
+    
+    # split an entry that is too large for a page into pieces that fit, breaking on lines where possible
+    def split(self, entry: str) -> list[str]:
+        room = self.limit - self.overhead
+        pieces, piece = [], ""
+        for line in entry.splitlines(keepends=True):
+            # a single line longer than a page has to be cut
+            while len(line) > room:
+                if piece:
+                    pieces.append(piece)
+                    piece = ""
+                pieces.append(line[:room])
+                line = line[room:]
+            if len(piece) + len(line) > room:
+                pieces.append(piece)
+                piece = ""
+            piece += line
+        if piece:
+            pieces.append(piece)
+        # the newline ending a piece is replaced by linesep when rendered
+        return [piece[:-1] if piece.endswith("\n") else piece for piece in pieces]
+    
+    # fill a page with entries up to limit characters
+    async def _pack(self) -> tuple[list, bool]:
+        chunk, size = [], 0
+        while True:
+            entry = await self._next()
+            if entry is _END:
+                return chunk, True
+            cost = self.overhead + len(entry)
+            if cost > self.limit:
+                self.carry[:0] = self.split(entry)
+                continue
+            if size + cost > self.limit:
+                self.carry.insert(0, entry)
+                break
+            chunk.append(entry)
+            size += cost
+        return chunk, False
+
+    # pull the next page from the iterator
+    async def _pull(self) -> None:
+        if self.limit is not None:
+            chunk, exhausted = await self._pack()
+        elif isinstance(self.iterator, Iterable):
+            chunk = list(itertools.islice(self.iterator, self.length))
+            exhausted = len(chunk) < self.length    # a short page means the iterator ran out
+        else:
+            chunk = []
+            async for entry in self.iterator:
+                chunk.append(entry)
+                if len(chunk) == self.length:
+                    break
+            exhausted = len(chunk) < self.length
+
+        # an empty iterator still gets one (empty) page
+        if chunk or self.built == 0:
+            self.built += 1
+            self.pages[self.built] = [entry + self.linesep for entry in chunk]
+
+        if exhausted or not chunk:
+            self.iterator = None
+            self.total_pages = self.built
+
+    # return the entries of a page (1-indexed), None if the page does not exist
+    async def get_page(self, number: int) -> list[str] | None:
+        if number < 1 or (self.total_pages is not None and number > self.total_pages):
+            return None
+        if number in self.pages:
+            return self.pages[number]
+
+        if self.entries is not None:
+            start = (number - 1) * self.length
+            self.pages[number] = [entry + self.linesep for entry in self.entries[start: start + self.length]]
+            return self.pages[number]
+
+        # build every page up to the requested one
+        while self.iterator is not None and self.built < number:
+            await self._pull()
+        return self.pages.get(number)
+
+    # build all remaining pages so the total is known. only needed for iterators
+    async def exhaust(self) -> int:
+        while self.iterator is not None:
+            await self._pull()
+        return self.total_pages
+
+
+# Keeps track of every live paginator. Limits how many can exist in total and per user, closing the least recently
+# used one when a limit is hit. Paginators register themselves on start and unregister when closed or timed out
+class PaginatorManager():
+    def __init__(
+                self,
+                max_total: int = 100,       # paginators allowed at once across the bot
+                max_per_user: int = 5       # paginators allowed at once for a single user
+                ):
+        self.max_total = max_total
+        self.max_per_user = max_per_user
+        self.active: OrderedDict[int, "Paginator"] = OrderedDict()     # id -> paginator, least recently used first
+        self.evictions = 0
+        
+    # add a paginator and close the least recently used ones until both limits are met
+    # paginators that must not be closed yet are skipped, limits may be exceeded while only those are left
+    async def register(self, paginator: "Paginator") -> None:
+        self.active[id(paginator)] = paginator
+        
+        owned = [other for other in self.active.values() if other.user == paginator.user]
+        excess = len(owned) - self.max_per_user
+        for other in [other for other in owned if other.evictable and other is not paginator][:max(0, excess)]:
+            await self.evict(other)
+        excess = len(self.active) - self.max_total
+        for other in [other for other in self.active.values() if other.evictable and other is not paginator][:max(0, excess)]:
+            await self.evict(other)
+            
+    def unregister(self, paginator: "Paginator") -> None:
+        self.active.pop(id(paginator), None)
+        
+    # mark a paginator as most recently used
+    def touch(self, paginator: "Paginator") -> None:
+        if id(paginator) in self.active:
+            self.active.move_to_end(id(paginator))
+            
+    async def evict(self, paginator: "Paginator") -> None:
+        self.evictions += 1
+        await paginator.close(disable=True)
+        
+    # current counts and memory held by live paginators
+    def stats(self) -> dict:
+        users = {}
+        for paginator in self.active.values():
+            users[paginator.user] = users.get(paginator.user, 0) + 1
+        return {
+            "active": len(self.active),
+            "users": len(users),
+            "max_per_user": max(users.values(), default=0),
+            "evictions": self.evictions,
+            "bytes": sum(paginator.memory_estimate() for paginator in self.active.values())
+        }
+
+
+# a hot reload runs this module again in the same namespace, so the previous Paginator class is still here.
+# its registry and counters are carried over: paginators opened before the reload stay tracked and limited.
+# the manager object itself is kept, changes to PaginatorManager apply to it after a restart
+_previous = globals().get("Paginator")
+
+
 class Paginator():
+    # edit counters summed over every paginator. edits saved = requested - sent
+    edit_stats = _previous.edit_stats if _previous else {"requested": 0, "sent": 0}
+    # registry of live paginators shared by every instance
+    manager = _previous.manager if _previous else PaginatorManager()
+    
     def __init__(
                 self, 
                 ctx: commands.Context,              # ctx object, used to collect author and text channel
                 title: str | list[str] = "",        # embed title
-                entries: list = [],                 # list of entries to be added to embed
+                entries: Iterable | AsyncIterable = None, # entries to be added to embed. lists, generators and async generators
                 colour: int | list[int] = 0,        # embed outline colour
-                length: int = 1,                    # number of entries to enter per page
+                length: int = 1,                    # number of entries to enter per page, not used when packing
                 author_restrict: bool = True,       # True -> only author can use buttons
                 timeout: int = 30,                  # navigation button expity (seconds)
                 prefix: str = "",                   # prefix to add before each entry
@@ -21,7 +236,11 @@ class Paginator():
                 reply: bool = True,                 # send as message or as a reply. True will send as reply
                 linesep = "\n",                     # token used to separate lines
                 message = "",                       # extra message sent with embed, on top of embed
-                thumbnail: str | list[str] = None   # thumbnail of the embed
+                thumbnail: str | list[str] = None,  # thumbnail of the embed
+                cache_size: int = 10,               # number of rendered embeds to keep
+                coalesce: float = 0,                # seconds to wait for more clicks before editing. 0 edits on every click
+                pack: bool = False,                 # True -> fill pages up to discord's embed limits, splitting large entries
+                files: list[discord.File] = None    # files attached to the message
                 ):
         
         # Every embed page must have atleast one entry
@@ -30,7 +249,7 @@ class Paginator():
         
         self.ctx = ctx
         self.title = title
-        self.entries = entries
+        self.entries = entries if entries is not None else []
         self.colour = colour
         self.length = length
         self.author_restrict = author_restrict
@@ -42,33 +261,71 @@ class Paginator():
         self.linesep = linesep
         self.message = message
         self.thumbnail = thumbnail
+        self.cache_size = cache_size
+        self.coalesce = coalesce
+        self.pack = pack
+        self.files = files or []
         
         self.current = None         # indicator for embed object
         self.current_page = 1       # indicator for currently viewing page number
-        self.pages = []             # list of pages. pages are created by parse pages function
-        
-        # number of total pages = (total entries / entries per page) rounded up
-        self.total_pages = math.ceil(len(self.entries) / self.length)
-        
-    def parse_pages(self) -> None:
-        # simply create a list of lists. each list will then be added its respective content
-        self.pages = [[] for i in range(self.total_pages)]
-        
-        # keeps track of page number
-        count = 0
-        
-        # run this loop until all entries are loaded into pages
-        while len(self.entries) > 0:
-            # add as many entries into current page as defined in self.length
-            # any added entries should be removed from entries list]
-            for _ in range(self.length):
-                if len(self.entries) > 0:
-                    self.pages[count].append(self.entries[0] + self.linesep)
-                    self.entries.pop(0)
-            count += 1
+        
+        # pages are built lazily by the page source, only when first navigated to
+        self.source = PageSource(self.entries, self.length, self.linesep, self.page_limit(), self.prefix, self.suffix)
+        
+        self.view = None                                    # navigation view, created once by nav()
+        self.embeds: OrderedDict[int, discord.Embed] = OrderedDict()   # page number -> rendered embed
+        self.rendered_total = None                          # total pages at the time embeds were rendered
+        
+        self.shown_page = None                              # page number currently shown in the message
+        self.pending_edit = None                            # task sending the next coalesced edit
+        self.edits_requested = 0                            # page changes made by button clicks
+        self.edits_sent = 0                                 # message edits actually sent
+        self.closed = False                                 # True once buttons are stopped and pages are released
+        
+    # id of the user the paginator was opened for, used for per user limits
+    @property
+    def user(self) -> int | None:
+        author = getattr(self.ctx, "author", None)
+        return getattr(author, "id", author)
+        
+    # whether the manager may close this paginator to make room for others
+    @property
+    def evictable(self) -> bool:
+        return True
+        
+    # number of message edits avoided by coalescing clicks
+    @property
+    def edits_saved(self) -> int:
+        return self.edits_requested - self.edits_sent
+        
+    # number of total pages, None while entries are still being pulled from an iterator
+    @property
+    def total_pages(self) -> int | None:
+        return self.source.total_pages
     
-    # create and return the navigation bar for the embed
+    @property
+    def pages(self) -> dict[int, list[str]]:
+        return self.source.pages
+    
+    # characters a page description may use when packing. None when not packing
+    def page_limit(self) -> int | None:
+        if not self.pack:
+            return None
+        titles = self.title if isinstance(self.title, list) else [self.title]
+        title_length = max((len(title or "") for title in titles), default=0)
+        return min(EMBED_DESCRIPTION_LIMIT, EMBED_TOTAL_LIMIT - title_length - FOOTER_RESERVE)
+    
+    # footer text, total is only shown once known
+    def footer(self, page: int) -> str:
+        if self.total_pages is None:
+            return f"Page {page}"
+        return f"Page {page} of {self.total_pages}"
+    
+    # create the navigation bar for the embed once, the same view is reused for every page
     async def nav(self) -> View:
+        if self.view is not None:
+            return self.view
+        
         # define buttons
         delete_button = Button(emoji="✖️", style=discord.ButtonStyle.danger)
         first_button = Button(emoji="⏪", style=discord.ButtonStyle.blurple)
@@ -76,35 +333,37 @@ class Paginator():
         next_button = Button(emoji="▶️", style=discord.ButtonStyle.blurple)
         last_button = Button(emoji="⏩", style=discord.ButtonStyle.blurple)
         
-        # define callbacks for each button
+        # define callbacks for each button. clicks are acknowledged straight away
+        # clicks that would not change the page do no work
         async def delete_callback(interaction):
-            await self.delete()                             # delete embed
             await interaction.response.defer()
+            await self.delete()                             # delete embed
         
         async def first_callback(interaction):
-            self.current_page = 1                           # go to page number 1
-            await self.update()
             await interaction.response.defer()
+            await self.go_to(1)                             # go to page number 1
         
         async def previous_callback(interaction):
-            if self.current_page-1 < 0:
-                return
-            self.current_page -= 1                          # go to previous page (current page -1)
-            await self.update()
             await interaction.response.defer()
+            await self.go_to(self.current_page - 1)         # go to previous page (current page -1)
             
         async def next_callback(interaction):
-            if self.current_page+1 > len(self.pages):
-                return
-            self.current_page += 1                          # go to next page (current page +1)
-            await self.update()
             await interaction.response.defer()
+            await self.go_to(self.current_page + 1)         # go to next page (current page +1)
             
         async def last_callback(interaction):
-            self.current_page = self.total_pages            # go to last page (last page index is also equal to total page count)
-            await self.update()
             await interaction.response.defer()
+            await self.go_to(await self.source.exhaust())   # go to last page (last page index is also equal to total page count)
+            
+        # only the command author may navigate when author_restrict is set
+        async def interaction_check(interaction):
+            if self.closed:
+                return False
+            return not self.author_restrict or interaction.user == self.ctx.author
             
+        # buttons stop working after the timeout, so nothing needs to be kept any more
+        async def on_timeout():
+            await self.close()
             
         #assign callbacks
         delete_button.callback = delete_callback
@@ -114,97 +373,290 @@ class Paginator():
         last_button.callback = last_callback
         
         # add all buttons to view
-        view = View()
-        view.add_item(delete_button)
-        view.add_item(first_button)
-        view.add_item(previous_button)
-        view.add_item(next_button)
-        view.add_item(last_button)
+        self.view = View(timeout=self.timeout)
+        self.view.interaction_check = interaction_check
+        self.view.on_timeout = on_timeout
+        self.view.add_item(delete_button)
+        self.view.add_item(first_button)
+        self.view.add_item(previous_button)
+        self.view.add_item(next_button)
+        self.view.add_item(last_button)
         
-        return view
-            
-    # send the embed and initiate buttons
-    async def start(self) -> None:
-        if isinstance(self.title, str):
-            title = self.title
-        else:
-            title = self.title[self.init_page-1]
-            
-        if isinstance(self.colour, int):
-            colour = self.colour
-        else:
-            colour = self.colour[self.init_page-1]
+        return self.view
+    
+    # build the embed for a page. rendered embeds are cached, least recently viewed pages are dropped first
+    async def render(self, number: int) -> discord.Embed:
+        # footers change once the total becomes known, so embeds rendered before that are stale
+        if self.rendered_total != self.total_pages:
+            self.embeds.clear()
+            self.rendered_total = self.total_pages
         
+        if number in self.embeds:
+            self.embeds.move_to_end(number)
+            return self.embeds[number]
+        
+        page = await self.source.get_page(number)
+        if page is None:
+            raise ValueError(f"Page {number} does not exist")
+        
+        title = self.title if isinstance(self.title, str) else self.title[number-1]
+        colour = self.colour if isinstance(self.colour, int) else self.colour[number-1]
+        
+        # every entry in the page is added to description with prefix and suffix
         embed = discord.Embed(
             title = title,
-            description = "",
+            description = "".join(f"{self.prefix}{entry}{self.suffix}" for entry in page),
             colour = colour
         )
         
-        self.parse_pages()
-        
-        # for every entry in the first page, add the entry to description with prefix and suffix
-        for entry in self.pages[self.init_page-1]:
-            embed.description += f"{self.prefix}{entry}{self.suffix}"
-        
-        # only add footer with page numbers and navigation if there exists more than 1 page
-        if self.total_pages > 1:
-            embed.set_footer(text=f"Page {self.init_page} of {self.total_pages}")
-            view = await self.nav()
-        else:
-            view = None
+        # only add footer with page numbers if there exists more than 1 page
+        # total is unknown for iterators that are not exhausted yet, so there may be more pages
+        if self.total_pages != 1:
+            embed.set_footer(text=self.footer(number))
         
         if self.thumbnail:
             if isinstance(self.thumbnail, str):
                 embed.set_thumbnail(url=self.thumbnail)
             else:
-                embed.set_thumbnail(url=self.thumbnail[self.init_page-1])
+                embed.set_thumbnail(url=self.thumbnail[number-1])
+        
+        self.embeds[number] = embed
+        if len(self.embeds) > self.cache_size:
+            self.embeds.popitem(last=False)
+        return embed
+            
+    # send the embed and initiate buttons
+    async def start(self) -> None:
+        embed = await self.render(self.init_page)
+        self.current_page = self.shown_page = self.init_page
+        
+        # only add navigation if there exists more than 1 page
+        view = await self.nav() if self.total_pages != 1 else None
             
         # if set to reply mode, send message as reply, otherwise simply send to channel
         if self.reply:
-            self.current = await self.ctx.reply(self.message, embed=embed, view=view)
+            self.current = await self.ctx.reply(self.message, embed=embed, view=view, files=self.files)
         else:
-            self.current = await self.ctx.send(self.message, embed=embed, view=view)
+            self.current = await self.ctx.send(self.message, embed=embed, view=view, files=self.files)
             
-    # update embed every time new page is requested
-    async def update(self) -> None:
-        if isinstance(self.title, str):
-            title = self.title
+        # single page embeds have no buttons and nothing to keep track of
+        if view is None:
+            await self.close()
         else:
-            title = self.title[self.current_page - 1]
+            await self.manager.register(self)
             
-        if isinstance(self.colour, int):
-            colour = self.colour
-        else:
-            colour = self.colour[self.current_page - 1]
+    # move to a page, does nothing if the page does not exist or is already shown
+    async def go_to(self, number: int) -> None:
+        if number == self.current_page or await self.source.get_page(number) is None:
+            return
+        self.current_page = number
+        self.manager.touch(self)
+        self.edits_requested += 1
+        Paginator.edit_stats["requested"] += 1
         
-        embed = discord.Embed(
-            title = title,
-            description = "",
-            colour = colour
-        )
+        if not self.coalesce:
+            await self.update()
+            return
         
-        if self.thumbnail:
-            if isinstance(self.thumbnail, str):
-                embed.set_thumbnail(url=self.thumbnail)
-            else:
-                embed.set_thumbnail(url=self.thumbnail[self.current_page-1])
+        # render now so the delayed edit only has to send it, then restart the wait
+        # a pending or in flight edit is dropped since only the final page matters
+        await self.render(number)
+        if self.pending_edit is not None and not self.pending_edit.done():
+            self.pending_edit.cancel()
+        self.pending_edit = asyncio.create_task(self.delayed_update(), name=f"paginator-edit-{id(self)}")
+        self.pending_edit.add_done_callback(report_task_error)
         
-        # iterate through each entry in current page and append to description with prefix and suffix
-        for entry in self.pages[self.current_page-1]:
-            embed.description += f"{self.prefix}{entry}{self.suffix}"
+    async def delayed_update(self) -> None:
+        await asyncio.sleep(self.coalesce)
+        await self.update()
             
-        embed.set_footer(text=f"Page {self.current_page} of {self.total_pages}")
-        
-        await self.current.edit(content=self.message, embed=embed, view=await self.nav())
+    # update embed every time new page is requested
+    async def update(self) -> None:
+        # clicks may have returned to the page already shown
+        if self.closed or self.current_page == self.shown_page:
+            return
+        page = self.current_page
+        embed = await self.render(page)
+        await self.current.edit(content=self.message, embed=embed, view=self.view)
+        self.shown_page = page
+        self.edits_sent += 1
+        Paginator.edit_stats["sent"] += 1
         
     # delete embed
     async def delete(self) -> None:
+        await self.close()
         await self.current.delete()
         
     async def close_page(self) -> None:
         await self.delete()
         
     async def clear(self) -> None:
-        self.pages = []
-            
\ No newline at end of file
+        await self.close()
+        
+    # stop the buttons, unregister and release all pages. disable=True also greys out the buttons in the message
+    async def close(self, disable: bool = False) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.manager.unregister(self)
+        
+        if self.pending_edit is not None:
+            self.pending_edit.cancel()
+            
+        if self.view is not None:
+            self.view.stop()
+            if disable and self.current is not None:
+                for item in self.view.children:
+                    item.disabled = True
+                try:
+                    await self.current.edit(view=self.view)
+                except discord.HTTPException:
+                    pass
+                
+        self.source.pages.clear()
+        self.source.entries = None
+        self.source.iterator = None
+        self.entries = None
+        self.embeds.clear()
+        
+    # rough number of bytes held by built pages and rendered embeds
+    def memory_estimate(self) -> int:
+        size = sum(sys.getsizeof(entry) for page in self.source.pages.values() for entry in page)
+        size += sum(sys.getsizeof(embed.description or "") for embed in self.embeds.values())
+        return size
+
+
+# Pages of text that is still being written. Text is split into pages as it comes in, on line boundaries where
+# possible. Only the last page ever changes, earlier pages are final
+class StreamSource():
+    def __init__(self, limit: int, overhead: int = 0):
+        self.room = limit - overhead
+        self.pages: dict[int, list[str]] = {1: [""]}
+        self.total_pages = 1
+        self.changed = None         # first page changed since changes were last taken, None if nothing changed
+        self.entries = None
+        self.iterator = None
+
+    def write(self, text: str) -> None:
+        number = self.total_pages
+        tail = self.pages[number][0] + text
+        self.changed = number if self.changed is None else min(self.changed, number)
+        while len(tail) > self.room:
+            cut = tail.rfind("\n", 0, self.room)
+            cut = cut + 1 if cut != -1 else self.room
+            self.pages[number] = [tail[:cut]]
+            number += 1
+            tail = tail[cut:]
+        self.pages[number] = [tail]
+        self.total_pages = number
+
+    # first page changed since the last call, None if nothing changed
+    def take_changes(self) -> int | None:
+        changed, self.changed = self.changed, None
+        return changed
+
+    async def get_page(self, number: int) -> list[str] | None:
+        return self.pages.get(number)
+
+    async def exhaust(self) -> int:
+        return self.total_pages
+
+
+# Paginator shown while its text is still being written, e.g. output of running code. write() only queues text, so it
+# is cheap and safe to call from other threads. Queued text is added and the message edited at most once every
+# interval seconds. While the last page is viewed, new pages are followed as they appear
+class StreamPaginator(Paginator):
+    def __init__(
+                self,
+                ctx: commands.Context,
+                interval: float = 2,                # seconds between edits while text comes in
+                **kwargs
+                ):
+        super().__init__(ctx, entries=[], length=1, pack=True, **kwargs)
+        self.interval = interval
+        self.source = StreamSource(self.page_limit(), len(self.prefix) + len(self.suffix))
+        self.queue = deque()
+        self.task = None
+        self.finished = False
+        
+        # buttons must not expire while text is still coming in, the timeout starts once finished
+        self.final_timeout = self.timeout
+        self.timeout = None
+        
+    # a stream that is still being written is never closed by the manager, its output would be lost
+    @property
+    def evictable(self) -> bool:
+        return self.finished
+        
+    def write(self, text: str) -> None:
+        if text and not self.closed:
+            self.queue.append(text)
+            
+    async def start(self) -> None:
+        embed = await self.render(1)
+        if self.reply:
+            self.current = await self.ctx.reply(self.message, embed=embed, files=self.files)
+        else:
+            self.current = await self.ctx.send(self.message, embed=embed, files=self.files)
+        self.shown_page = 1
+        await self.manager.register(self)
+        self.task = asyncio.create_task(self.flush_loop(), name=f"paginator-stream-{id(self)}")
+        self.task.add_done_callback(report_task_error)
+        
+    async def flush_loop(self) -> None:
+        while not self.closed:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+            
+    # add queued text to the pages. returns the first changed page, None if nothing changed
+    def drain(self) -> int | None:
+        parts = []
+        while self.queue:
+            parts.append(self.queue.popleft())
+        if parts:
+            self.source.write("".join(parts))
+        changed = self.source.take_changes()
+        if changed is not None:
+            for number in [number for number in self.embeds if number >= changed]:
+                del self.embeds[number]
+        return changed
+    
+    # edit the message if the page shown, the page count or the title changed
+    async def flush(self, force: bool = False, **kwargs) -> None:
+        if self.closed:
+            return
+        following = self.current_page == self.total_pages
+        total = self.total_pages
+        changed = self.drain()
+        if following:
+            self.current_page = self.total_pages
+        if self.total_pages > 1 and self.view is None:
+            await self.nav()
+            
+        if force or self.total_pages != total or (changed is not None and self.current_page >= changed):
+            page = self.current_page
+            embed = await self.render(page)
+            await self.current.edit(content=self.message, embed=embed, view=self.view, **kwargs)
+            self.shown_page = page
+            self.edits_sent += 1
+            Paginator.edit_stats["sent"] += 1
+            
+    # stop streaming and show the final pages, with a new title and colour if given
+    async def finish(self, title: str = None, colour: int = None, files: list[discord.File] = None) -> None:
+        if self.task is not None:
+            self.task.cancel()
+        self.finished = True
+        if self.closed:
+            return
+        self.title = title if title is not None else self.title
+        self.colour = colour if colour is not None else self.colour
+        self.embeds.clear()
+        
+        # the timeout starts when the view is sent again with the final edit
+        self.timeout = self.final_timeout
+        if self.view is not None:
+            self.view.timeout = self.timeout
+        await self.flush(force=True, **({"attachments": files} if files else {}))
+        
+        if self.view is None:
+            await self.close()
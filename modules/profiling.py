@@ -0,0 +1,101 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import statistics
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Coroutine
+
+
+# cProfile and tracemalloc are process wide, two runs at once would disable or reset each other
+# profile and timeit hold this lock while running, so a second caller waits
+_lock = asyncio.Lock()
+
+
+# True while a profile or timeit run is in progress. commands use this to refuse instead of waiting
+def busy() -> bool:
+    return _lock.locked()
+
+
+# Awaits a coroutine with the profiler enabled only while the coroutine itself is running
+# While it waits, other tasks run on the loop without being profiled. Tasks it starts are not profiled either
+class ProfiledCoroutine():
+    def __init__(self, coroutine: Coroutine, profiler: cProfile.Profile):
+        self.coroutine = coroutine
+        self.profiler = profiler
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self.profiler.enable()
+            try:
+                if error is None:
+                    future = self.coroutine.send(value)
+                else:
+                    future = self.coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.profiler.disable()
+
+            # hand whatever the coroutine waits on to the running task, and pass the outcome back in
+            try:
+                value, error = (yield future), None
+            except BaseException as exception:
+                value, error = None, exception
+
+
+# run function once under cProfile. returns (result, stats)
+async def profile(function: Callable[[], Awaitable]) -> tuple[Any, pstats.Stats]:
+    async with _lock:
+        profiler = cProfile.Profile()
+        result = await ProfiledCoroutine(function(), profiler)
+        return result, pstats.Stats(profiler)
+
+
+# stats as text, sorted by cumulative time. limit=None lists every function
+def format_stats(stats: pstats.Stats, limit: int = None) -> str:
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(*([limit] if limit else []))
+    return stream.getvalue().strip()
+
+
+# run function runs times and time each run, then once more with tracemalloc tracing
+# memory is measured on a separate run as tracing slows down every allocation
+# other tasks allocating while the function awaits are included in the memory figures
+async def timeit(function: Callable[[], Awaitable], runs: int) -> dict:
+    async with _lock:
+        return await _timeit(function, runs)
+
+
+async def _timeit(function: Callable[[], Awaitable], runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        await function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    return {
+        "runs": runs,
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, round(0.95 * (len(timings) - 1)))],
+        "max": timings[-1],
+        "peak": peak - before,          # most memory allocated at once during a run, in bytes
+        "retained": current - before    # memory still allocated after a run, in bytes
+    }
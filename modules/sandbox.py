@@ -0,0 +1,163 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+import textwrap
+from traceback import format_exception
+from typing import Callable
+
+try:
+    import resource     # unix only. elsewhere only the wall clock timeout applies
+except ImportError:
+    resource = None
+
+
+RESULT_LIMIT = 4000         # characters of the returned value or traceback sent back to the bot
+READ_SIZE = 4096
+
+
+# Result of one sandboxed run. status is "success", "error", "timeout" or "killed"
+class SandboxResult():
+    def __init__(self, status: str, value: str = "", returncode: int | None = None):
+        self.status = status
+        self.value = value
+        self.returncode = returncode
+
+    # reason a killed worker stopped, from the signal that killed it
+    @property
+    def reason(self) -> str:
+        if self.returncode is not None and self.returncode < 0:
+            signum = -self.returncode
+            if signum == getattr(signal, "SIGXCPU", None):
+                return "CPU time limit reached"
+            return f"killed by {signal.Signals(signum).name}"
+        return f"exited with code {self.returncode}"
+
+
+# Runs code in separate python processes, so blocking or runaway code cannot freeze the bot's event loop
+# Workers are started ahead of time and used for one run each, so no state is shared between runs
+# Workers run in isolated mode from a temporary directory, with an empty environment. this is not a security boundary:
+# they run as the same user as the bot and can read its files, .env and the token in it included. owner only
+class SandboxPool():
+    def __init__(
+                self,
+                size: int = 2,                          # idle workers kept ready
+                timeout: float = 10,                    # wall clock seconds before a run is killed
+                cpu: int = 5,                           # cpu seconds a run may use
+                memory: int = 256 * 1024 * 1024         # bytes of address space a run may use
+                ):
+        self.size = size
+        self.timeout = timeout
+        self.cpu = cpu
+        self.memory = memory
+        self.idle: list[asyncio.subprocess.Process] = []
+        self.refill_task = None
+
+    async def spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, "-I", "-u", os.path.abspath(__file__),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=tempfile.gettempdir(),
+            env={"PATH": os.environ.get("PATH", "")}
+        )
+
+    async def refill(self) -> None:
+        while len(self.idle) < self.size:
+            self.idle.append(await self.spawn())
+
+    # take an idle worker, or start one if none is ready. the pool is topped up in the background
+    async def acquire(self) -> asyncio.subprocess.Process:
+        while self.idle:
+            process = self.idle.pop(0)
+            if process.returncode is None:
+                break
+        else:
+            process = await self.spawn()
+        if self.refill_task is None or self.refill_task.done():
+            self.refill_task = asyncio.create_task(self.refill())
+        return process
+
+    # run code in a worker. printed output is passed to write as it arrives, only the repr of the value returned
+    # (or the traceback) comes back, cut to RESULT_LIMIT characters
+    async def run(self, code: str, write: Callable[[str], None]) -> SandboxResult:
+        process = await self.acquire()
+        job = {"code": code, "cpu": self.cpu, "memory": self.memory}
+        process.stdin.write(json.dumps(job).encode() + b"\n")
+        await process.stdin.drain()
+        process.stdin.close()
+
+        async def stream() -> None:
+            while chunk := await process.stderr.read(READ_SIZE):
+                write(chunk.decode(errors="replace"))
+
+        try:
+            # the result is small and only written at the end, the pipe cannot fill up before it is read
+            _, result, _ = await asyncio.wait_for(
+                asyncio.gather(stream(), process.stdout.read(), process.wait()),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            return SandboxResult("timeout", returncode=await self.stop(process))
+        finally:
+            # also reached when the run is cancelled, the worker must not be left running on its own
+            await self.stop(process)
+
+        try:
+            result = json.loads(result)
+        except ValueError:
+            return SandboxResult("killed", returncode=process.returncode)
+        return SandboxResult("success" if result["ok"] else "error", result["value"], process.returncode)
+
+    # kill a worker that has not exited yet, returns its exit code
+    @staticmethod
+    async def stop(process: asyncio.subprocess.Process) -> int:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        return await process.wait()
+
+    async def close(self) -> None:
+        if self.refill_task is not None:
+            self.refill_task.cancel()
+        for process in self.idle:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        self.idle.clear()
+
+
+def limit(cpu: int, memory: int) -> None:
+    if resource is None:
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+# worker side: wait for one job on stdin, run it and write the result to stdout
+# printed output of the job goes to stderr, which the bot streams while the job runs
+def work() -> None:
+    job = json.loads(sys.stdin.readline())
+    output = sys.stdout
+    sys.stdout = sys.stderr
+    limit(job["cpu"], job["memory"])
+
+    namespace = {}
+    try:
+        exec(f"async def function():\n{textwrap.indent(job['code'], '    ')}", namespace)
+        result = {"ok": True, "value": repr(asyncio.run(namespace["function"]()))[:RESULT_LIMIT]}
+    except BaseException as error:
+        result = {"ok": False, "value": "".join(format_exception(error, error, error.__traceback__))[-RESULT_LIMIT:]}
+
+    sys.stderr.flush()
+    output.write(json.dumps(result))
+    output.flush()
+
+
+if __name__ == "__main__":
+    work()
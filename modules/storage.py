@@ -0,0 +1,267 @@
+import abc
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+
+# Storage engines used by jsonhandler. A namespace maps to what used to be a json filename ("colours", "config")
+# Every engine works with plain dicts of json-serialisable values and must be safe to call from several threads
+# A namespace that does not exist raises FileNotFoundError on read and get, as a missing json file does
+class StorageEngine(abc.ABC):
+    # return every key in a namespace as a dict
+    @abc.abstractmethod
+    def read(self, namespace: str) -> dict:
+        ...
+
+    # return the value of a single key, None if key not found
+    def get(self, namespace: str, key: str):
+        return self.read(namespace).get(key, None)
+
+    # insert new keys or replace existing ones, leaving other keys untouched
+    @abc.abstractmethod
+    def upsert(self, namespace: str, data: dict) -> None:
+        ...
+
+    # replace all content of a namespace
+    @abc.abstractmethod
+    def overwrite(self, namespace: str, data: dict) -> None:
+        ...
+
+    # write any pending changes to disk
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class JsonEngine(StorageEngine):
+    def __init__(
+                self,
+                directory: str = "data",        # directory holding all json files
+                write_delay: float = 0.5        # seconds to wait for more writes before flushing a file to disk
+                ):
+        self.directory = directory
+        self.write_delay = write_delay
+
+        # cache of parsed files. namespace -> {"data": dict, "mtime": int, "size": int}
+        self._cache: dict[str, dict] = {}
+        # namespaces changed in memory that still need to be written to disk. namespace -> pending flush timer
+        self._pending: dict[str, threading.Timer] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, namespace: str) -> str:
+        return os.path.join(self.directory, f"{namespace}.json")
+
+    def _schedule(self, namespace: str) -> None:
+        timer = threading.Timer(self.write_delay, self._flush, args=(namespace,))
+        timer.daemon = True
+        self._pending[namespace] = timer
+        timer.start()
+
+    # a namespace stays pending until its file is written. if writing fails it is tried again after another delay
+    def _flush(self, namespace: str) -> None:
+        with self._lock:
+            timer = self._pending.get(namespace)
+            if timer is None:
+                return
+            timer.cancel()
+            try:
+                self._write(namespace)
+            except BaseException:
+                self._schedule(namespace)
+                raise
+            del self._pending[namespace]
+
+    # write a file atomically: dump into a temp file in the same directory, then rename over the original. called with the lock held
+    def _write(self, namespace: str) -> None:
+        data = self._cache[namespace]["data"]
+
+        path = self._path(namespace)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{namespace}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(data, file, indent=4)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        # remember what is now on disk so the next read does not parse it again
+        stat = os.stat(path)
+        self._cache[namespace].update(mtime=stat.st_mtime_ns, size=stat.st_size)
+
+    def flush(self, namespace: str = None) -> None:
+        with self._lock:
+            for name in [namespace] if namespace else list(self._pending):
+                self._flush(name)
+
+    # cached entry of a namespace. the file is only parsed again if its mtime or size changed since it was last read
+    # called with the lock held
+    def _entry(self, namespace: str) -> dict:
+        entry = self._cache.get(namespace)
+
+        # unflushed changes are newer than whatever is on disk
+        if namespace in self._pending:
+            return entry
+
+        stat = os.stat(self._path(namespace))
+        if entry is None or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            with open(self._path(namespace), "r") as file:
+                data = json.load(file)
+            entry = self._cache[namespace] = {"data": data, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+        return entry
+
+    def read(self, namespace: str) -> dict:
+        with self._lock:
+            # shallow copy so callers cannot change the cached dict by accident
+            return dict(self._entry(namespace)["data"])
+
+    # single key straight from the cache, without copying the namespace
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            return self._entry(namespace)["data"].get(key, None)
+
+    # cache is updated straight away, writes close together are merged into one flush
+    def overwrite(self, namespace: str, data: dict) -> None:
+        with self._lock:
+            entry = self._cache.setdefault(namespace, {"mtime": None, "size": None})
+            entry["data"] = dict(data)
+
+            if namespace not in self._pending:
+                self._schedule(namespace)
+
+    # merge keys into the cached dict in place, then flush like overwrite
+    def upsert(self, namespace: str, data: dict) -> None:
+        with self._lock:
+            self._entry(namespace)["data"].update(data)
+            if namespace not in self._pending:
+                self._schedule(namespace)
+
+    def namespaces(self) -> list[str]:
+        return sorted(filename[:-5] for filename in os.listdir(self.directory) if filename.endswith(".json"))
+
+
+class SQLiteEngine(StorageEngine):
+    def __init__(
+                self,
+                database: str = "data/storage.db"   # path to the sqlite database file
+                ):
+        self.database = database
+        self._lock = threading.RLock()
+        self._depth = 0         # nesting level of batch() blocks, commit only happens when leaving the outermost
+
+        # connection is shared between executor threads, access is guarded by self._lock
+        self._connection = sqlite3.connect(database, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS store ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        # namespaces are tracked in their own table so an empty namespace still exists, like an empty json file
+        self._connection.execute("CREATE TABLE IF NOT EXISTS namespaces (name TEXT PRIMARY KEY) WITHOUT ROWID")
+
+    # group several writes into a single transaction
+    @contextlib.contextmanager
+    def batch(self):
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute("BEGIN")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("ROLLBACK")
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute("COMMIT")
+
+    def read(self, namespace: str) -> dict:
+        with self._lock:
+            rows = self._connection.execute("SELECT key, value FROM store WHERE namespace = ?", (namespace,)).fetchall()
+            if not rows:
+                self._check_exists(namespace)
+        return {key: json.loads(value) for key, value in rows}
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM store WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+            if row is None:
+                self._check_exists(namespace)
+        return json.loads(row[0]) if row else None
+
+    def upsert(self, namespace: str, data: dict) -> None:
+        rows = [(namespace, str(key), json.dumps(value)) for key, value in data.items()]
+        with self.batch():
+            self._touch(namespace)
+            self._connection.executemany(
+                "INSERT INTO store (namespace, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+                rows
+            )
+
+    def overwrite(self, namespace: str, data: dict) -> None:
+        with self.batch():
+            self._connection.execute("DELETE FROM store WHERE namespace = ?", (namespace,))
+            self.upsert(namespace, data)
+
+    def _check_exists(self, namespace: str) -> None:
+        if self._connection.execute("SELECT 1 FROM namespaces WHERE name = ?", (namespace,)).fetchone() is None:
+            raise FileNotFoundError(f"No namespace named {namespace!r} in {self.database}")
+
+    def _touch(self, namespace: str) -> None:
+        self._connection.execute("INSERT OR IGNORE INTO namespaces (name) VALUES (?)", (namespace,))
+
+    def namespaces(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT name FROM namespaces ORDER BY name")]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+# create the engine named by the STORAGE_ENGINE environment variable, defaults to json files
+def create_engine(name: str = None) -> StorageEngine:
+    name = (name or os.getenv("STORAGE_ENGINE") or "json").lower()
+    if name == "json":
+        return JsonEngine(os.getenv("STORAGE_DIR") or "data")
+    elif name == "sqlite":
+        return SQLiteEngine(os.getenv("STORAGE_DATABASE") or "data/storage.db")
+    else:
+        raise ValueError(f"Unknown storage engine: {name}")
+
+
+# one-shot import of every json file in a directory into a sqlite database. returns number of keys imported
+def migrate(directory: str = "data", database: str = "data/storage.db") -> int:
+    source = JsonEngine(directory)
+    target = SQLiteEngine(database)
+    count = 0
+    try:
+        with target.batch():
+            for namespace in source.namespaces():
+                data = source.read(namespace)
+                target.overwrite(namespace, data)
+                count += len(data)
+                print(f"Imported {len(data)} keys from {namespace}.json")
+    finally:
+        target.close()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import json files into the sqlite storage engine")
+    parser.add_argument("--source", default="data", help="directory containing the json files")
+    parser.add_argument("--database", default="data/storage.db", help="sqlite database to write to")
+    arguments = parser.parse_args()
+    print(f"Migration complete: {migrate(arguments.source, arguments.database)} keys imported")
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from discord.ext import commands
+
+
+# A stall of the event loop: the loop did not run anything else for duration seconds
+class Stall():
+    def __init__(self, source: str, duration: float, command: str | None, stack: str = ""):
+        self.source = source            # "sampler" for stalls caught while happening, "asyncio" for slow callbacks
+        self.time = time.time()
+        self.duration = duration
+        self.command = command          # command running when the loop stalled, None if not known
+        self.stack = stack              # stack of the loop thread while it was stalled
+
+
+# Passes asyncio's slow callback warnings on to the watchdog
+class SlowCallbackHandler(logging.Handler):
+    def __init__(self, watchdog: "LoopWatchdog"):
+        super().__init__(logging.WARNING)
+        self.watchdog = watchdog
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.msg.startswith("Executing"):
+            handle, duration = record.args
+            self.watchdog.slow_callback(handle, duration)
+
+
+# Detects code blocking the event loop. The loop bumps a heartbeat every interval seconds, and a thread checks it
+# When the heartbeat is older than threshold, the loop thread's stack is captured and tagged with the running command
+# Also turns on asyncio debug mode so callbacks slower than threshold are reported by asyncio itself
+# Debug mode slows the whole loop down, so the watchdog is opt-in
+class LoopWatchdog():
+    def __init__(self, client: commands.Bot, threshold: float = 0.25, interval: float = 0.05, size: int = 100):
+        self.client = client
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: deque[Stall] = deque(maxlen=size)
+        self.loop = None
+        self.loop_thread = None
+        self.beat = 0
+        self.beat_handle = None
+        self.handler = SlowCallbackHandler(self)
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.loop.set_debug(True)
+        self.loop.slow_callback_duration = self.threshold
+        logging.getLogger("asyncio").addHandler(self.handler)
+
+        self.heartbeat()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        self.stopping.set()
+        self.thread.join()
+        self.thread = None
+        self.beat_handle.cancel()
+        logging.getLogger("asyncio").removeHandler(self.handler)
+        self.loop.set_debug(False)
+
+    def heartbeat(self) -> None:
+        self.beat = time.monotonic()
+        self.beat_handle = self.loop.call_later(self.interval, self.heartbeat)
+
+    # command of the task the loop is running right now
+    def current_command(self) -> str | None:
+        task = asyncio.current_task(self.loop)
+        return self.client.metrics.running.get(task) if task is not None else None
+
+    # runs in the watchdog thread. one report per stall, its duration is filled in once the loop recovers
+    def watch(self) -> None:
+        stall, started = None, 0
+        while not self.stopping.wait(self.interval):
+            late = time.monotonic() - self.beat
+            if stall is None and late > self.threshold:
+                frame = sys._current_frames().get(self.loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+                started = self.beat
+                stall = Stall("sampler", late, self.current_command(), stack)
+                self.stalls.append(stall)
+            elif stall is not None and late <= self.threshold:
+                stall.duration = self.beat - started
+                stall = None
+            elif stall is not None:
+                stall.duration = late
+
+    # a slow callback reported by asyncio. the handle names the task, which may still be running a command
+    def slow_callback(self, handle: str, duration: float) -> None:
+        command = None
+        match = re.search(r"name='([^']*)'", handle)
+        if match:
+            for task, name in list(self.client.metrics.running.items()):
+                if task.get_name() == match.group(1):
+                    command = name
+        self.stalls.append(Stall("asyncio", duration, command, handle))
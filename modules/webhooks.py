@@ -0,0 +1,79 @@
+import asyncio
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+
+# Reuses one bot owned webhook per channel instead of creating and deleting one per message
+# Webhooks are kept in an LRU cache. Channels dropped from the cache keep their webhook, it is found again when needed
+# A webhook deleted by someone else is recreated on the next send
+class WebhookPool():
+    def __init__(
+                self,
+                client: commands.Bot,
+                name: str = "Impersonate",      # name of the webhooks owned by the pool
+                max_size: int = 100             # channels kept in the cache
+                ):
+        self.client = client
+        self.name = name
+        self.max_size = max_size
+        self.cache: OrderedDict[int, discord.Webhook] = OrderedDict()     # channel id -> webhook
+        self.locks: dict[int, asyncio.Lock] = {}
+        self.created = 0
+
+    def owned(self, webhook: discord.Webhook) -> bool:
+        return webhook.user == self.client.user and webhook.name == self.name and webhook.token is not None
+
+    def remember(self, channel_id: int, webhook: discord.Webhook) -> None:
+        self.cache[channel_id] = webhook
+        self.cache.move_to_end(channel_id)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    # fill the cache with webhooks made by the pool before a restart, one request per guild
+    async def discover(self) -> None:
+        await self.client.wait_until_ready()
+        for guild in self.client.guilds:
+            if len(self.cache) >= self.max_size:
+                break
+            if not guild.me.guild_permissions.manage_webhooks:
+                continue
+            try:
+                webhooks = await guild.webhooks()
+            except discord.HTTPException:
+                continue
+            for webhook in webhooks:
+                if self.owned(webhook) and webhook.channel_id not in self.cache and len(self.cache) < self.max_size:
+                    self.cache[webhook.channel_id] = webhook
+
+    # webhook of a channel, found or created if not cached. threads use the webhook of their parent channel
+    async def get(self, channel: discord.abc.GuildChannel) -> discord.Webhook:
+        if channel.id in self.cache:
+            self.cache.move_to_end(channel.id)
+            return self.cache[channel.id]
+
+        lock = self.locks.setdefault(channel.id, asyncio.Lock())
+        async with lock:
+            if channel.id not in self.cache:
+                webhook = discord.utils.find(self.owned, await channel.webhooks())
+                if webhook is None:
+                    webhook = await channel.create_webhook(name=self.name)
+                    self.created += 1
+                self.remember(channel.id, webhook)
+        self.locks.pop(channel.id, None)
+        return self.cache[channel.id]
+
+    # send a message as someone else. username and avatar are set per message
+    async def send(self, channel: discord.abc.Messageable, content: str, username: str, avatar_url: str = None) -> None:
+        thread = channel if isinstance(channel, discord.Thread) else discord.utils.MISSING
+        parent = channel.parent if isinstance(channel, discord.Thread) else channel
+
+        webhook = await self.get(parent)
+        try:
+            await webhook.send(content, username=username, avatar_url=avatar_url, thread=thread)
+        except discord.NotFound:
+            # deleted since it was cached, make a new one and try once more
+            self.cache.pop(parent.id, None)
+            webhook = await self.get(parent)
+            await webhook.send(content, username=username, avatar_url=avatar_url, thread=thread)
@@ -0,0 +1,69 @@
+import asyncio
+
+import discord
+import pytest
+import yarl
+from aiohttp import web
+
+from benchmarks.stub import StubServer, create_app, shard_guilds
+from modules.cluster import recommended_shards, shard_ranges
+
+
+@pytest.mark.parametrize("shard_count, cluster_count, expected", [
+    (4, 2, [[0, 1], [2, 3]]),
+    (5, 4, [[0, 1], [2], [3], [4]]),
+    (8, 3, [[0, 1, 2], [3, 4, 5], [6, 7]]),
+    (3, 5, [[0], [1], [2]]),
+    (1, 1, [[0]]),
+])
+def test_shard_ranges(shard_count, cluster_count, expected):
+    assert shard_ranges(shard_count, cluster_count) == expected
+
+
+def test_shard_ranges_cover_every_shard_once():
+    for shard_count in range(1, 40):
+        for cluster_count in range(1, 12):
+            ranges = shard_ranges(shard_count, cluster_count)
+            assert len(ranges) == min(shard_count, cluster_count)
+            assert [shard for shard_ids in ranges for shard in shard_ids] == list(range(shard_count))
+            assert max(map(len, ranges)) - min(map(len, ranges)) <= 1
+
+
+# stub REST and gateway on a free port in the running loop
+async def start_stub(**options) -> tuple[web.AppRunner, StubServer, int]:
+    server = StubServer(latency=0, **options)
+    runner = web.AppRunner(create_app(server), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner, server, runner.addresses[0][1]
+
+
+def test_clusters_connect_to_stub_gateway(monkeypatch):
+    async def scenario():
+        runner, server, port = await start_stub(shards=4, guilds=12)
+        monkeypatch.setattr(discord.http.Route, "BASE", f"http://127.0.0.1:{port}/api/v10")
+        monkeypatch.setattr(discord.gateway.DiscordWebSocket, "DEFAULT_GATEWAY", yarl.URL(f"ws://127.0.0.1:{port}/gateway"))
+
+        # what launcher.py does for SHARD_COUNT=auto, blocking call so it runs in a thread
+        shard_count = await asyncio.to_thread(recommended_shards, "token")
+        clients = []
+        try:
+            for shard_ids in shard_ranges(shard_count, 2):
+                client = discord.AutoShardedClient(intents=discord.Intents.default(), shard_ids=shard_ids, shard_count=shard_count, guild_ready_timeout=0.1)
+                clients.append(client)
+                asyncio.create_task(client.start("token"))
+            for client in clients:
+                await asyncio.wait_for(client.wait_until_ready(), 10)
+
+            assert sorted(server.identified) == [[shard_id, 4] for shard_id in range(4)]
+            for client, shard_ids in zip(clients, shard_ranges(shard_count, 2)):
+                expected = [guild_id for shard_id in shard_ids for guild_id in shard_guilds(12, shard_id, 4)]
+                assert sorted(guild.id for guild in client.guilds) == sorted(expected)
+                assert client.user.id == 1000
+            assert sum(len(client.guilds) for client in clients) == 12
+        finally:
+            for client in clients:
+                await client.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
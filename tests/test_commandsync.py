@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import discord
+import pytest
+from discord import app_commands
+from discord.ext import commands
+
+from modules import commandsync, jsonhandler
+from modules.commandsync import command_hashes, diff, sync_changed
+from modules.storage import JsonEngine
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    (tmp_path / "config.json").write_text(json.dumps({"sync_guilds": [10]}))
+    monkeypatch.setattr(jsonhandler, "_engine", None)
+    engine = JsonEngine(str(tmp_path), write_delay=0.05)
+    jsonhandler.set_engine(engine)
+    yield engine
+    engine.close()
+
+
+def command(name: str, description: str = "...") -> app_commands.Command:
+    async def callback(interaction: discord.Interaction) -> None:
+        pass
+    return app_commands.Command(name=name, description=description, callback=callback)
+
+
+# bot whose tree records every sync instead of sending it. failures maps a scope to the error its sync raises
+def make_client(failures: dict = None) -> tuple[commands.Bot, list]:
+    client = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+    synced = []
+
+    async def sync(*, guild=None):
+        scope = "global" if guild is None else str(guild.id)
+        if failures and scope in failures:
+            raise failures[scope]
+        synced.append(scope)
+
+    client.tree.sync = sync
+    return client, synced
+
+
+def test_command_hashes_and_diff():
+    client, _ = make_client()
+    client.tree.add_command(command("ping"))
+    client.tree.add_command(command("say"))
+    client.tree.add_command(command("guildonly"), guild=discord.Object(id=10))
+    before = command_hashes(client.tree)
+    assert set(before) == {"ping", "say"}
+    assert set(command_hashes(client.tree, discord.Object(id=10))) == {"guildonly"}
+
+    client.tree.remove_command("say")
+    client.tree.add_command(command("ping", "changed"), override=True)
+    client.tree.add_command(command("avatar"))
+    after = command_hashes(client.tree)
+    assert after["ping"] != before["ping"]
+    assert diff(before, after) == ["+ avatar", "- say", "~ ping"]
+    assert diff(after, after) == []
+
+
+def test_unchanged_scopes_are_skipped(engine):
+    async def scenario():
+        client, synced = make_client()
+        client.tree.add_command(command("ping"))
+        first = await sync_changed(client)
+        assert synced == ["global", "10"]
+        assert first[0] == "Synced global commands: + ping"
+
+        assert await sync_changed(client) == ["Commands unchanged, nothing to sync"]
+        assert synced == ["global", "10"]
+
+        client.tree.add_command(command("say"))
+        assert await sync_changed(client) == ["Synced global commands: + say"]
+        await sync_changed(client, force=True)
+        assert synced == ["global", "10", "global", "global", "10"]
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_scope_is_retried(engine):
+    response = type("Response", (), {"status": 403, "reason": "Forbidden"})()
+    failures = {"10": discord.Forbidden(response, "Missing Access")}
+
+    async def scenario():
+        client, synced = make_client(failures)
+        client.tree.add_command(command("ping"))
+        client.tree.add_command(command("guildonly"), guild=discord.Object(id=10))
+        report = await sync_changed(client)
+        assert synced == ["global"]
+        assert report[0] == "Synced global commands: + ping"
+        assert report[1].startswith("Failed to sync 10 commands: Forbidden")
+        assert "10" not in commandsync.load_hashes()
+
+        failures.clear()
+        assert await sync_changed(client) == ["Synced 10 commands: + guildonly"]
+        assert synced == ["global", "10"]
+        await client.close()
+
+    asyncio.run(scenario())
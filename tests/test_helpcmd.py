@@ -0,0 +1,222 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+
+from benchmarks.fakes import FakeContext
+from bot import Bot
+from modules import helpcmd
+from modules.helpcmd import HelpIndex, typo_distance
+from modules.paginator import Paginator, PaginatorManager
+
+
+# index of names like a bot with cog_count synthetic cogs: commands, their aliases, groups with subcommands and cogs
+# every name shares most of its trigrams with many others, the worst case for suggestions
+def synthetic_index(cog_count: int) -> HelpIndex:
+    index = HelpIndex()
+    for number in range(cog_count):
+        for command in range(8):
+            index.add_name(f"command_{number}_{command}", object())
+            index.add_name(f"c{number}_{command}", object())
+        index.add_name(f"group_{number}", object())
+        for command in range(3):
+            index.add_name(f"group_{number} sub_{command}", object())
+        index.add_name(f"Cog{number}", object())
+    return index
+
+
+def small_index() -> HelpIndex:
+    index = HelpIndex()
+    for name in ["ping", "say", "avatar", "impersonate", "status", "Misc", "Heart"]:
+        index.add_name(name, object())
+    index.add_name("eval", object(), hidden=True)
+    return index
+
+
+def test_typo_distance():
+    assert typo_distance("ping", "ping") == 0
+    assert typo_distance("pnig", "ping") == 1      # swapped neighbours
+    assert typo_distance("pin", "ping") == 1
+    assert typo_distance("pong", "ping") == 1
+    assert typo_distance("pgni", "ping") == 2
+
+
+def test_suggest_typos():
+    index = small_index()
+    assert index.suggest("pnig")[0] == "ping"
+    assert index.suggest("avtar")[0] == "avatar"
+    assert index.suggest("impersonat")[0] == "impersonate"
+    assert index.suggest("xyzzy") == []
+
+
+def test_hidden_names_are_not_suggested():
+    index = small_index()
+    assert index.lookup("eval") is not None
+    assert "eval" not in index.suggest("evl")
+
+
+def test_suggest_synthetic():
+    index = synthetic_index(150)
+    assert index.suggest("comand_15_3")[0] == "command_15_3"
+    assert index.suggest("grop_7")[0] == "group_7"
+    assert index.suggest("group_12 sbu_1")[0] == "group_12 sub_1"
+    assert index.suggest("cog149")[0] == "cog149"
+
+
+# suggestions only score a small share of the names, and stay under a millisecond with a few thousand of them
+def test_suggest_cost(monkeypatch):
+    index = synthetic_index(150)
+    assert len(index.name_grams) > 3000
+    queries = [f"comand_{number}_{number % 8}" for number in range(0, 150, 3)]
+    queries += [f"grop_{number} sub_{number % 3}" for number in range(0, 150, 3)]
+    queries += [f"c{number}_{number % 8}x" for number in range(0, 150, 3)]
+
+    scored = 0
+    distance = helpcmd.typo_distance
+
+    def counted_distance(first: str, second: str) -> int:
+        nonlocal scored
+        scored += 1
+        return distance(first, second)
+
+    class CountedGrams(dict):
+        def __getitem__(self, name):
+            nonlocal scored
+            scored += 1
+            return super().__getitem__(name)
+
+    monkeypatch.setattr(helpcmd, "typo_distance", counted_distance)
+    index.name_grams = CountedGrams(index.name_grams)
+    for query in queries:
+        index.suggest(query)
+    assert scored / len(queries) < len(index.name_grams) / 10
+    monkeypatch.undo()
+    index.name_grams = dict(index.name_grams)
+
+    start = time.perf_counter()
+    for query in queries:
+        index.suggest(query)
+    assert (time.perf_counter() - start) / len(queries) < 0.001
+
+
+# help hides commands whose checks raise, like the built in checks do
+def only_first_user(ctx: commands.Context) -> bool:
+    if ctx.author.id != 1:
+        raise commands.CheckFailure()
+    return True
+
+
+class First(commands.Cog):
+    @commands.command()
+    async def ping(self, ctx: commands.Context) -> None:
+        pass
+
+    @commands.command()
+    @commands.check(only_first_user)
+    async def secret(self, ctx: commands.Context) -> None:
+        pass
+
+
+class Second(commands.Cog):
+    @commands.command()
+    async def say(self, ctx: commands.Context) -> None:
+        pass
+
+
+def test_all_cogs_page_checks_once(monkeypatch):
+    monkeypatch.setattr(helpcmd, "_check_cache", {})
+    monkeypatch.setattr(Paginator, "manager", PaginatorManager())
+    calls = []
+    check_commands = helpcmd.check_commands
+
+    async def counted_check_commands(commandList, ctx):
+        calls.append([command.name for command in commandList])
+        return await check_commands(commandList, ctx)
+
+    monkeypatch.setattr(helpcmd, "check_commands", counted_check_commands)
+
+    async def scenario():
+        client = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+        await client.add_cog(First())
+        await client.add_cog(Second())
+        client.help_index = HelpIndex()
+        await client.help_index.rebuild(client)
+
+        ctx = FakeContext(client, author_id=2)
+        await helpcmd.setup_help_page(client, ctx)
+        for pager in list(Paginator.manager.active.values()):
+            await pager.close()
+        await client.close()
+        return ctx.sent[0].embed.description
+
+    page = asyncio.run(scenario())
+    assert len(calls) == 1 and sorted(calls[0]) == ["ping", "say", "secret"]
+    assert "**First**" in page and "**Second**" in page
+    assert "ping" in page and "secret" not in page
+
+
+def test_check_results_expire(monkeypatch):
+    monkeypatch.setattr(helpcmd, "_check_cache", {})
+    monkeypatch.setattr(helpcmd, "CHECK_TTL", 0.05)
+    runs = []
+
+    @commands.command()
+    @commands.check(lambda ctx: runs.append(ctx.author.id) or True)
+    async def counted(ctx: commands.Context) -> None:
+        pass
+
+    async def scenario():
+        client = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+        ctx = FakeContext(client)
+        semaphore = asyncio.Semaphore(1)
+        assert await helpcmd.can_run_cached(counted, ctx, semaphore)
+        assert await helpcmd.can_run_cached(counted, ctx, semaphore)
+        assert len(runs) == 1
+        await helpcmd.can_run_cached(counted, FakeContext(client, author_id=2), semaphore)
+        assert len(runs) == 2
+
+        await asyncio.sleep(0.1)
+        assert await helpcmd.can_run_cached(counted, ctx, semaphore)
+        assert len(runs) == 3
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_permission_changes_invalidate_checks(monkeypatch):
+    # (user, guild, channel, command, is prefix command)
+    keys = [(1, 10, 5, "ping", True), (2, 10, 5, "ping", True), (1, 20, 6, "ping", True)]
+    cache = {}
+    monkeypatch.setattr(helpcmd, "_check_cache", cache)
+
+    def refill() -> None:
+        cache.clear()
+        cache.update({key: (time.monotonic() + 30, True) for key in keys})
+
+    async def scenario():
+        guild = SimpleNamespace(id=10)
+        refill()
+        await Bot.on_member_update(None, SimpleNamespace(roles=[1]), SimpleNamespace(roles=[1], guild=guild, id=1))
+        assert list(cache) == keys
+        await Bot.on_member_update(None, SimpleNamespace(roles=[1]), SimpleNamespace(roles=[1, 2], guild=guild, id=1))
+        assert list(cache) == keys[1:]
+
+        refill()
+        await Bot.on_guild_role_update(None, SimpleNamespace(permissions=1), SimpleNamespace(permissions=1, guild=guild))
+        assert list(cache) == keys
+        await Bot.on_guild_role_update(None, SimpleNamespace(permissions=1), SimpleNamespace(permissions=8, guild=guild))
+        assert list(cache) == keys[2:]
+
+        refill()
+        await Bot.on_guild_role_delete(None, SimpleNamespace(guild=guild))
+        assert list(cache) == keys[2:]
+
+        refill()
+        await Bot.on_guild_channel_update(None, SimpleNamespace(overwrites={}), SimpleNamespace(overwrites={}, guild=guild))
+        assert list(cache) == keys
+        await Bot.on_guild_channel_update(None, SimpleNamespace(overwrites={}), SimpleNamespace(overwrites={1: 2}, guild=guild))
+        assert list(cache) == keys[2:]
+
+    asyncio.run(scenario())
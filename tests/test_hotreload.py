@@ -0,0 +1,111 @@
+import asyncio
+import importlib
+
+from benchmarks.fakes import FakeContext
+from modules import paginator
+from modules.hotreload import HotReloader, dependants, import_order
+
+
+# reloader whose reload only records the paths it was given, taking duration seconds like a real reload
+def recording_reloader(duration: float) -> tuple[HotReloader, list]:
+    reloader = HotReloader(None, quiet=0.05)
+    passes = []
+
+    async def reload(paths: set[str]) -> list[str]:
+        passes.append({"paths": paths, "finished": False})
+        await asyncio.sleep(duration)
+        passes[-1]["finished"] = True
+        return []
+
+    reloader.reload = reload
+    return reloader, passes
+
+
+def test_saves_within_quiet_are_reloaded_once():
+    async def run():
+        reloader, passes = recording_reloader(0)
+        reloader.changed("cogs/misc.py")
+        await asyncio.sleep(0.02)
+        reloader.changed("modules/webhooks.py")
+        reloader.changed("modules/notes.txt")
+        await asyncio.sleep(0.2)
+        return passes
+
+    passes = asyncio.run(run())
+    assert [entry["paths"] for entry in passes] == [{"cogs/misc.py", "modules/webhooks.py"}]
+
+
+def test_save_during_reload_does_not_cancel_it():
+    async def run():
+        reloader, passes = recording_reloader(0.2)
+        reloader.changed("cogs/misc.py")
+        await asyncio.sleep(0.1)           # past the quiet period, reload is running
+        assert len(passes) == 1 and not passes[0]["finished"]
+        reloader.changed("cogs/heart.py")
+        await asyncio.sleep(0.5)
+        return passes
+
+    passes = asyncio.run(run())
+    assert [entry["paths"] for entry in passes] == [{"cogs/misc.py"}, {"cogs/heart.py"}]
+    assert all(entry["finished"] for entry in passes)
+
+
+def test_stop_cancels_waiting_reload():
+    async def run():
+        reloader, passes = recording_reloader(0)
+        reloader.changed("cogs/misc.py")
+        reloader.stop()
+        await asyncio.sleep(0.1)
+        return passes
+
+    assert asyncio.run(run()) == []
+
+
+def test_dependants_and_order():
+    graph = {
+        "modules.paginator": set(),
+        "modules.helpcmd": {"modules.paginator"},
+        "cogs.heart": {"modules.paginator"},
+        "cogs.misc": {"modules.webhooks"},
+        "modules.webhooks": set(),
+    }
+    affected = dependants({"modules.paginator"}, graph)
+    assert affected == {"modules.paginator", "modules.helpcmd", "cogs.heart"}
+    order = import_order(affected, graph)
+    assert order.index("modules.paginator") < order.index("modules.helpcmd")
+    assert order.index("modules.paginator") < order.index("cogs.heart")
+
+
+# modules the bot holds on to are reported instead of reloaded, nothing importing them is touched
+def test_kept_modules_are_not_reloaded():
+    lines = asyncio.run(HotReloader(None).reload({"modules/metrics.py"}))
+    assert lines == ["Not reloading modules.metrics, restart to pick up changes to it"]
+
+
+# paginators opened before a reload of their module stay registered, counted and limited afterwards
+def test_paginator_reload_keeps_registry():
+    async def scenario():
+        old = paginator.Paginator
+        pager = old(FakeContext(None), entries=["a", "b"], length=1)
+        await pager.start()
+        await pager.go_to(2)
+        manager, stats = old.manager, dict(old.edit_stats)
+
+        importlib.reload(paginator)
+        new = paginator.Paginator
+        assert new is not old
+        assert new.manager is manager and pager in new.manager.active.values()
+        assert new.edit_stats == stats
+
+        # the old paginator still counts into the shared numbers and leaves the shared registry
+        await pager.go_to(1)
+        assert new.edit_stats["requested"] == stats["requested"] + 1
+        await pager.close()
+        assert pager not in new.manager.active.values()
+
+    saved = dict(paginator.__dict__)
+    try:
+        asyncio.run(scenario())
+    finally:
+        paginator.__dict__.clear()
+        paginator.__dict__.update(saved)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from modules import jsonhandler, storage
+from modules.storage import JsonEngine
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    (tmp_path / "config.json").write_text(json.dumps({"prefix": "!", "colour": 1}))
+    monkeypatch.setattr(jsonhandler, "_engine", None)
+    engine = JsonEngine(str(tmp_path), write_delay=0.05)
+    jsonhandler.set_engine(engine)
+    yield engine
+    engine.close()
+
+
+# count files parsed by the json engine
+@pytest.fixture
+def parses(monkeypatch):
+    calls = []
+    load = storage.json.load
+    monkeypatch.setattr(storage.json, "load", lambda file: (calls.append(file.name), load(file))[1])
+    return calls
+
+
+def test_file_is_parsed_once(engine, parses, tmp_path):
+    for _ in range(50):
+        assert jsonhandler.fetch_data("prefix", "config") == "!"
+    assert jsonhandler.read_file("config.json") == {"prefix": "!", "colour": 1}
+    assert len(parses) == 1
+
+    # changed on disk by something else, so parsed again
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"prefix": "?", "colour": 1, "extra": True}))
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert jsonhandler.fetch_data("prefix", "config") == "?"
+    assert len(parses) == 2
+
+
+def test_callers_cannot_change_the_cache(engine):
+    data = jsonhandler.read_file("config")
+    data["prefix"] = "changed"
+    assert jsonhandler.fetch_data("prefix", "config") == "!"
+
+
+def test_writes_are_visible_at_once_and_flushed_together(engine, parses, tmp_path):
+    jsonhandler.fetch_data("prefix", "config")
+    for number in range(30):
+        jsonhandler.append_data({"count": number}, "config")
+    assert jsonhandler.fetch_data("count", "config") == 29
+    assert json.loads((tmp_path / "config.json").read_text()) == {"prefix": "!", "colour": 1}
+
+    jsonhandler.flush()
+    assert json.loads((tmp_path / "config.json").read_text()) == {"prefix": "!", "colour": 1, "count": 29}
+    # the flushed file is known to the cache, and no temp files are left behind
+    assert jsonhandler.fetch_data("count", "config") == 29
+    assert len(parses) == 1
+    assert sorted(os.listdir(tmp_path)) == ["config.json"]
+
+
+def test_overwrite_is_flushed_after_delay(engine, tmp_path):
+    jsonhandler.overwrite_file({"only": 1}, "fresh")
+    assert jsonhandler.read_file("fresh") == {"only": 1}
+    assert not (tmp_path / "fresh.json").exists()
+    time.sleep(0.2)
+    assert json.loads((tmp_path / "fresh.json").read_text()) == {"only": 1}
+
+
+def test_async_appends_are_not_lost(engine):
+    async def scenario():
+        await asyncio.gather(*[jsonhandler.append_data_async({f"key {number}": number}, "asynctest") for number in range(40)])
+        return await jsonhandler.read_file_async("asynctest")
+
+    jsonhandler.overwrite_file({}, "asynctest")
+    data = asyncio.run(scenario())
+    assert data == {f"key {number}": number for number in range(40)}
+    assert asyncio.run(jsonhandler.fetch_data_async("key 7", "asynctest")) == 7
+
+
+def test_get_and_upsert_do_not_copy_the_namespace(engine, monkeypatch):
+    def copy(namespace):
+        raise AssertionError("namespace copied")
+
+    jsonhandler.fetch_data("prefix", "config")
+    monkeypatch.setattr(engine, "read", copy)
+    monkeypatch.setattr(engine, "overwrite", lambda namespace, data: copy(namespace))
+    jsonhandler.append_data({"colour": 2}, "config")
+    assert jsonhandler.fetch_data("colour", "config") == 2
+    assert jsonhandler.fetch_data("missing", "config") is None
+
+
+def test_async_fetch_reads_one_key(engine, monkeypatch):
+    monkeypatch.setattr(engine, "read", lambda namespace: pytest.fail("whole namespace read"))
+    assert asyncio.run(jsonhandler.fetch_data_async("prefix", "config")) == "!"
+    assert asyncio.run(jsonhandler.fetch_data_async("missing", "config")) is None
@@ -0,0 +1,58 @@
+import asyncio
+
+import discord
+from discord.ext import commands
+
+from modules.lazyload import LazyCogs, describe_cog
+
+
+class Plain(commands.Cog):
+    @commands.command(help="Say hi")
+    @commands.is_owner()
+    async def hello(self, ctx: commands.Context) -> None:
+        pass
+
+
+class Checked(commands.Cog):
+    def cog_check(self, ctx: commands.Context) -> bool:
+        return True
+
+
+class GlobalCheck(commands.Cog):
+    def bot_check_once(self, ctx: commands.Context) -> bool:
+        return True
+
+
+def test_describe_cog():
+    entry, reason = describe_cog(Plain())
+    assert reason is None
+    assert [(command["name"], command["checks"]) for command in entry["commands"]] == [("hello", ["is_owner"])]
+
+    assert describe_cog(Checked())[1] == "has cog level checks"
+    assert describe_cog(GlobalCheck())[1] == "has cog level checks"
+
+
+def test_stub_commands_match_manifest():
+    async def scenario():
+        client = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+        lazy = LazyCogs(client)
+        entry, _ = describe_cog(Plain())
+        entry["commands"].append({
+            "name": "tools", "parent": None, "aliases": ["t"], "help": None, "brief": None, "description": "",
+            "usage": "", "hidden": False, "group": True, "checks": []
+        })
+        entry["commands"].append({
+            "name": "fix", "parent": "tools", "aliases": [], "help": None, "brief": None, "description": "",
+            "usage": "", "hidden": False, "group": False, "checks": []
+        })
+        await client.add_cog(lazy.stub_cog("plain", entry))
+
+        hello = client.get_command("hello")
+        assert hello.help == "Say hi"
+        assert hello.callback.__name__ == "hello"
+        assert hello.callback.__qualname__ == "LazyPlain.hello"
+        assert [check.__qualname__.split(".")[0] for check in hello.checks] == ["is_owner"]
+        assert client.get_command("t fix").callback.__name__ == "fix"
+        await client.close()
+
+    asyncio.run(scenario())
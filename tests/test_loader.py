@@ -0,0 +1,131 @@
+import asyncio
+import sys
+
+import discord
+from discord.ext import commands
+
+from bot import Bot
+from modules.loader import ExtensionLoader
+
+
+COG = '''from discord.ext import commands
+{header}
+
+class {title}(commands.Cog):
+    pass
+
+
+async def setup(client):
+    await client.add_cog({title}())
+'''
+
+
+# cogs package in a temporary directory, each cog given as name -> header line(s)
+def make_cogs(tmp_path, monkeypatch, cogs: dict[str, str]) -> ExtensionLoader:
+    directory = tmp_path / "testcogs"
+    directory.mkdir()
+    for name, header in cogs.items():
+        (directory / f"{name}.py").write_text(COG.format(header=header, title=name.title()))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    client = commands.Bot(command_prefix="!", intents=discord.Intents.none())
+    loader = ExtensionLoader(client, directory="testcogs")
+    loader.discover()
+    return loader
+
+
+def forget_cogs() -> None:
+    for name in [name for name in sys.modules if name.startswith("testcogs")]:
+        del sys.modules[name]
+
+
+def test_read_dependencies(tmp_path):
+    path = tmp_path / "cog.py"
+    for source, expected in [
+        ('DEPENDENCIES = ["heart"]', ["heart"]),
+        ('DEPENDENCIES: list[str] = ["heart", "misc"]', ["heart", "misc"]),
+        ('DEPENDENCIES: list[str]', []),
+        ('OTHER = ["heart"]', []),
+    ]:
+        path.write_text(source + "\n")
+        assert ExtensionLoader.read_dependencies(str(path)) == expected
+
+
+def test_levels_follow_dependencies(tmp_path, monkeypatch):
+    loader = make_cogs(tmp_path, monkeypatch, {
+        "base": "",
+        "middle": 'DEPENDENCIES = ["base"]',
+        "top": 'DEPENDENCIES: list[str] = ["middle", "base"]',
+        "alone": "",
+        "orphan": 'DEPENDENCIES = ["nowhere"]',
+        "first": 'DEPENDENCIES = ["second"]',
+        "second": 'DEPENDENCIES = ["first"]',
+        "after_cycle": 'DEPENDENCIES = ["first"]',
+    })
+    levels, skipped = loader.levels(list(loader.available))
+    assert levels == [["alone", "base"], ["middle"], ["top"]]
+    assert skipped == {
+        "orphan": "missing dependency nowhere",
+        "first": "dependency cycle or skipped dependency",
+        "second": "dependency cycle or skipped dependency",
+        "after_cycle": "dependency cycle or skipped dependency",
+    }
+
+
+def test_load_all_skips_dependants_of_failed_cogs(tmp_path, monkeypatch):
+    loader = make_cogs(tmp_path, monkeypatch, {
+        "base": "raise RuntimeError('broken')",
+        "middle": 'DEPENDENCIES = ["base"]',
+        "alone": "",
+    })
+    try:
+        output = asyncio.run(loader.load_all())
+        assert "Successfully loaded alone cog" in output
+        assert "Skipped middle cog: a dependency failed to load" in output
+        assert any("testcogs.base" in line and "broken" in line for line in output)
+        assert set(loader.client.extensions) == {"testcogs.alone"}
+    finally:
+        forget_cogs()
+
+
+def test_load_missing_cog(tmp_path, monkeypatch):
+    loader = make_cogs(tmp_path, monkeypatch, {"alone": ""})
+    assert asyncio.run(loader.load("missing")) == "Cog not found: missing"
+
+
+def test_unreadable_cogs_do_not_stop_loading(tmp_path, monkeypatch):
+    loader = make_cogs(tmp_path, monkeypatch, {
+        "alone": "",
+        "broken": "def broken(:",
+        "computed": 'DEPENDENCIES = ["al" + "one"]',
+        "after_computed": 'DEPENDENCIES = ["computed"]',
+    })
+    assert loader.available["broken"] == []
+    assert set(loader.unreadable) == {"computed"}
+    try:
+        output = asyncio.run(loader.load_all())
+        assert "Successfully loaded alone cog" in output
+        assert any(line.startswith("Skipped computed cog: DEPENDENCIES must be a plain list") for line in output)
+        assert "Skipped after_computed cog: dependency cycle or skipped dependency" in output
+        assert any("testcogs.broken" in line and "SyntaxError" in line for line in output)
+        assert set(loader.client.extensions) == {"testcogs.alone"}
+    finally:
+        forget_cogs()
+
+
+def test_cog_body_runs_once_when_timed(tmp_path, monkeypatch, capsys):
+    make_cogs(tmp_path, monkeypatch, {"alone": 'print("cog body executed")'})
+
+    async def scenario():
+        client = Bot(intents=discord.Intents.none())
+        await client.load_extension("testcogs.alone")
+        await client.close()
+        return client.extension_loader
+
+    try:
+        loader = asyncio.run(scenario())
+    finally:
+        forget_cogs()
+    assert capsys.readouterr().out.count("cog body executed") == 1
+    assert list(loader.timings) == ["alone"] and loader.timings["alone"] > 0
+    assert loader.report().splitlines()[1].split()[0] == "alone"
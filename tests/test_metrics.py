@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+from benchmarks.fakes import FakeContext
+from modules.metrics import InstrumentedTree, Metrics, mark_checks
+from modules.paginator import Paginator, PaginatorManager
+
+
+def slow_check(interaction) -> bool:
+    time.sleep(0.02)
+    return True
+
+
+class Tools(commands.GroupCog, name="tools"):
+    @app_commands.command(name="fix")
+    @app_commands.check(slow_check)
+    async def fix(self, interaction: discord.Interaction) -> None:
+        pass
+
+
+@app_commands.command(name="ping")
+async def ping(interaction: discord.Interaction) -> None:
+    pass
+
+
+def test_checks_stage_ends_after_command_checks():
+    async def scenario():
+        client = commands.Bot(command_prefix="!", intents=discord.Intents.none(), tree_cls=InstrumentedTree)
+        client.metrics = Metrics()
+        await client.add_cog(Tools())
+        client.tree.add_command(ping)
+        client.tree.add_command(ping, override=True)
+
+        fix = client.tree.get_command("tools").get_command("fix")
+        assert fix.checks == [slow_check, mark_checks]
+        assert ping.checks == [mark_checks]
+
+        # checks run in list order, so the command's own checks are part of the checks stage
+        with client.metrics.measure("app", "tools fix") as measurement:
+            assert all(check(None) for check in fix.checks)
+            await asyncio.sleep(0.05)
+        stats = client.metrics.commands[("app", "tools fix")].histograms
+        assert 0.02 <= stats["checks"].sum < 0.05
+        assert stats["handler"].sum >= 0.05
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_error_handling_is_not_a_command():
+    async def scenario():
+        metrics = Metrics()
+        with metrics.measure("prefix", "eval"):
+            pass
+        with metrics.measure("error", "CommandInvokeError", checks=False):
+            pass
+        return metrics
+
+    metrics = asyncio.run(scenario())
+    assert list(metrics.commands) == [("prefix", "eval")]
+    assert metrics.error_handling["CommandInvokeError"].count == 1
+    assert len(metrics.summary()) == 1
+    text = metrics.prometheus()
+    assert 'kind="error"' not in text
+    assert 'bot_error_handler_duration_seconds_count{type="CommandInvokeError"} 1' in text
+
+
+def test_paginators_are_exported(monkeypatch):
+    async def scenario():
+        manager = PaginatorManager()
+        monkeypatch.setattr(Paginator, "manager", manager)
+        monkeypatch.setattr(Paginator, "edit_stats", {"requested": 0, "sent": 0})
+        pager = Paginator(FakeContext(None), entries=["a", "b"], length=1)
+        await pager.start()
+        await pager.go_to(2)
+        text = Metrics().prometheus()
+        await pager.close()
+        return text
+
+    text = asyncio.run(scenario())
+    assert "bot_paginators_active 1\n" in text
+    assert "bot_paginator_users 1\n" in text
+    assert "bot_paginator_evictions_total 0\n" in text
+    assert "bot_paginator_edits_requested_total 1\n" in text
+    assert "bot_paginator_edits_sent_total 1\n" in text
+
+
+# InstrumentedTree overrides a private method, this fails first if a discord.py upgrade renames or removes it
+def test_tree_still_has_private_call():
+    assert discord.__version__ == "2.3.2"
+    assert callable(getattr(app_commands.CommandTree, "_call", None))
+    assert InstrumentedTree._call is not app_commands.CommandTree._call
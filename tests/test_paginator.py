@@ -0,0 +1,119 @@
+import asyncio
+
+import discord
+
+from benchmarks.fakes import FakeContext
+from modules.paginator import PageSource, Paginator, PaginatorManager, StreamPaginator
+
+
+def test_packing_ignores_length():
+    async def scenario():
+        source = PageSource([f"entry {number}" for number in range(100)], length=2, limit=200)
+        first = await source.get_page(1)
+        total = await source.exhaust()
+        return first, total, source.pages
+
+    first, total, pages = asyncio.run(scenario())
+    assert len(first) > 2
+    assert sum(len("".join(page)) for page in pages.values()) == sum(len(f"entry {number}\n") for number in range(100))
+    assert all(len("".join(page)) <= 200 for page in pages.values())
+    assert total == len(pages) < 50
+
+
+def test_manager_evicts_least_recently_used():
+    async def scenario():
+        manager = PaginatorManager(max_total=3, max_per_user=2)
+        pages = []
+        for user in (1, 1, 2, 1, 3):
+            pager = Paginator(FakeContext(None, author_id=user), entries=["a", "b"], length=1)
+            pager.manager = manager
+            await pager.start()
+            pages.append(pager)
+            if user == 1 and len(pages) == 2:
+                await pages[0].go_to(2)         # first paginator becomes the most recently used
+
+        # user 1 is over their limit when the fourth opens, the second is least recently used
+        # the fifth goes over the total, the first is least recently used by then
+        assert [pager.closed for pager in pages] == [True, True, False, False, False]
+        assert manager.evictions == 2
+        for pager in pages:
+            await pager.close()
+
+    asyncio.run(scenario())
+
+
+def test_stream_is_not_evicted():
+    async def scenario():
+        manager = PaginatorManager(max_total=2, max_per_user=1)
+        ctx = FakeContext(None)
+        stream = StreamPaginator(ctx, interval=60)
+        stream.manager = manager
+        await stream.start()
+
+        pages = []
+        for _ in range(3):
+            pager = Paginator(ctx, entries=["a", "b"], length=1)
+            pager.manager = manager
+            await pager.start()
+            pages.append(pager)
+
+        # only the newest plain paginator is left next to the stream
+        assert not stream.closed
+        assert [pager.closed for pager in pages] == [True, True, False]
+        assert list(manager.active.values()) == [stream, pages[-1]]
+
+        await stream.finish()
+        newest = Paginator(ctx, entries=["a", "b"], length=1)
+        newest.manager = manager
+        await newest.start()
+        assert stream.closed and pages[-1].closed
+        assert list(manager.active.values()) == [newest]
+        await newest.close()
+
+    asyncio.run(scenario())
+
+
+def test_quick_clicks_are_sent_as_one_edit(monkeypatch):
+    monkeypatch.setattr(Paginator, "edit_stats", {"requested": 0, "sent": 0})
+
+    async def scenario():
+        ctx = FakeContext(None)
+        pager = Paginator(ctx, entries=["a", "b", "c", "d"], length=1, coalesce=0.05)
+        pager.manager = PaginatorManager()
+        await pager.start()
+        for number in (2, 3, 4, 3):
+            await pager.go_to(number)
+        assert ctx.sent[0].edits == []
+
+        await asyncio.sleep(0.1)
+        edits = ctx.sent[0].edits
+        assert len(edits) == 1
+        assert edits[0]["embed"].footer.text == "Page 3 of 4"
+        assert (pager.edits_requested, pager.edits_sent, pager.edits_saved) == (4, 1, 3)
+        assert Paginator.edit_stats == {"requested": 4, "sent": 1}
+        await pager.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_delayed_edit_is_reported(capsys):
+    async def scenario():
+        ctx = FakeContext(None)
+        pager = Paginator(ctx, entries=["a", "b"], length=1, coalesce=0.01)
+        pager.manager = PaginatorManager()
+        await pager.start()
+
+        async def edit(**kwargs):
+            raise discord.HTTPException(type("Response", (), {"status": 404, "reason": "Not Found"})(), "Unknown Message")
+        pager.current.edit = edit
+
+        await pager.go_to(2)
+        task = pager.pending_edit
+        await asyncio.sleep(0.05)
+        assert task.done()
+        await pager.close()
+
+    asyncio.run(scenario())
+    captured = capsys.readouterr()
+    assert "Paginator task paginator-edit-" in captured.out
+    assert "Unknown Message" in captured.err
@@ -0,0 +1,33 @@
+import asyncio
+
+from modules import profiling
+
+
+def test_runs_do_not_overlap():
+    events = []
+
+    def work(name: str):
+        async def function():
+            events.append(f"{name} start")
+            await asyncio.sleep(0.05)
+            sum(range(10000))
+            events.append(f"{name} end")
+            return name
+        return function
+
+    async def scenario():
+        assert not profiling.busy()
+        first = asyncio.create_task(profiling.profile(work("first")))
+        await asyncio.sleep(0.01)
+        assert profiling.busy()
+        second = asyncio.create_task(profiling.timeit(work("second"), 2))
+        (result, stats), report = await asyncio.gather(first, second)
+        assert not profiling.busy()
+        return result, stats, report
+
+    result, stats, report = asyncio.run(scenario())
+    assert result == "first"
+    assert any(function == "function" for _, _, function in stats.stats)
+    assert report["runs"] == 2
+    # second only started once the first had finished
+    assert events[:2] == ["first start", "first end"]
@@ -0,0 +1,39 @@
+import asyncio
+
+from modules.sandbox import SandboxPool
+
+
+def test_run_returns_value_and_output():
+    async def scenario():
+        pool = SandboxPool(size=0)
+        output = []
+        result = await pool.run("print('hello')\nreturn 6 * 7", output.append)
+        await pool.close()
+        return result, "".join(output)
+
+    result, output = asyncio.run(scenario())
+    assert (result.status, result.value) == ("success", "42")
+    assert output == "hello\n"
+
+
+def test_cancelled_run_kills_worker():
+    async def scenario():
+        pool = SandboxPool(size=0, timeout=30)
+        workers = []
+        acquire = pool.acquire
+
+        async def recorded_acquire():
+            workers.append(await acquire())
+            return workers[-1]
+
+        pool.acquire = recorded_acquire
+        run = asyncio.create_task(pool.run("import time\ntime.sleep(20)", lambda text: None))
+        await asyncio.sleep(1)
+        assert workers[0].returncode is None
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+        await pool.close()
+        return workers[0]
+
+    worker = asyncio.run(scenario())
+    assert worker.returncode is not None and worker.returncode < 0
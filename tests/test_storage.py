@@ -0,0 +1,98 @@
+import json
+import time
+
+import pytest
+
+from modules import jsonhandler
+from modules.storage import JsonEngine, SQLiteEngine, StorageEngine
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def engine(request, tmp_path):
+    if request.param == "json":
+        (tmp_path / "config.json").write_text(json.dumps({"prefix": "!"}))
+        engine = JsonEngine(str(tmp_path), write_delay=0.05)
+    else:
+        engine = SQLiteEngine(str(tmp_path / "storage.db"))
+        engine.overwrite("config", {"prefix": "!"})
+    yield engine
+    engine.close()
+
+
+def test_engines_agree(engine):
+    assert engine.get("config", "prefix") == "!"
+    assert engine.get("config", "missing") is None
+    engine.upsert("config", {"colour": 5})
+    assert engine.read("config") == {"prefix": "!", "colour": 5}
+    engine.overwrite("config", {})
+    assert engine.read("config") == {}
+    assert engine.get("config", "prefix") is None
+
+
+def test_missing_namespace_raises(engine):
+    with pytest.raises(FileNotFoundError):
+        engine.read("nowhere")
+    with pytest.raises(FileNotFoundError):
+        engine.get("nowhere", "prefix")
+
+
+def test_engine_must_implement_storage():
+    class Partial(StorageEngine):
+        def read(self, namespace: str) -> dict:
+            return {}
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_writes_are_merged_into_one_flush(tmp_path, monkeypatch):
+    engine = JsonEngine(str(tmp_path), write_delay=0.1)
+    writes = []
+    write = engine._write
+    monkeypatch.setattr(engine, "_write", lambda namespace: (writes.append(namespace), write(namespace)))
+
+    for number in range(20):
+        engine.overwrite("counts", {"number": number})
+    assert engine.read("counts") == {"number": 19}
+    assert not (tmp_path / "counts.json").exists()
+
+    time.sleep(0.3)
+    assert writes == ["counts"]
+    assert json.loads((tmp_path / "counts.json").read_text()) == {"number": 19}
+
+
+def test_failed_flush_stays_pending(tmp_path, monkeypatch):
+    engine = JsonEngine(str(tmp_path), write_delay=0.05)
+    failures = [OSError("disk full")]
+    write = engine._write
+
+    def flaky_write(namespace):
+        if failures:
+            raise failures.pop()
+        write(namespace)
+
+    monkeypatch.setattr(engine, "_write", flaky_write)
+    engine.overwrite("counts", {"number": 1})
+    with pytest.raises(OSError):
+        engine.flush()
+    assert "counts" in engine._pending
+    assert engine.read("counts") == {"number": 1}
+
+    # retried by the rescheduled timer
+    time.sleep(0.2)
+    assert not engine._pending
+    assert json.loads((tmp_path / "counts.json").read_text()) == {"number": 1}
+
+
+def test_set_engine_closes_at_exit(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(jsonhandler.atexit, "register", registered.append)
+    monkeypatch.setattr(jsonhandler.atexit, "unregister", registered.remove)
+    monkeypatch.setattr(jsonhandler, "_engine", None)
+    first, second = JsonEngine(str(tmp_path)), SQLiteEngine(str(tmp_path / "storage.db"))
+
+    jsonhandler.set_engine(first)
+    assert registered == [first.close]
+    jsonhandler.set_engine(second)
+    assert registered == [second.close]
+    second.close()